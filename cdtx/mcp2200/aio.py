@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+''' asyncio flavour of MCP2200Device and SimpleIOClass.
+
+    USB I/O stays blocking, it's run on a single worker thread per object so
+    that the event loop never waits on the device. Each command is executed as
+    a whole (request and response) by this thread : a command cancelled or
+    timed out while on the wire still completes in the background and its
+    response is discarded, so the next command always reads its own response.
+    A command cancelled before reaching the worker is never sent.
+
+    >>> dev = AsyncMCP2200Device(backend=backend, timeout=1.0)
+    >>> await dev.connect()
+    >>> config = await dev.read_all()
+'''
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .device import MCP2200Device, MCP2200_VID, MCP2200_PID
+from .api import SimpleIOClass
+
+
+class AsyncWorker():
+    ''' Runs the blocking calls, one at a time, out of the event loop '''
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def call(self, func, *args, timeout=None, **kwargs):
+        ''' Run func(*args, **kwargs) on the worker thread.
+
+            timeout (seconds) defaults to the object's one, None waits forever.
+            Raises asyncio.TimeoutError when it expires.
+        '''
+        if timeout is None:
+            timeout = self.timeout
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        try:
+            # Shielded : a running command can't be interrupted halfway
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # Only effective if the command didn't start yet
+            future.cancel()
+            raise
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _async_command(name, timed=True):
+    ''' Coroutine calling the device's method name. When timed, the timeout
+        is the device's timeout too : a command timed out doesn't hold the
+        worker thread for longer than its own USB timeout.
+    '''
+    async def command(self, *args, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        method = getattr(self.device, name)
+        if timed and timeout is not None:
+            method = functools.partial(method, timeout=timeout)
+        return await self.call(method, *args, timeout=timeout, **kwargs)
+    command.__name__ = name
+    command.__doc__ = 'Coroutine version of %s.%s' % (MCP2200Device.__name__, name)
+    return command
+
+
+class AsyncMCP2200Device(AsyncWorker):
+    ''' Coroutine interface to an MCP2200Device.
+        Every command accepts a timeout keyword argument (seconds), also
+        given to the device's command when it takes one.
+    '''
+    def __init__(self, device=None, timeout=None, **kwargs):
+        super(AsyncMCP2200Device, self).__init__(timeout)
+        self.device = device if device is not None else MCP2200Device(**kwargs)
+
+    @classmethod
+    async def discover(cls, vid=MCP2200_VID, pid=MCP2200_PID, backend=None, timeout=None):
+        loop = asyncio.get_running_loop()
+        devices = await loop.run_in_executor(None, functools.partial(MCP2200Device.discover, vid, pid, backend=backend))
+        return [cls(dev, timeout) for dev in devices]
+
+    async def __aenter__(self):
+        if self.device.handle is None:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        ''' Disconnect the device and stop the worker thread '''
+        try:
+            await self.call(self.device.disconnect, timeout=None)
+        finally:
+            self.shutdown(wait=False)
+
+    connect = _async_command('connect', timed=False)
+    disconnect = _async_command('disconnect', timed=False)
+    set_clear_outputs = _async_command('set_clear_outputs')
+    configure = _async_command('configure')
+    read_ee = _async_command('read_ee')
+    write_ee = _async_command('write_ee')
+    read_all = _async_command('read_all')
+    read_config = _async_command('read_config', timed=False)
+    read_ee_range = _async_command('read_ee_range')
+    write_ee_range = _async_command('write_ee_range')
+
+
+class AsyncSimpleIOClass(AsyncWorker):
+    ''' Coroutine interface to SimpleIOClass.
+
+        Every method of SimpleIOClass is available as a coroutine accepting an
+        additional timeout keyword argument. run() executes a whole sequence
+        (e.g. a transaction) in one go on the worker thread.
+
+        >>> api = AsyncSimpleIOClass()
+        >>> await api.InitMCP2200(0x04d8, 0x00df)
+        >>> await api.SelectDevice(0)
+        >>> await api.SetPin(1)
+    '''
+    def __init__(self, backend=None, timeout=None, api=None):
+        super(AsyncSimpleIOClass, self).__init__(timeout)
+        self.api = api if api is not None else SimpleIOClass(backend)
+
+    async def run(self, func, timeout=None):
+        ''' Call func(api) on the worker thread, with api the underlying SimpleIOClass '''
+        return await self.call(func, self.api, timeout=timeout)
+
+    def __getattr__(self, name):
+        if name == 'api':
+            raise AttributeError(name)
+        attr = getattr(self.api, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, timeout=None, **kwargs):
+            return await self.call(attr, *args, timeout=timeout, **kwargs)
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
@@ -1,5 +1,12 @@
+import threading
+from contextlib import contextmanager
+
 from .errors import *
-from .device import MCP2200Device
+from .device import EE_WINDOW
+from .registry import DeviceRegistry
+from .hotplug import HotplugMonitor
+from .stats import Stats, instrument_methods, uninstrument
+from .outputs import OutputCombiner
 
 # Constants
 OFF = 0
@@ -9,10 +16,22 @@ BLINKSLOW = 4
 BLINKFAST = 5
 
 class SimpleIOClass():
-    ''' Strange naming but that's how Microchip named it '''
-    def __init__(self):
+    ''' Strange naming but that's how Microchip named it
+
+        backend selects how the devices are reached (pyusb by default,
+        see cdtx.mcp2200.simulator for a software device).
+    '''
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.registry = None
+        self.hotplug = None
+        self.stats = None
         self.devices = []
         self.device = None
+        # Transactions are per thread, see _staged and _transaction_depth
+        self._local = threading.local()
+        # SetPin, ClearPin and WritePort go through it, see batched_outputs()
+        self.outputs = OutputCombiner()
 
     def ClearPin(self, pin):
         ''' bool ClearPin(unsigned int pin) '''
@@ -21,104 +40,110 @@ class SimpleIOClass():
         # Create the bitmap
         bitmap = 1<<pin
         # Submit it
-        self.device.set_clear_outputs(**{'Set_bmap':0, 'Clear_bmap':bitmap})
+        self.outputs.set_clear(0, bitmap)
         return True
 
     def ConfigureIO(self, IOMap):
         ''' bool ConfigureIO(unsigned char IOMap) '''
-        config = self.device.read_all()
-        config['IO_bmap'] = IOMap
-        return self.device.configure(**config)
+        def modifier(config):
+            config['IO_bmap'] = IOMap
+        return self._modify_config(modifier)
 
     def ConfigureIoDefaultOutput(self, ucIoMap, ucDefValue):
         ''' bool ConfigureIoDefaultOutput(unsigned char ucIoMap, unsigned char ucDefValue) '''
-        config = self.device.read_all()
-        config['IO_bmap'] = ucIoMap
-        config['IO_Default_Val_bmap'] = ucDefValue
-        return self.device.configure(**config)
+        def modifier(config):
+            config['IO_bmap'] = ucIoMap
+            config['IO_Default_Val_bmap'] = ucDefValue
+        return self._modify_config(modifier)
 
     def ConfigureMCP2200(self, IOMap, BaudRateParam, RxLEDMode, TxLEDMode, FLOW, ULOAD, SSPND):
         ''' bool ConfigureMCP2200(unsigned char IOMap, unsigned long BaudRateParam, unsigned int RxLEDMode, unsigned int TxLEDMode, bool FLOW, bool ULOAD,bool SSPND) '''
         ret = True
-        ret &= self.ConfigureIO(IOMap)
-        ret &= self.fnSetBaudRate(BaudRateParam)
-        ret &= self.fnRxLED(RxLEDMode)
-        ret &= self.fnTxLED(TxLEDMode)
-        ret &= self.fnHardwareFlowControl(FLOW)
-        ret &= self.fnULoad(ULOAD)
-        ret &= self.fnSuspend(SSPND)
+        self.begin_transaction()
+        try:
+            ret &= self.ConfigureIO(IOMap)
+            ret &= self.fnSetBaudRate(BaudRateParam)
+            ret &= self.fnRxLED(RxLEDMode)
+            ret &= self.fnTxLED(TxLEDMode)
+            ret &= self.fnHardwareFlowControl(FLOW)
+            ret &= self.fnULoad(ULOAD)
+            ret &= self.fnSuspend(SSPND)
+        except BaseException:
+            self.abort_transaction()
+            raise
+        ret &= self.commit_transaction()
         return ret
 
     def fnHardwareFlowControl(self, onOff):
         ''' bool fnHardwareFlowControl(unsigned int onOff) '''
-        config = self.device.read_all()
-        config['Config_Alt_Options'] &= 0xFE
-        config['Config_Alt_Options'] |= (0x01 if onOff else 0x00) << 0
-        return self.device.configure(**config)
+        def modifier(config):
+            config['Config_Alt_Options'] &= 0xFE
+            config['Config_Alt_Options'] |= (0x01 if onOff else 0x00) << 0
+        return self._modify_config(modifier)
 
     def fnRxLED(self, mode):
         ''' bool fnRxLED(unsigned int mode) '''
         if not mode in [OFF, TOGGLE, BLINKFAST, BLINKSLOW]:
             return False
 
-        config = self.device.read_all()
-        if mode == OFF:
-            config['Config_Alt_Pins'] &= ~0x08
-        else:
-            config['Config_Alt_Pins'] |= 0x08
-            if mode == TOGGLE:
-                config['Config_Alt_Options'] |= 0x80
+        def modifier(config):
+            if mode == OFF:
+                config['Config_Alt_Pins'] &= ~0x08
             else:
-                config['Config_Alt_Options'] &= ~0x80
-                if mode == BLINKFAST:
-                    config['Config_Alt_Options'] &= ~0x20
-                elif mode == BLINKSLOW:
-                    config['Config_Alt_Options'] |= 0x20
-        return self.device.configure(**config)
+                config['Config_Alt_Pins'] |= 0x08
+                if mode == TOGGLE:
+                    config['Config_Alt_Options'] |= 0x80
+                else:
+                    config['Config_Alt_Options'] &= ~0x80
+                    if mode == BLINKFAST:
+                        config['Config_Alt_Options'] &= ~0x20
+                    elif mode == BLINKSLOW:
+                        config['Config_Alt_Options'] |= 0x20
+        return self._modify_config(modifier)
 
     def fnSetBaudRate(self, BaudRateParam):
         ''' bool fnSetBaudRate(unsigned long BaudRateParam) '''
-        config = self.device.read_all()
         baud_rate_divisor = (12000000//BaudRateParam) - 1
         Baud_H = baud_rate_divisor // 2**8
         Baud_L = baud_rate_divisor % (2**8)
-        config['Baud_H'] = Baud_H
-        config['Baud_L'] = Baud_L
-        return self.device.configure(**config)
+        def modifier(config):
+            config['Baud_H'] = Baud_H
+            config['Baud_L'] = Baud_L
+        return self._modify_config(modifier)
 
     def fnSuspend(self, onOff):
         ''' bool fnSuspend(unsigned int onOff) '''
-        config = self.device.read_all()
-        config['Config_Alt_Pins'] &= ~(0x01 << 7)
-        config['Config_Alt_Pins'] |= (0x01 if onOff else 0x00) << 7
-        return self.device.configure(**config)
+        def modifier(config):
+            config['Config_Alt_Pins'] &= ~(0x01 << 7)
+            config['Config_Alt_Pins'] |= (0x01 if onOff else 0x00) << 7
+        return self._modify_config(modifier)
 
     def fnTxLED(self, mode):
         ''' bool fnTxLED(unsigned int mode) '''
         if not mode in [OFF, TOGGLE, BLINKFAST, BLINKSLOW]:
             return False
 
-        config = self.device.read_all()
-        if mode == OFF:
-            config['Config_Alt_Pins'] &= ~0x04
-        else:
-            config['Config_Alt_Pins'] |= 0x04
-            if mode == TOGGLE:
-                config['Config_Alt_Options'] |= 0x40
+        def modifier(config):
+            if mode == OFF:
+                config['Config_Alt_Pins'] &= ~0x04
             else:
-                config['Config_Alt_Options'] &= ~0x40
-                if mode == BLINKFAST:
-                    config['Config_Alt_Options'] &= ~0x20
-                elif mode == BLINKSLOW:
-                    config['Config_Alt_Options'] |= 0x20
-        return self.device.configure(**config)
+                config['Config_Alt_Pins'] |= 0x04
+                if mode == TOGGLE:
+                    config['Config_Alt_Options'] |= 0x40
+                else:
+                    config['Config_Alt_Options'] &= ~0x40
+                    if mode == BLINKFAST:
+                        config['Config_Alt_Options'] &= ~0x20
+                    elif mode == BLINKSLOW:
+                        config['Config_Alt_Options'] |= 0x20
+        return self._modify_config(modifier)
 
     def fnULoad(self, onOff):
         ''' bool fnULoad(unsigned int onOff) '''
-        config = self.device.read_all()
-        config['Config_Alt_Pins'] &= ~(0x01 << 6)
-        config['Config_Alt_Pins'] |= (0x01 if onOff else 0x00) << 6
-        return self.device.configure(**config)
+        def modifier(config):
+            config['Config_Alt_Pins'] &= ~(0x01 << 6)
+            config['Config_Alt_Pins'] |= (0x01 if onOff else 0x00) << 6
+        return self._modify_config(modifier)
 
     def GetDeviceInfo(self, uiDeviceNo):
         ''' String^ GetDeviceInfo(unsigned int uiDeviceNo) '''
@@ -146,11 +171,12 @@ class SimpleIOClass():
         ''' void InitMCP2200(unsigned int VendorID, unsigned int ProductID) '''
         self.vid = VendorID
         self.pid = ProductID
-        self.devices = MCP2200Device.discover(self.vid, self.pid)
+        self.registry = DeviceRegistry(self.vid, self.pid, backend=self.backend)
+        self.devices = self.registry.devices()
 
     def IsConnected(self):
         ''' bool IsConnected() '''
-        return self.device != None
+        return self.device != None and self.device.alive
 
     def ReadEEPROM(self, uiEEPAddress):
         ''' int ReadEEPROM(unsigned int uiEEPAddress) '''
@@ -159,46 +185,134 @@ class SimpleIOClass():
         else:
             return E_WRONG_ADDRESS
 
-    def ReadPin(self, pin):
-        ''' bool ReadPin(unsigned int pin, unsigned int *returnvalue) '''
+    def ReadPin(self, pin, max_age=None):
+        ''' bool ReadPin(unsigned int pin, unsigned int *returnvalue)
+
+            max_age : reuse the last port value read if it's at most max_age
+            seconds old (see MCP2200Device.snapshot), None always reads.
+        '''
         if 0 <= pin <= 7:
-            pins = self.device.read_all()['IO_Port_Val_bmap']
+            self.outputs.flush()
+            pins = self.device.read_port(max_age=max_age)
             return (True, 1 if pins & (1<<pin) else 0)
         else:
             return (False, 0)
 
-    def ReadPinValue(self, pin):
+    def ReadPinValue(self, pin, max_age=None):
         ''' int ReadPinValue(unsigned int pin) '''
-        r,v = self.ReadPin(pin)
+        r,v = self.ReadPin(pin, max_age)
         if r:
             return v
         else:
             return 0x8000
 
-    def ReadPort(self):
+    def ReadPort(self, max_age=None):
         ''' bool ReadPort(unsigned int *returnvalue) '''
-        pins = self.device.read_all()['IO_Port_Val_bmap']
+        self.outputs.flush()
+        pins = self.device.read_port(max_age=max_age)
         return (True, pins)
 
-    def ReadPortValue(self):
+    def ReadPortValue(self, max_age=None):
         ''' int ReadPortValue() '''
-        r,v = self.ReadPort()
+        r,v = self.ReadPort(max_age)
         if r:
             return v
         else:
             return 0x8000
 
+    def snapshot(self, max_age=None):
+        ''' The GPIO port as a PortSnapshot : any set of pins from a single
+            READ_ALL, with the age of the reading. max_age as for ReadPin.
+        '''
+        self.outputs.flush()
+        return self.device.snapshot(max_age)
+
+    def read_pins(self, pins=range(8), max_age=None):
+        ''' {pin: value} of the given pins, with a single READ_ALL '''
+        for pin in pins:
+            if not 0 <= pin <= 7:
+                raise ValueError('No pin %d' % pin)
+        self.outputs.flush()
+        return self.device.read_pins(pins, max_age)
+
+    def port_age(self):
+        ''' Age in seconds of the last port value read, None if there is none '''
+        return self.device.port_age()
+
     def SelectDevice(self, uiDeviceNo):
         ''' int SelectDevice(unsigned int uiDeviceNo) '''
         if uiDeviceNo < len(self.devices):
-            if self.device:
-                self.device.disconnect()
-            self.device = MCP2200Device()
-            self.device.connect(self.vid, self.pid, uiDeviceNo)
+            self._select(self.registry.find(index=uiDeviceNo))
             return 0
         else:
             return E_WRONG_DEVICE_ID
 
+    def select(self, serial=None, path=None):
+        ''' SelectDevice by serial number or bus path (see DeviceRegistry), without enumerating again '''
+        if self.registry is None:
+            return E_WRONG_DEVICE_ID
+        try:
+            self._select(self.registry.find(serial=serial, path=path))
+            return 0
+        except KeyError:
+            return E_WRONG_DEVICE_ID
+
+    def _select(self, entry):
+        if self.device:
+            if self.device.alive:
+                self.outputs.flush()
+            self.outputs.discard()
+            self.device.disconnect()
+        self.device = self.outputs.device = self.registry.connect(path=entry.path)
+        if self.hotplug is not None:
+            self.hotplug.watch(self.device)
+        if self.stats is not None:
+            self.device.enable_stats(self.stats)
+
+    def _api_methods(self):
+        return [name for name in dir(SimpleIOClass)
+            if (name[0].isupper() or name.startswith('fn') or name in ('dump_eeprom', 'restore_eeprom', 'snapshot', 'read_pins', 'flush_outputs'))
+            and callable(getattr(SimpleIOClass, name))]
+
+    def enable_stats(self, stats=None):
+        ''' Time every API method and count its HID reports, the selected
+            device's commands included. Returns the Stats object (see cdtx.mcp2200.stats).
+        '''
+        if self.stats is not None:
+            self.disable_stats()
+        self.stats = stats if stats is not None else Stats()
+        instrument_methods(self, self._api_methods(), self.stats)
+        if self.device is not None:
+            self.device.enable_stats(self.stats)
+        return self.stats
+
+    def disable_stats(self):
+        uninstrument(self, self._api_methods())
+        if self.device is not None:
+            self.device.disable_stats()
+        self.stats = None
+
+    def start_hotplug(self, interval=1.0):
+        ''' Keep devices up to date as boards are plugged and unplugged (see HotplugMonitor).
+            The selected device is marked dead if it's unplugged. Returns the
+            monitor, to subscribe to the events.
+        '''
+        if self.hotplug is None:
+            self.hotplug = HotplugMonitor(self.registry, interval)
+            self.hotplug.subscribe(self._on_hotplug)
+            if self.device is not None:
+                self.hotplug.watch(self.device)
+            self.hotplug.start()
+        return self.hotplug
+
+    def stop_hotplug(self):
+        if self.hotplug is not None:
+            self.hotplug.stop()
+            self.hotplug = None
+
+    def _on_hotplug(self, event, entry):
+        self.devices = self.registry.devices()
+
     def SetPin(self, pin):
         ''' bool SetPin(unsigned int pin) '''
         if pin < 0 or pin > 7:
@@ -206,7 +320,7 @@ class SimpleIOClass():
         # Create the bitmap
         bitmap = 1<<pin
         # Submit it
-        self.device.set_clear_outputs(**{'Set_bmap':bitmap, 'Clear_bmap':0})
+        self.outputs.set_clear(bitmap, 0)
         return True
 
     def WriteEEPROM(self, uiEEPAddress, ucValue):
@@ -220,13 +334,161 @@ class SimpleIOClass():
         self.device.write_ee(**{'EEP_Addr':uiEEPAddress, 'EEP_Val':ucValue})
         return 0
 
+    def dump_eeprom(self, start=0, length=None, window=EE_WINDOW):
+        ''' Read an EEPROM range (the whole 256 bytes by default) as bytes,
+            window READ_EE requests in flight (see MCP2200Device.read_ee_range)
+        '''
+        return self.device.read_ee_range(start, length, window)
+
+    def restore_eeprom(self, image, start=0, window=EE_WINDOW):
+        ''' Write image to the EEPROM at start, only rewriting the bytes that differ.
+            Returns the number of bytes actually written.
+        '''
+        return self.device.write_ee_range(start, image, diff=True, window=window)
+
     def WritePort(self, portValue):
         ''' bool WritePort(unsigned int portValue) '''
         if 0x00 <= portValue <= 0xff:
-            self.device.set_clear_outputs(**{'Set_bmap':portValue, 'Clear_bmap':~portValue & 0xff})
+            self.outputs.set_clear(portValue, ~portValue & 0xff)
             return True
         else:
             return False
-        
 
+    # Write-combining of the outputs
+    #
+    # SetPin, ClearPin and WritePort changes are merged by an OutputCombiner,
+    # the last change of a pin wins. Inside batched_outputs(), or within
+    # output_window seconds, they're sent as a single SET_CLEAR_OUTPUTS.
+    # Pending changes are sent before any port read or CONFIGURE.
+
+    @property
+    def output_window(self):
+        ''' Seconds the output changes are held to be combined, None sends them right away '''
+        return self.outputs.window
+
+    @output_window.setter
+    def output_window(self, window):
+        self.outputs.flush()
+        self.outputs.window = window
+
+    def batched_outputs(self):
+        ''' Context manager combining the output changes of the block.
+
+            >>> with api.batched_outputs():
+            ...     api.SetPin(0)
+            ...     api.ClearPin(1)
+            ...     api.SetPin(1)           # one report : set 0 and 1
+        '''
+        return self.outputs.batch()
+
+    def flush_outputs(self):
+        ''' Send the pending output changes now '''
+        return self.outputs.flush()
+
+    # Transactional configuration
+    #
+    # The fn* setters, ConfigureIO and ConfigureIoDefaultOutput all
+    # read-modify-write the NVRAM configuration. Inside a transaction they
+    # only stage their modification, and the commit applies all of them with
+    # a single configuration read and at most one CONFIGURE. The read is
+    # answered by the device's shadow configuration when it's fresh enough.
+    #
+    # Transactions belong to the calling thread, and the read-modify-write
+    # holds the device lock (see MCP2200Device.modify_config) : threads
+    # sharing the API don't lose each other's modifications.
+
+    @property
+    def _staged(self):
+        ''' Pending NVRAM modifiers of the calling thread's transaction, None outside one '''
+        return getattr(self._local, 'staged', None)
+
+    @_staged.setter
+    def _staged(self, value):
+        self._local.staged = value
+
+    @property
+    def _aborted(self):
+        ''' Set when a nested transaction of the calling thread was aborted '''
+        return getattr(self._local, 'aborted', False)
+
+    @_aborted.setter
+    def _aborted(self, value):
+        self._local.aborted = value
+
+    @property
+    def _transaction_depth(self):
+        return getattr(self._local, 'depth', 0)
+
+    @_transaction_depth.setter
+    def _transaction_depth(self, value):
+        self._local.depth = value
+
+    def begin_transaction(self):
+        ''' Start staging the NVRAM modifications instead of applying them.
+            Transactions can be nested, only the outermost commit reaches the device.
+        '''
+        if self._transaction_depth == 0:
+            self._staged = []
+            self._aborted = False
+        self._transaction_depth += 1
+
+    def commit_transaction(self):
+        ''' Apply the staged modifications.
+            Returns True when the device configuration is up to date.
+            Raises MCP2200Error, nothing being sent, if a nested transaction
+            was aborted.
+        '''
+        if self._transaction_depth == 0:
+            raise MCP2200Error('No transaction in progress')
+        self._transaction_depth -= 1
+        if self._transaction_depth > 0:
+            return True
+
+        staged, self._staged = self._staged, None
+        if self._aborted:
+            raise MCP2200Error('A nested transaction was aborted, nothing was applied')
+        return self._apply_modifiers(staged)
+
+    def abort_transaction(self):
+        ''' End the innermost transaction. Nothing is sent to the device : the
+            outermost transaction can only be aborted as well, its commit raises.
+        '''
+        if self._transaction_depth == 0:
+            raise MCP2200Error('No transaction in progress')
+        self._transaction_depth -= 1
+        self._aborted = True
+        if self._transaction_depth == 0:
+            self._staged = None
+
+    def in_transaction(self):
+        return self._transaction_depth > 0
+
+    @contextmanager
+    def transaction(self):
+        ''' Context manager flavour of begin/commit_transaction.
+            The staged modifications are dropped if the block raises.
+
+            >>> with api.transaction():
+            ...     api.ConfigureIO(0x00)
+            ...     api.fnSetBaudRate(9600)
+        '''
+        self.begin_transaction()
+        try:
+            yield self
+        except BaseException:
+            self.abort_transaction()
+            raise
+        self.commit_transaction()
+
+    def _modify_config(self, modifier):
+        if self._staged is not None:
+            self._staged.append(modifier)
+            return True
+        return self._apply_modifiers([modifier])
 
+    def _apply_modifiers(self, modifiers):
+        if not modifiers:
+            return True
+        # CONFIGURE resets the outputs, the pending changes came first
+        self.outputs.flush()
+        return self.device.modify_config(*modifiers)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+''' Long GPIO captures on disk, in columns.
+
+    >>> with GPIOSampler(device, capacity=1000000) as sampler, CaptureWriter('night') as writer:
+    ...     while running:
+    ...         time.sleep(1)
+    ...         writer.drain(sampler)
+    >>> capture = Capture('night')                  # memory-mapped, needs numpy
+    >>> capture.edges(0)                            # sample indices where GPIO 0 changed
+    >>> capture.duty_cycles()                       # time high of each pin, 0.0 to 1.0
+
+    A capture is a directory of two .npy files, numpy.load(..., mmap_mode='r')
+    opens them too : TIMESTAMPS (uint64, time.monotonic_ns()) and VALUES
+    (uint8, IO_Port_Val_bmap). The samples are only ever appended. Their
+    headers are brought up to date by flush(), the readers go by the size of
+    the files anyway so a capture killed midway loses nothing flushed.
+'''
+import os
+import sys
+import ast
+import time
+import struct
+import threading
+from array import array
+
+from .sampler import GPIOSampler
+
+TIMESTAMPS = 'timestamps.npy'
+VALUES = 'values.npy'
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# Fixed, so that the shape can be rewritten in place ; a multiple of 64 as numpy wants
+NPY_HEADER_SIZE = 128
+_HEADER_LENGTH = struct.Struct('<H')
+
+
+def _npy_header(descr, count):
+    text = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, count)
+    size = NPY_HEADER_SIZE - len(NPY_MAGIC) - _HEADER_LENGTH.size
+    return NPY_MAGIC + _HEADER_LENGTH.pack(size) + text.ljust(size - 1).encode('latin1') + b'\n'
+
+def _read_npy_header(f):
+    ''' The header dict of the .npy file f, written by _npy_header() '''
+    head = f.read(len(NPY_MAGIC) + _HEADER_LENGTH.size)
+    if len(head) < len(NPY_MAGIC) + _HEADER_LENGTH.size or head[:len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError('%s is not a capture column' % f.name)
+    (size,) = _HEADER_LENGTH.unpack_from(head, len(NPY_MAGIC))
+    if len(head) + size != NPY_HEADER_SIZE:
+        raise ValueError('%s is not a capture column' % f.name)
+    return ast.literal_eval(f.read(size).decode('latin1'))
+
+
+class _Column():
+    ''' One .npy file of a capture, opened for appending '''
+    def __init__(self, path, typecode, descr):
+        self.typecode = typecode
+        self.descr = descr
+        self.itemsize = array(typecode).itemsize
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            header = _read_npy_header(self.file)
+            if header.get('descr') != descr:
+                raise ValueError('%s holds %s, not %s' % (path, header.get('descr'), descr))
+            self.count = (os.path.getsize(path) - NPY_HEADER_SIZE) // self.itemsize
+        else:
+            self.count = 0
+
+    def truncate(self, count):
+        self.count = count
+        self.file.truncate(NPY_HEADER_SIZE + count * self.itemsize)
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, samples):
+        if len(samples) == 0:
+            return
+        if sys.byteorder != 'little':
+            samples = array(self.typecode, samples)
+            samples.byteswap()
+        self.file.write(memoryview(samples).cast('B'))
+        self.count += len(samples)
+
+    def flush(self):
+        self.file.seek(0)
+        self.file.write(_npy_header(self.descr, self.count))
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class CaptureWriter():
+    ''' Appends (timestamp_ns, port value) samples to the capture directory
+        path, created if needed, an existing capture is continued.
+
+        The samples given one at a time are collected in a preallocated
+        buffer of buffer_size entries, the arrays given to extend() go
+        straight to the files : memory stays the same however long the
+        capture runs.
+    '''
+    def __init__(self, path, buffer_size=65536):
+        if buffer_size < 1:
+            raise ValueError('buffer_size must be at least 1')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.timestamps = _Column(os.path.join(path, TIMESTAMPS), 'Q', '<u8')
+        self.values = _Column(os.path.join(path, VALUES), 'B', '|u1')
+        # A capture interrupted between the writes of the columns
+        count = min(self.timestamps.count, self.values.count)
+        self.timestamps.truncate(count)
+        self.values.truncate(count)
+        self._timestamps = array('Q', bytes(8 * buffer_size))
+        self._values = array('B', bytes(buffer_size))
+        self._buffered = 0
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.timestamps.count + self._buffered
+
+    def append(self, timestamp_ns, value):
+        self._timestamps[self._buffered] = timestamp_ns
+        self._values[self._buffered] = value
+        self._buffered += 1
+        if self._buffered == len(self._values):
+            self._write_buffer()
+
+    def extend(self, timestamps, values):
+        ''' Append the arrays timestamps ('Q') and values ('B'), like GPIOSampler.drain() returns '''
+        if len(timestamps) != len(values):
+            raise ValueError('%d timestamps for %d values' % (len(timestamps), len(values)))
+        self._write_buffer()
+        self.timestamps.append(timestamps)
+        self.values.append(values)
+
+    def drain(self, sampler):
+        ''' Append the samples not drained yet from sampler (a GPIOSampler), returns their number '''
+        timestamps, values = sampler.drain()
+        self.extend(timestamps, values)
+        return len(values)
+
+    def _write_buffer(self):
+        if self._buffered:
+            self.timestamps.append(memoryview(self._timestamps)[:self._buffered])
+            self.values.append(memoryview(self._values)[:self._buffered])
+            self._buffered = 0
+
+    def flush(self):
+        ''' Write the buffered samples and the headers '''
+        self._write_buffer()
+        self.timestamps.flush()
+        self.values.flush()
+
+    def close(self):
+        self._write_buffer()
+        self.timestamps.close()
+        self.values.close()
+
+
+def capture(device, path, duration=None, interval=0.0, period=1.0, capacity=1 << 20, stop=None):
+    ''' Sample the GPIO port of device into the capture path, for duration
+        seconds or until stop (a threading.Event) is set. The samples are
+        moved from the sampler to the files every period seconds, capacity
+        must hold a period of samples. Returns the sampler's stats().
+    '''
+    stop = stop if stop is not None else threading.Event()
+    deadline = None if duration is None else time.monotonic() + duration
+    with CaptureWriter(path) as writer, GPIOSampler(device, capacity, interval) as sampler:
+        while not stop.is_set():
+            remaining = period if deadline is None else min(period, deadline - time.monotonic())
+            if remaining <= 0 or stop.wait(remaining):
+                break
+            writer.drain(sampler)
+            writer.flush()
+        sampler.stop()
+        writer.drain(sampler)
+    return sampler.stats()
+
+
+class Capture():
+    ''' A capture written by CaptureWriter, memory-mapped read-only : the
+        timestamps and values are numpy arrays backed by the files.
+
+        The computations over the whole capture go through it chunk samples
+        at a time, so a capture of any size is processed in bounded memory.
+        start and stop are sample indices, see index() to get them from times.
+    '''
+    def __init__(self, path, chunk=1 << 20):
+        import numpy
+        self._np = numpy
+        self.path = path
+        self.chunk = chunk
+        columns = []
+        for name, dtype in ((TIMESTAMPS, numpy.uint64), (VALUES, numpy.uint8)):
+            filename = os.path.join(path, name)
+            with open(filename, 'rb') as f:
+                _read_npy_header(f)
+            columns.append((filename, dtype, (os.path.getsize(filename) - NPY_HEADER_SIZE) // numpy.dtype(dtype).itemsize))
+        # Flushed or not, a sample is there once both columns hold it
+        count = min(length for (_, _, length) in columns)
+        self.timestamps, self.values = [
+            numpy.memmap(filename, dtype=dtype, mode='r', offset=NPY_HEADER_SIZE, shape=(count,)) if count else numpy.zeros(0, dtype)
+            for (filename, dtype, _) in columns]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.timestamps = self.values = None
+
+    def _range(self, start, stop):
+        count = len(self.values)
+        return (0 if start is None else max(0, min(start, count)),
+                count if stop is None else max(0, min(stop, count)))
+
+    def index(self, timestamp_ns):
+        ''' Index of the first sample taken at timestamp_ns or later '''
+        return int(self._np.searchsorted(self.timestamps, self._np.uint64(timestamp_ns)))
+
+    @property
+    def duration(self):
+        ''' Seconds between the first and the last sample '''
+        if len(self.timestamps) < 2:
+            return 0.0
+        return int(self.timestamps[-1] - self.timestamps[0]) / 1e9
+
+    def chunks(self, start=None, stop=None):
+        ''' Iterate over (first index, timestamps, values) of consecutive chunks '''
+        start, stop = self._range(start, stop)
+        for first in range(start, stop, self.chunk):
+            last = min(first + self.chunk, stop)
+            yield first, self.timestamps[first:last], self.values[first:last]
+
+    def pin(self, pin, start, stop):
+        ''' Levels (uint8 0/1) of GPIO pin over the samples [start, stop[, in
+            memory : the range is required, see pin_chunks() for the whole capture
+        '''
+        start, stop = self._range(start, stop)
+        return (self.values[start:stop] >> pin) & 1
+
+    def pin_chunks(self, pin, start=None, stop=None):
+        ''' Iterate over (first index, levels) of GPIO pin, chunk samples at a time '''
+        for first, _timestamps, values in self.chunks(start, stop):
+            yield first, (values >> pin) & 1
+
+    def edges(self, pin, start=None, stop=None, rising=True, falling=True):
+        ''' Indices of the samples where GPIO pin changed level : the first
+            sample at the new level
+        '''
+        np = self._np
+        start, stop = self._range(start, stop)
+        found = []
+        for first in range(start, stop, self.chunk):
+            # With the sample before the chunk, for the edge on its boundary
+            low = max(first - 1, start)
+            levels = ((self.values[low:min(first + self.chunk, stop)] >> pin) & 1).view(np.int8)
+            changes = np.diff(levels)
+            if rising and falling:
+                mask = changes != 0
+            elif rising:
+                mask = changes > 0
+            elif falling:
+                mask = changes < 0
+            else:
+                break
+            found.append(np.flatnonzero(mask) + (low + 1))
+        return np.concatenate(found) if found else np.zeros(0, np.intp)
+
+    def duty_cycles(self, start=None, stop=None):
+        ''' Fraction of the time each pin was high over the samples [start,
+            stop[, numpy array of 8 floats. A sample lasts until the next one.
+        '''
+        np = self._np
+        start, stop = self._range(start, stop)
+        high = [0] * 8
+        if stop - start < 2:
+            return np.zeros(8)
+        # The last sample has no duration
+        for first in range(start, stop - 1, self.chunk):
+            last = min(first + self.chunk, stop - 1)
+            durations = np.diff(self.timestamps[first:last + 1])
+            values = self.values[first:last]
+            for pin in range(8):
+                high[pin] += int(durations[((values >> pin) & 1).view(bool)].sum())
+        total = int(self.timestamps[stop - 1] - self.timestamps[start])
+        if total == 0:
+            return np.zeros(8)
+        return np.array(high, dtype=np.float64) / total
+
+    def duty_cycle(self, pin, start=None, stop=None):
+        return float(self.duty_cycles(start, stop)[pin])
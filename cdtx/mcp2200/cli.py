@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+''' mcp2200 command line tool.
+
+    $ mcp2200 list
+    $ mcp2200 read-all
+    $ mcp2200 config set baud_rate=115200 rx_led=on
+    $ mcp2200 pin set 0=1 3=0
+    $ mcp2200 eeprom dump -o eeprom.bin
+    $ mcp2200 batch < script.txt        # one command per line, JSON lines out
+
+    Batch mode keeps the device open for the whole script. Input is read
+    ahead by a thread, and consecutive pin/port writes already available are
+    sent as a single SET_CLEAR_OUTPUTS : their results are reported once sent.
+'''
+import sys
+import json
+import queue
+import shlex
+import argparse
+import threading
+
+from .api import SimpleIOClass
+from .codec import CONFIG_FIELDS, MCP2200Config
+from .device import MCP2200_VID, MCP2200_PID, MCP2200_EEPROM_SIZE, get_backend
+from .profile import MCP2200Profile, OPTIONS
+
+
+class CommandError(Exception):
+    ''' A command line that can't be run '''
+
+
+class _Parser(argparse.ArgumentParser):
+    # Batch mode reports the errors instead of exiting
+    def error(self, message):
+        raise CommandError(message)
+
+
+def _int(text):
+    return int(text, 0)
+
+def _bool(text):
+    value = text.lower()
+    if value in ('1', 'on', 'true', 'yes'):
+        return True
+    if value in ('0', 'off', 'false', 'no'):
+        return False
+    raise CommandError('Not a boolean : %s' % text)
+
+def _assignments(items):
+    ''' ['name=value', ...] as [(name, value), ...] '''
+    pairs = []
+    for item in items:
+        name, sep, value = item.partition('=')
+        if not sep:
+            raise CommandError('Expecting name=value, got %s' % item)
+        pairs.append((name, value))
+    return pairs
+
+def _check_pin(pin):
+    if not 0 <= pin <= 7:
+        raise CommandError('No pin %d' % pin)
+    return pin
+
+
+# Commands : func(api, args) returns a JSON serialisable result
+
+def cmd_read_all(api, args):
+    return api.device.read_all()
+
+def cmd_config_get(api, args):
+    config = MCP2200Config.from_dict(api.device.read_config(max_age=0))
+    result = config.as_dict()
+    result.update((name, getattr(config, name)) for name in OPTIONS)
+    return result
+
+def cmd_config_set(api, args):
+    changes = []
+    for name, value in _assignments(args.assignments):
+        if name in CONFIG_FIELDS or name == 'baud_rate':
+            changes.append((name, _int(value)))
+        elif name in OPTIONS:
+            changes.append((name, _bool(value)))
+        else:
+            raise CommandError('Unknown field %s' % name)
+
+    def modifier(values):
+        config = MCP2200Config.from_dict(values)
+        for name, value in changes:
+            setattr(config, name, value)
+        values.update(config.as_dict())
+    return api.device.modify_config(modifier)
+
+def cmd_pin_get(api, args):
+    return {str(pin):value for (pin, value) in api.read_pins([_check_pin(pin) for pin in args.pins]).items()}
+
+def cmd_pin_set(api, args):
+    set_bmap = clear_bmap = 0
+    for pin, value in _assignments(args.assignments):
+        bit = 1 << _check_pin(_int(pin))
+        if _bool(value):
+            set_bmap, clear_bmap = set_bmap | bit, clear_bmap & ~bit
+        else:
+            set_bmap, clear_bmap = set_bmap & ~bit, clear_bmap | bit
+    return api.outputs.set_clear(set_bmap, clear_bmap)
+
+def cmd_port_get(api, args):
+    return api.ReadPortValue()
+
+def cmd_port_set(api, args):
+    if not api.WritePort(args.value):
+        raise CommandError('Port value out of range : %d' % args.value)
+    return True
+
+def _check_address(address):
+    if not 0 <= address < MCP2200_EEPROM_SIZE:
+        raise CommandError('No EEPROM address %d' % address)
+    return address
+
+def cmd_eeprom_read(api, args):
+    return api.device.read_ee(_check_address(args.address))['EEP_Val']
+
+def cmd_eeprom_write(api, args):
+    if not 0 <= args.value <= 0xff:
+        raise CommandError('Not a byte : %d' % args.value)
+    api.device.write_ee(_check_address(args.address), args.value)
+    return True
+
+def cmd_eeprom_dump(api, args):
+    image = api.dump_eeprom(args.start, args.length)
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(image)
+        return len(image)
+    return image.hex()
+
+def cmd_eeprom_load(api, args):
+    with open(args.file, 'rb') as f:
+        image = f.read()
+    return api.restore_eeprom(image, args.start)
+
+def cmd_profile_save(api, args):
+    profile = MCP2200Profile.capture(api.device, eeprom=not args.no_eeprom)
+    profile.save(args.file)
+    return True
+
+def cmd_profile_apply(api, args):
+    return MCP2200Profile.load(args.file).apply(api.device, verify=args.verify)
+
+# Commands sending SET_CLEAR_OUTPUTS only, combined in batch mode
+OUTPUT_COMMANDS = (cmd_pin_set, cmd_port_set)
+
+
+def command_parser(parser):
+    ''' Add the device commands to parser '''
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    sub = commands.add_parser('read-all', help='READ_ALL : NVRAM configuration, EEPROM pointer and port')
+    sub.set_defaults(func=cmd_read_all)
+
+    config = commands.add_parser('config', help='NVRAM configuration').add_subparsers(dest='action', metavar='action')
+    config.required = True
+    config.add_parser('get', help='fields and options').set_defaults(func=cmd_config_get)
+    sub = config.add_parser('set', help='field=value..., e.g. IO_bmap=0x0f baud_rate=9600 rx_led=on')
+    sub.add_argument('assignments', nargs='+')
+    sub.set_defaults(func=cmd_config_set)
+
+    pin = commands.add_parser('pin', help='GPIO pins').add_subparsers(dest='action', metavar='action')
+    pin.required = True
+    sub = pin.add_parser('get', help='pin...')
+    sub.add_argument('pins', nargs='+', type=_int)
+    sub.set_defaults(func=cmd_pin_get)
+    sub = pin.add_parser('set', help='pin=0|1..., a single report')
+    sub.add_argument('assignments', nargs='+')
+    sub.set_defaults(func=cmd_pin_set)
+
+    port = commands.add_parser('port', help='GPIO port').add_subparsers(dest='action', metavar='action')
+    port.required = True
+    port.add_parser('get').set_defaults(func=cmd_port_get)
+    sub = port.add_parser('set')
+    sub.add_argument('value', type=_int)
+    sub.set_defaults(func=cmd_port_set)
+
+    eeprom = commands.add_parser('eeprom', help='user EEPROM').add_subparsers(dest='action', metavar='action')
+    eeprom.required = True
+    sub = eeprom.add_parser('read')
+    sub.add_argument('address', type=_int)
+    sub.set_defaults(func=cmd_eeprom_read)
+    sub = eeprom.add_parser('write')
+    sub.add_argument('address', type=_int)
+    sub.add_argument('value', type=_int)
+    sub.set_defaults(func=cmd_eeprom_write)
+    sub = eeprom.add_parser('dump', help='hexadecimal, or raw to a file')
+    sub.add_argument('--start', type=_int, default=0)
+    sub.add_argument('--length', type=_int, default=None)
+    sub.add_argument('-o', '--output')
+    sub.set_defaults(func=cmd_eeprom_dump)
+    sub = eeprom.add_parser('load', help='raw image, only the bytes that differ are written')
+    sub.add_argument('file')
+    sub.add_argument('--start', type=_int, default=0)
+    sub.set_defaults(func=cmd_eeprom_load)
+
+    profile = commands.add_parser('profile', help='board profiles').add_subparsers(dest='action', metavar='action')
+    profile.required = True
+    sub = profile.add_parser('save', help='.json or .bin')
+    sub.add_argument('file')
+    sub.add_argument('--no-eeprom', action='store_true')
+    sub.set_defaults(func=cmd_profile_save)
+    sub = profile.add_parser('apply', help='only the differences are written')
+    sub.add_argument('file')
+    sub.add_argument('--verify', action='store_true')
+    sub.set_defaults(func=cmd_profile_apply)
+    return commands
+
+
+def build_parser():
+    parser = _Parser(prog='mcp2200', description='Drive MCP2200 devices through their HID interface')
+    parser.add_argument('--vid', type=_int, default=MCP2200_VID)
+    parser.add_argument('--pid', type=_int, default=MCP2200_PID)
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('-i', '--index', type=int, default=0, help='device index (default 0)')
+    selection.add_argument('-s', '--serial', help='device serial number')
+    selection.add_argument('-p', '--path', help='device bus path, see list')
+    parser.add_argument('--backend', choices=('auto', 'hidraw', 'pyusb', 'sim', 'daemon'), default='auto',
+        help='sim : a software MCP2200, for testing ; daemon : through mcp2200-daemon')
+    parser.add_argument('--socket', default=None, help='socket of the daemon backend')
+    parser.add_argument('--timeout', type=float, default=None, help='report timeout in seconds')
+    parser.add_argument('--json', action='store_true', help='JSON output')
+    parser.add_argument('--record', metavar='FILE', help='record the HID traffic to FILE (see cdtx.mcp2200.recorder)')
+
+    commands = command_parser(parser)
+    commands.add_parser('list', help='devices found')
+    sub = commands.add_parser('batch', help='run the commands of a file (stdin by default), JSON lines out')
+    sub.add_argument('file', nargs='?', default='-')
+    sub.add_argument('--stop-on-error', action='store_true')
+    return parser
+
+
+def make_backend(args):
+    if args.backend == 'sim':
+        from .simulator import SimulatorBackend
+        return SimulatorBackend()
+    if args.backend == 'daemon':
+        from .daemon import DaemonBackend, DEFAULT_SOCKET
+        return DaemonBackend(args.socket or DEFAULT_SOCKET)
+    if args.backend == 'auto':
+        return None
+    return get_backend(args.backend)
+
+
+def open_api(args, backend=None):
+    ''' A SimpleIOClass with the device selected by args connected '''
+    api = SimpleIOClass(backend if backend is not None else make_backend(args))
+    api.InitMCP2200(args.vid, args.pid)
+    if args.serial is not None:
+        ret = api.select(serial=args.serial)
+    elif args.path is not None:
+        ret = api.select(path=args.path)
+    else:
+        ret = api.SelectDevice(args.index)
+    if ret != 0:
+        raise CommandError('No such device')
+    if args.timeout is not None:
+        api.device.timeout = args.timeout
+    return api
+
+
+def list_devices(args, backend=None):
+    api = SimpleIOClass(backend if backend is not None else make_backend(args))
+    api.InitMCP2200(args.vid, args.pid)
+    return [{'index':entry.index, 'path':entry.path, 'serial':entry.serial} for entry in api.registry]
+
+
+def format_text(result):
+    if isinstance(result, dict):
+        return '\n'.join('%s: %s' % (key, _format_value(value)) for (key, value) in result.items())
+    if isinstance(result, list):
+        return '\n'.join(format_text(item) for item in result)
+    if isinstance(result, bool):
+        return 'ok' if result else 'failed'
+    return str(result)
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return 'on' if value else 'off'
+    return format_text(value)
+
+
+def _reader(stream, lines):
+    for number, line in enumerate(stream, 1):
+        lines.put((number, line))
+    lines.put(None)
+
+
+def run_batch(api, stream, out, stop_on_error=False):
+    ''' Run the commands read from stream, write a JSON line per command to out.
+        Returns the number of failed commands.
+    '''
+    parser = _Parser(prog='batch', add_help=False)
+    command_parser(parser)
+    lines = queue.Queue()
+    threading.Thread(target=_reader, args=(stream, lines), name='mcp2200-batch', daemon=True).start()
+
+    failures = 0
+    # Output commands already run, sent with the next flush
+    combined = []
+
+    def report(number, line, result=None, error=None):
+        record = {'line':number, 'command':line, 'ok':error is None}
+        if error is None:
+            record['result'] = result
+        else:
+            record['error'] = str(error)
+        out.write(json.dumps(record) + '\n')
+
+    def flush():
+        nonlocal failures
+        if not combined:
+            return
+        try:
+            api.outputs.end()
+            error = None
+        except Exception as e:
+            error = e
+            failures += len(combined)
+        for number, line, result in combined:
+            report(number, line, result, error)
+        del combined[:]
+        out.flush()
+
+    while True:
+        try:
+            item = lines.get(block=not combined)
+        except queue.Empty:
+            # Nothing more to combine for now
+            flush()
+            continue
+        if item is None:
+            break
+        number, line = item
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        try:
+            args = parser.parse_args(shlex.split(line))
+            if args.func in OUTPUT_COMMANDS:
+                if not combined:
+                    api.outputs.begin()
+                try:
+                    combined.append((number, line, args.func(api, args)))
+                except Exception:
+                    if not combined:
+                        api.outputs.end()
+                    raise
+                continue
+            flush()
+            report(number, line, args.func(api, args))
+        except Exception as e:
+            flush()
+            failures += 1
+            report(number, line, error=e)
+            if stop_on_error:
+                break
+        out.flush()
+    flush()
+    return failures
+
+
+def main(argv=None, backend=None):
+    parser = build_parser()
+    recorder = None
+    try:
+        args = parser.parse_args(argv)
+        if args.record:
+            from .recorder import RecordingBackend
+            backend = recorder = RecordingBackend(args.record, backend if backend is not None else make_backend(args))
+        if args.command == 'list':
+            result = list_devices(args, backend)
+        else:
+            api = open_api(args, backend)
+            try:
+                if args.command == 'batch':
+                    stream = sys.stdin if args.file == '-' else open(args.file)
+                    try:
+                        return 1 if run_batch(api, stream, sys.stdout, args.stop_on_error) else 0
+                    finally:
+                        if stream is not sys.stdin:
+                            stream.close()
+                result = args.func(api, args)
+                api.flush_outputs()
+            finally:
+                api.device.disconnect()
+    except CommandError as e:
+        parser.print_usage(sys.stderr)
+        sys.stderr.write('mcp2200: %s\n' % e)
+        return 2
+    except Exception as e:
+        sys.stderr.write('mcp2200: %s\n' % e)
+        return 1
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+    print(json.dumps(result) if args.json else format_text(result))
+    return 0 if result is not False else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+''' Encoding and decoding of the MCP2200 16 bytes HID reports.
+
+    Requests are packed with precompiled structs into a buffer owned by the
+    codec and reused for every request, responses are unpacked in one call.
+'''
+import time
+import struct
+
+SET_CLEAR_OUTPUTS = 0x08
+CONFIGURE = 0x10
+READ_EE = 0x20
+WRITE_EE = 0x40
+READ_ALL = 0x80
+
+REPORT_SIZE = 16
+
+# NVRAM fields written by CONFIGURE and reported back by READ_ALL
+CONFIG_FIELDS = ('IO_bmap', 'Config_Alt_Pins', 'IO_Default_Val_bmap', 'Config_Alt_Options', 'Baud_H', 'Baud_L')
+# READ_ALL response fields, in report order
+READ_ALL_FIELDS = ('EEP_Addr', 'EEP_Val') + CONFIG_FIELDS + ('IO_Port_Val_bmap',)
+
+# Requests : the pad bytes are zeroed by pack_into
+SET_CLEAR_OUTPUTS_REQUEST = struct.Struct('<B10xBB3x')  # command, Set_bmap @11, Clear_bmap @12
+CONFIGURE_REQUEST = struct.Struct('<B3x6B6x')           # command, CONFIG_FIELDS @4..9
+READ_EE_REQUEST = struct.Struct('<BB14x')               # command, EEP_Addr
+WRITE_EE_REQUEST = struct.Struct('<BBB13x')             # command, EEP_Addr, EEP_Val
+READ_ALL_REQUEST = bytes([READ_ALL]) + bytes(REPORT_SIZE - 1)
+
+# Responses
+READ_EE_RESPONSE = struct.Struct('<xBxB12x')            # EEP_Addr @1, EEP_Val @3
+READ_ALL_RESPONSE = struct.Struct('<xBxB7B5x')          # READ_ALL_FIELDS @1, @3, @4..10
+PORT_OFFSET = 10
+
+
+class ReportCodec():
+    ''' Builds the requests in a single preallocated buffer.
+
+        The returned buffer is only valid until the next request is encoded,
+        it must be sent right away (BaseDevice.write copies it). Not thread
+        safe : MCP2200Device encodes while holding its lock.
+    '''
+    __slots__ = ('buffer',)
+
+    def __init__(self):
+        self.buffer = bytearray(REPORT_SIZE)
+
+    def set_clear_outputs(self, Set_bmap, Clear_bmap):
+        SET_CLEAR_OUTPUTS_REQUEST.pack_into(self.buffer, 0, SET_CLEAR_OUTPUTS, Set_bmap, Clear_bmap)
+        return self.buffer
+
+    def configure(self, IO_bmap, Config_Alt_Pins, IO_Default_Val_bmap, Config_Alt_Options, Baud_H, Baud_L):
+        CONFIGURE_REQUEST.pack_into(self.buffer, 0, CONFIGURE, IO_bmap, Config_Alt_Pins, IO_Default_Val_bmap, Config_Alt_Options, Baud_H, Baud_L)
+        return self.buffer
+
+    def read_ee(self, EEP_Addr):
+        READ_EE_REQUEST.pack_into(self.buffer, 0, READ_EE, EEP_Addr)
+        return self.buffer
+
+    def write_ee(self, EEP_Addr, EEP_Val):
+        WRITE_EE_REQUEST.pack_into(self.buffer, 0, WRITE_EE, EEP_Addr, EEP_Val)
+        return self.buffer
+
+    @staticmethod
+    def read_all():
+        return READ_ALL_REQUEST
+
+
+def decode_read_ee(report):
+    ''' (EEP_Addr, EEP_Val) '''
+    return READ_EE_RESPONSE.unpack_from(report)
+
+
+def decode_read_all(report):
+    ''' Tuple of the READ_ALL_FIELDS values '''
+    return READ_ALL_RESPONSE.unpack_from(report)
+
+
+def _bit(field, mask, doc):
+    def getter(self):
+        return bool(getattr(self, field) & mask)
+
+    def setter(self, value):
+        if value:
+            setattr(self, field, getattr(self, field) | mask)
+        else:
+            setattr(self, field, getattr(self, field) & ~mask & 0xff)
+    return property(getter, setter, doc=doc)
+
+
+class MCP2200Config():
+    ''' The NVRAM configuration, with accessors to the individual options.
+
+        >>> config = MCP2200Config.from_dict(device.read_config())
+        >>> config.rx_led = True
+        >>> config.baud_rate = 115200
+        >>> device.configure(**config.as_dict())
+    '''
+    __slots__ = CONFIG_FIELDS
+
+    def __init__(self, IO_bmap=0xff, Config_Alt_Pins=0x00, IO_Default_Val_bmap=0x00, Config_Alt_Options=0x00, Baud_H=0x04, Baud_L=0xe1):
+        self.IO_bmap = IO_bmap
+        self.Config_Alt_Pins = Config_Alt_Pins
+        self.IO_Default_Val_bmap = IO_Default_Val_bmap
+        self.Config_Alt_Options = Config_Alt_Options
+        self.Baud_H = Baud_H
+        self.Baud_L = Baud_L
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(*[values[field] for field in CONFIG_FIELDS])
+
+    def as_dict(self):
+        return {field:getattr(self, field) for field in CONFIG_FIELDS}
+
+    def as_tuple(self):
+        return tuple(getattr(self, field) for field in CONFIG_FIELDS)
+
+    def copy(self):
+        return MCP2200Config(*self.as_tuple())
+
+    def __eq__(self, other):
+        if not isinstance(other, MCP2200Config):
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, ' '.join('%s=0x%02x' % item for item in self.as_dict().items()))
+
+    # Config_Alt_Pins
+    tx_led = _bit('Config_Alt_Pins', 0x04, 'GP6 is the Tx LED')
+    rx_led = _bit('Config_Alt_Pins', 0x08, 'GP7 is the Rx LED')
+    usbcfg = _bit('Config_Alt_Pins', 0x40, 'GP0 is the USB configuration status pin')
+    suspend = _bit('Config_Alt_Pins', 0x80, 'GP1 is the USB suspend status pin')
+    # Config_Alt_Options
+    hardware_flow_control = _bit('Config_Alt_Options', 0x01, 'RTS/CTS flow control')
+    invert_polarity = _bit('Config_Alt_Options', 0x02, 'UART polarity inverted')
+    blink_slow = _bit('Config_Alt_Options', 0x20, 'LEDs blink 200 ms instead of 100 ms')
+    tx_toggle = _bit('Config_Alt_Options', 0x40, 'Tx LED toggles instead of blinking')
+    rx_toggle = _bit('Config_Alt_Options', 0x80, 'Rx LED toggles instead of blinking')
+
+    @property
+    def baud_divisor(self):
+        return self.Baud_H*256 + self.Baud_L
+
+    @property
+    def baud_rate(self):
+        return 12000000 // (self.baud_divisor + 1)
+
+    @baud_rate.setter
+    def baud_rate(self, value):
+        divisor = (12000000//value) - 1
+        self.Baud_H = divisor // 2**8
+        self.Baud_L = divisor % (2**8)
+
+
+class MCP2200Status(MCP2200Config):
+    ''' A decoded READ_ALL response '''
+    __slots__ = ('EEP_Addr', 'EEP_Val', 'IO_Port_Val_bmap')
+
+    def __init__(self, EEP_Addr, EEP_Val, IO_bmap, Config_Alt_Pins, IO_Default_Val_bmap, Config_Alt_Options, Baud_H, Baud_L, IO_Port_Val_bmap):
+        super(MCP2200Status, self).__init__(IO_bmap, Config_Alt_Pins, IO_Default_Val_bmap, Config_Alt_Options, Baud_H, Baud_L)
+        self.EEP_Addr = EEP_Addr
+        self.EEP_Val = EEP_Val
+        self.IO_Port_Val_bmap = IO_Port_Val_bmap
+
+    @classmethod
+    def from_report(cls, report):
+        return cls(*decode_read_all(report))
+
+    def as_dict(self):
+        ''' Same dict as MCP2200Device.read_all() '''
+        return {field:getattr(self, field) for field in READ_ALL_FIELDS}
+
+    def config(self):
+        return MCP2200Config(*self.as_tuple())
+
+    def pin(self, pin):
+        return (self.IO_Port_Val_bmap >> pin) & 1
+
+
+class PortSnapshot():
+    ''' The GPIO port value (IO_Port_Val_bmap) read at time (time.monotonic()) '''
+    __slots__ = ('value', 'time')
+
+    def __init__(self, value, time):
+        self.value = value
+        self.time = time
+
+    @property
+    def age(self):
+        ''' Seconds since the port was read '''
+        return time.monotonic() - self.time
+
+    def pin(self, pin):
+        return (self.value >> pin) & 1
+
+    def pins(self, pins=range(8)):
+        ''' {pin: value} for the given pins, all of them by default '''
+        value = self.value
+        return {pin:(value >> pin) & 1 for pin in pins}
+
+    def __repr__(self):
+        return '<PortSnapshot 0x%02x %.3fs old>' % (self.value, self.age)
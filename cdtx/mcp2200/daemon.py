@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+''' Share the boards between processes : a daemon keeps them claimed and
+    serves the HID transactions of its clients over a Unix socket.
+
+    $ python -m cdtx.mcp2200.daemon
+
+    >>> from cdtx.mcp2200.daemon import DaemonBackend
+    >>> api = SimpleIOClass(DaemonBackend())
+    >>> dev = MCP2200Device(backend=DaemonBackend(), autoConnect=True)
+
+    DaemonBackend is a backend like PyUSBBackend : the devices and the API
+    work unchanged on top of it. MCP2200Device reads the configuration from
+    the board before each change (see DaemonBackend.shared), another client
+    may have changed it.
+
+    Protocol : frames made of HEADER (op, status, payload length) and the
+    payload. A client sends a request, the daemon answers it with the same op.
+    - OP_LIST : vid, pid (LIST_REQUEST) -> path NUL serial NUL ... per device
+    - OP_OPEN : path -> nothing, the connection now talks to this device
+    - OP_REPORT : timeout in ms (REPORT_TIMEOUT, 0 for the default), report
+      -> the response report for READ_EE/READ_ALL, the bytes written otherwise
+    A failed request is answered with a STATUS_* other than STATUS_OK and the
+    error message as payload.
+'''
+import os
+import sys
+import stat
+import socket
+import struct
+import argparse
+import threading
+import tempfile
+import socketserver
+
+from .device import BaseDevice, MCP2200_VID, MCP2200_PID, NO_RETRY, default_backend, get_backend
+from .errors import MCP2200Error, MCP2200TimeoutError, MCP2200DisconnectedError
+from .registry import DeviceRegistry
+from .stats import RESPONSE_COMMANDS
+
+def default_socket(environ=os.environ, uid=None):
+    ''' $XDG_RUNTIME_DIR/mcp2200.sock, private to the user, or for root
+        /run/mcp2200.sock. Without either, a socket named after the uid in the
+        temporary directory : the daemon can create it, and checks what it
+        replaces there (see MCP2200Daemon).
+    '''
+    if environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(environ['XDG_RUNTIME_DIR'], 'mcp2200.sock')
+    if uid is None:
+        uid = os.geteuid()
+    if uid == 0:
+        return '/run/mcp2200.sock'
+    return os.path.join(tempfile.gettempdir(), 'mcp2200-%d.sock' % uid)
+
+DEFAULT_SOCKET = default_socket()
+# Whoever reaches the socket drives the GPIOs : the owner and its group
+SOCKET_MODE = 0o660
+
+HEADER = struct.Struct('<BBH')          # op, status, payload length
+LIST_REQUEST = struct.Struct('<HH')     # vid, pid
+REPORT_TIMEOUT = struct.Struct('<H')    # ms, followed by the report
+WRITTEN = struct.Struct('<B')
+
+OP_LIST = 0x01
+OP_OPEN = 0x02
+OP_REPORT = 0x03
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_TIMEOUT = 2
+STATUS_DISCONNECTED = 3
+
+_ERRORS = {
+    STATUS_ERROR: MCP2200Error,
+    STATUS_TIMEOUT: MCP2200TimeoutError,
+    STATUS_DISCONNECTED: MCP2200DisconnectedError,
+}
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError('Connection closed')
+        data += chunk
+    return data
+
+def recv_frame(sock):
+    ''' (op, status, payload) '''
+    op, status, length = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    return op, status, _recv_exactly(sock, length) if length else b''
+
+def send_frame(sock, op, status=STATUS_OK, payload=b''):
+    sock.sendall(HEADER.pack(op, status, len(payload)) + payload)
+
+
+# Daemon
+
+class _Board():
+    ''' A device opened by the daemon, for as long as it runs '''
+    def __init__(self, entry, backend):
+        self.path = entry.path
+        # The clients retry themselves
+        self.device = BaseDevice(entry.dev, backend=backend, retry=NO_RETRY)
+        self.device.open()
+
+
+class _Connection(socketserver.BaseRequestHandler):
+    def handle(self):
+        daemon = self.server.owner
+        board = None
+        try:
+            while True:
+                op, _, payload = recv_frame(self.request)
+                try:
+                    if op == OP_REPORT:
+                        if board is None:
+                            raise MCP2200Error('No device opened')
+                        reply = daemon.transaction(board, payload)
+                    elif op == OP_LIST:
+                        reply = daemon.list(*LIST_REQUEST.unpack(payload))
+                    elif op == OP_OPEN:
+                        board = daemon.acquire(payload.decode('utf-8'))
+                        reply = b''
+                    else:
+                        raise MCP2200Error('Unknown op 0x%02x' % op)
+                except MCP2200TimeoutError as e:
+                    send_frame(self.request, op, STATUS_TIMEOUT, str(e).encode('utf-8'))
+                except MCP2200DisconnectedError as e:
+                    send_frame(self.request, op, STATUS_DISCONNECTED, str(e).encode('utf-8'))
+                except Exception as e:
+                    send_frame(self.request, op, STATUS_ERROR, str(e).encode('utf-8'))
+                else:
+                    send_frame(self.request, op, STATUS_OK, reply)
+        except (EOFError, OSError):
+            pass
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MCP2200Daemon():
+    ''' Owns the devices of backend and serves them on the Unix socket path.
+
+        A device is opened by its first client and stays claimed until the
+        daemon is closed. The socket is only open to the daemon's user and
+        group (SOCKET_MODE). Each client has its own connection and thread ;
+        the transactions of the clients of a device are queued in arrival
+        order by the device's FairLock, a request and its response are never
+        split. The clients' locks stay local to each process.
+    '''
+    def __init__(self, path=DEFAULT_SOCKET, backend=None, vid=MCP2200_VID, pid=MCP2200_PID):
+        self.path = path
+        self.backend = backend if backend is not None else default_backend
+        self.registry = DeviceRegistry(vid, pid, backend=self.backend, scan=False)
+        self.boards = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._remove_stale_socket()
+        self.server = _Server(path, _Connection, bind_and_activate=False)
+        try:
+            self.server.server_bind()
+            # Before listening : no connection is accepted with the umask's mode
+            os.chmod(path, SOCKET_MODE)
+            self.server.server_activate()
+        except Exception:
+            self.server.server_close()
+            raise
+        self.server.owner = self
+
+    def _remove_stale_socket(self):
+        ''' Remove the socket left by a daemon that didn't exit cleanly,
+            refused if a daemon still listens or if path isn't a socket
+        '''
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise MCP2200Error('%s exists and is not a socket' % self.path)
+        try:
+            with socket.socket(socket.AF_UNIX) as sock:
+                sock.connect(self.path)
+        except ConnectionRefusedError:
+            os.unlink(self.path)
+        else:
+            raise MCP2200Error('A daemon already listens on %s' % self.path)
+
+    def list(self, vid, pid):
+        with self._lock:
+            self.registry.vid, self.registry.pid = vid, pid
+            self.registry.scan()
+            return b''.join(('%s\0%s\0' % (entry.path, entry.serial or '')).encode('utf-8') for entry in self.registry)
+
+    def acquire(self, path):
+        with self._lock:
+            board = self.boards.get(path)
+            if board is None:
+                try:
+                    entry = self.registry.find(path=path)
+                except KeyError:
+                    self.registry.scan()
+                    try:
+                        entry = self.registry.find(path=path)
+                    except KeyError:
+                        raise MCP2200DisconnectedError('No device at %s' % path)
+                board = self.boards[path] = _Board(entry, self.backend)
+            return board
+
+    def transaction(self, board, payload):
+        (timeout,) = REPORT_TIMEOUT.unpack_from(payload)
+        request = payload[REPORT_TIMEOUT.size:]
+        if not request:
+            raise MCP2200Error('Empty report')
+        timeout = timeout / 1000 if timeout else None
+        try:
+            if request[0] in RESPONSE_COMMANDS:
+                return bytes(board.device.transaction(request, timeout=timeout))
+            return WRITTEN.pack(board.device.transaction(request, response=False, timeout=timeout) and len(request))
+        except MCP2200DisconnectedError:
+            # Opened again by the next client
+            with self._lock:
+                if self.boards.get(board.path) is board:
+                    del self.boards[board.path]
+            raise
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        ''' Serve from a background thread '''
+        self._thread = threading.Thread(target=self.serve_forever, name='mcp2200-daemon', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+        with self._lock:
+            for board in self.boards.values():
+                board.device.disconnect()
+            self.boards = {}
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+# Client
+
+class DaemonDeviceEntry():
+    ''' A device listed by the daemon, what DaemonBackend.find() returns '''
+    __slots__ = ('path', 'serial_number')
+
+    def __init__(self, path, serial_number):
+        self.path = path
+        self.serial_number = serial_number
+
+    def __repr__(self):
+        return '<DaemonDeviceEntry %s>' % self.path
+
+
+class DaemonHandle():
+    ''' A device opened through the daemon, on its own connection.
+
+        write() of a command answered by the device sends the request and
+        returns, read() waits for its response : the daemon runs the pair as
+        one transaction. A read without such a request pending times out
+        right away, like a drain of the actual device.
+    '''
+    def __init__(self, socket_path, device_path, reply_timeout=5.0):
+        self.reply_timeout = reply_timeout
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.settimeout(reply_timeout)
+        try:
+            self.sock.connect(socket_path)
+            self._request(OP_OPEN, device_path.encode('utf-8'))
+        except Exception:
+            self.sock.close()
+            raise
+        self._pending = 0
+
+    def _send(self, op, payload):
+        try:
+            send_frame(self.sock, op, STATUS_OK, payload)
+        except OSError as e:
+            raise MCP2200DisconnectedError('Daemon connection lost : %s' % e)
+
+    def _reply(self, op):
+        try:
+            reply_op, status, payload = recv_frame(self.sock)
+        except socket.timeout:
+            # The stream can't be trusted anymore
+            self.close()
+            raise MCP2200DisconnectedError('The daemon does not answer')
+        except (EOFError, OSError) as e:
+            raise MCP2200DisconnectedError('Daemon connection lost : %s' % e)
+        if reply_op != op:
+            raise MCP2200Error('Reply to op 0x%02x received for 0x%02x' % (reply_op, op))
+        if status != STATUS_OK:
+            raise _ERRORS.get(status, MCP2200Error)(payload.decode('utf-8', 'replace'))
+        return payload
+
+    def _request(self, op, payload):
+        self._send(op, payload)
+        return self._reply(op)
+
+    def write(self, data, timeout=None):
+        payload = REPORT_TIMEOUT.pack(0 if timeout is None else max(1, min(0xffff, int(timeout * 1000)))) + bytes(data)
+        if data[0] in RESPONSE_COMMANDS:
+            self._send(OP_REPORT, payload)
+            self._pending += 1
+            return len(data)
+        return WRITTEN.unpack(self._request(OP_REPORT, payload))[0]
+
+    def read(self, size, timeout=None):
+        if not self._pending:
+            raise MCP2200TimeoutError('No response pending')
+        self._pending -= 1
+        return bytearray(self._reply(OP_REPORT)[:size])
+
+    def close(self):
+        self.sock.close()
+
+
+class DaemonBackend():
+    ''' Reach the devices through an MCP2200Daemon, see PyUSBBackend '''
+    # Other processes configure the boards too, a shadow configuration can't be trusted
+    shared = True
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, reply_timeout=5.0):
+        self.socket_path = socket_path
+        self.reply_timeout = reply_timeout
+
+    def find(self, vid, pid):
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.settimeout(self.reply_timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                raise MCP2200Error('No daemon on %s : %s' % (self.socket_path, e))
+            send_frame(sock, OP_LIST, STATUS_OK, LIST_REQUEST.pack(vid, pid))
+            _, status, payload = recv_frame(sock)
+        if status != STATUS_OK:
+            raise _ERRORS.get(status, MCP2200Error)(payload.decode('utf-8', 'replace'))
+        fields = payload.decode('utf-8').split('\0')[:-1]
+        return [DaemonDeviceEntry(path, serial or None) for (path, serial) in zip(fields[::2], fields[1::2])]
+
+    def path(self, dev):
+        return dev.path
+
+    def serial(self, dev):
+        return dev.serial_number
+
+    def open(self, dev):
+        return DaemonHandle(self.socket_path, dev.path, self.reply_timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='mcp2200-daemon', description='Share the MCP2200 devices between processes')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--backend', choices=('auto', 'hidraw', 'pyusb', 'sim'), default='auto')
+    args = parser.parse_args(argv)
+    if args.backend == 'sim':
+        from .simulator import SimulatorBackend
+        backend = SimulatorBackend()
+    else:
+        backend = get_backend(args.backend)
+    try:
+        daemon = MCP2200Daemon(args.socket, backend)
+    except OSError as e:
+        parser.exit(1, '%s: cannot listen on %s (%s), choose the socket with --socket\n' % (parser.prog, args.socket, e))
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
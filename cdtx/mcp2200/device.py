@@ -1,89 +1,336 @@
 #!/usr/bin/env python
 import sys
-import usb
-import usb.core
-import usb.util
+import time
+import os
+
+from .codec import *
+from .errors import MCP2200Error, MCP2200TimeoutError, MCP2200ResponseError, MCP2200DisconnectedError
+from .stats import Stats, instrument_device, uninstrument
+from .lock import FairLock
 
 MCP2200_VID = 0x04d8
 MCP2200_PID = 0x00df
 MCP2200_HID_INTERFACE = 2
+MCP2200_EEPROM_SIZE = 256
+# READ_EE requests in flight for the bulk EEPROM reads, see read_ee_range()
+EE_WINDOW = 8
+# Unexpected reports dropped while waiting for a response, before giving up
+MAX_STALE_REPORTS = 8
+# max_age of the cached readings (configuration, port) accepting any age ; None always reads
+ANY_AGE = float('inf')
+# read_config() default : the device's config_max_age
+_CONFIG_MAX_AGE = object()
+
+
+def _expired(age, max_age):
+    ''' Whether a reading age seconds old (None : there is none) is too old for max_age '''
+    return age is None or max_age is None or age > max_age
+
+
+
+class DeadHandle():
+    ''' Replaces the handle of a device that was unplugged, any I/O fails right away '''
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, size, timeout=None):
+        raise MCP2200DisconnectedError('Device %s was unplugged' % self.path)
+
+    def write(self, data, timeout=None):
+        raise MCP2200DisconnectedError('Device %s was unplugged' % self.path)
+
+    def close(self):
+        pass
+
+
+# Transports tried by AutoBackend, in this order
+BACKENDS = ('hidraw', 'pyusb') if sys.platform.startswith('linux') else ('pyusb',)
+
+
+def get_backend(name):
+    ''' A new backend by name : pyusb, hidraw or auto. Its module is only imported now. '''
+    if name == 'pyusb':
+        from .pyusb_backend import PyUSBBackend
+        return PyUSBBackend()
+    if name == 'hidraw':
+        from .hidraw import HidrawBackend
+        return HidrawBackend()
+    if name == 'auto':
+        return AutoBackend()
+    raise ValueError('Unknown backend %s' % name)
+
+
+def find_path(backend, vid, pid, path):
+    ''' The devices of backend at the bus path, with its find_path() if it has one '''
+    if hasattr(backend, 'find_path'):
+        return backend.find_path(vid, pid, path)
+    return [dev for dev in backend.find(vid, pid) if backend.path(dev) == path]
+
+
+class AutoBackend():
+    ''' Picks the transport at the first find() : the one named by the
+        MCP2200_BACKEND environment variable, or else the first of candidates
+        that is available and finds devices. The choice is kept once a
+        backend found devices.
+
+        On Linux, hidraw comes first : it talks to the kernel HID driver
+        without detaching it, and doesn't need pyusb, which isn't even
+        imported then.
+    '''
+    def __init__(self, candidates=None):
+        self.candidates = candidates if candidates is not None else BACKENDS
+        self.backend = None
+        self._settled = False
+
+    @property
+    def name(self):
+        return self.backend.name if self.backend is not None else None
+
+    def _available(self):
+        forced = os.environ.get('MCP2200_BACKEND')
+        for name in ((forced,) if forced else self.candidates):
+            try:
+                yield get_backend(name)
+            except ImportError:
+                if forced:
+                    raise
+
+    def find(self, vid, pid):
+        if self._settled:
+            return self.backend.find(vid, pid)
+        error = None
+        for backend in self._available():
+            try:
+                devices = backend.find(vid, pid)
+            except Exception as e:
+                # e.g. pyusb without libusb
+                error = e
+                continue
+            self.backend = backend
+            if devices:
+                self._settled = True
+                return devices
+        if self.backend is None:
+            raise error if error is not None else MCP2200Error('No USB backend available, install pyusb')
+        return []
+
+    def path(self, dev):
+        return self.backend.path(dev)
+
+    def listing(self):
+        # Until a backend found devices, every find() tries them all again
+        listing = getattr(self.backend, 'listing', None) if self._settled else None
+        return listing() if listing is not None else None
+
+    def find_path(self, vid, pid, path):
+        return find_path(self.backend, vid, pid, path)
+
+    def serial(self, dev):
+        return self.backend.serial(dev)
+
+    def open(self, dev):
+        return self.backend.open(dev)
+
+default_backend = AutoBackend()
+
+
+def __getattr__(name):
+    # Formerly defined here, imported on demand now
+    if name in ('PyUSBHandle', 'PyUSBBackend'):
+        from . import pyusb_backend
+        return getattr(pyusb_backend, name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+class RetryPolicy():
+    ''' How many times a timed out transaction is sent again, and the delay
+        before each new attempt : backoff, multiplied by factor after each
+        attempt, up to max_backoff seconds.
+    '''
+    def __init__(self, retries=2, backoff=0.005, factor=2.0, max_backoff=0.1):
+        self.retries = retries
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+
+    def delays(self):
+        delay = self.backoff
+        for _ in range(self.retries):
+            yield delay
+            delay = min(delay * self.factor, self.max_backoff)
+
+NO_RETRY = RetryPolicy(retries=0)
 
 
 class BaseDevice():
-    ''' This class only manages the actual USB connection '''
-    def __init__(self, dev=None, autoConnect=False):
+    ''' This class only manages the actual USB connection.
+
+        timeout is the default timeout of a report in seconds (None : the
+        backend's default), retry the RetryPolicy of the transactions.
+
+        Threads can share a device : a transaction holds lock, a FairLock,
+        from the request to its response, retries included. Hold it to make
+        several transactions atomic. read() and write() are the raw reports, unlocked.
+    '''
+    def __init__(self, dev=None, autoConnect=False, backend=None, timeout=None, retry=None):
         self.dev = dev
+        self.handle = None
+        self.backend = backend if backend is not None else default_backend
+        self.timeout = timeout
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.lock = FairLock()
+        # Set when a response may still be on its way : drained before the next transaction
+        self.drain_timeout = 0.005
+        self._stale = False
+        self._path = None
+        self._identity = None
+        self.stats = None
         if autoConnect:
             self.connect()
 
     @classmethod
-    def discover(cls, vid=MCP2200_VID, pid=MCP2200_PID):
-        return [cls(dev) for dev in usb.core.find(find_all=True, idVendor=vid, idProduct=pid)]
+    def discover(cls, vid=MCP2200_VID, pid=MCP2200_PID, backend=None):
+        if backend is None:
+            backend = default_backend
+        return [cls(dev, backend=backend) for dev in backend.find(vid, pid)]
 
     def path(self):
-        return repr(self.dev)
+        if self._path is None or self._path[0] is not self.dev:
+            self._path = (self.dev, repr(self.dev))
+        return self._path[1]
+
+    def identity(self):
+        ''' Position of the device on the bus (see the backend's path()), computed once '''
+        if self._identity is None or self._identity[0] is not self.dev:
+            self._identity = (self.dev, self.backend.path(self.dev) if self.dev is not None else None)
+        return self._identity[1]
 
     def __eq__(self, other):
         if other is None:
             return False
-        return self.path() == other.path()
+        return self.identity() == other.identity()
+
+    def __hash__(self):
+        return hash(self.identity())
 
     def connect(self, vid=MCP2200_VID, pid=MCP2200_PID, deviceId=0):
         # decimal vendor and product values
-        self.dev = [dev for dev in usb.core.find(find_all=True, idVendor=vid, idProduct=pid)][deviceId]
+        self.dev = self.backend.find(vid, pid)[deviceId]
+        return self.open()
+
+    def open(self):
+        ''' Open the device given at construction (e.g. by discover()) without enumerating again '''
         if not self.dev:
             return False
 
-        self.epIn = self.dev[0][(MCP2200_HID_INTERFACE,0)][0]
-        self.epOut = self.dev[0][(MCP2200_HID_INTERFACE,0)][1]
-
-        try:
-            self.attach = False
-            if self.dev.is_kernel_driver_active(MCP2200_HID_INTERFACE):
-                # tell the kernel to detach
-                self.dev.detach_kernel_driver(MCP2200_HID_INTERFACE)
-                # Remember to reattach the device at the end of the session
-                self.attach = True
-
-            # claim the device
-            usb.util.claim_interface(self.dev, MCP2200_HID_INTERFACE)
-        except Exception as e:
-            # release the device
-            usb.util.release_interface(self.dev, MCP2200_HID_INTERFACE)
-            if self.attach:
-                # reattach the device to the OS kernel
-                self.dev.attach_kernel_driver(MCP2200_HID_INTERFACE)
-            raise e
-                
+        self.handle = self.backend.open(self.dev)
+        self._stale = False
         return self.dev != None
 
     def disconnect(self):
         if self.dev:
             try:
-                usb.util.release_interface(self.dev, MCP2200_HID_INTERFACE)
-                usb.util.dispose_resources(self.dev)
+                if self.handle:
+                    self.handle.close()
+                self.handle = None
                 self.dev = None
                 return True
             except:
                 return False
         return True
 
-    def read(self):
-        ret = self.dev.read(self.epIn.bEndpointAddress, 16)
-        return ret
-
-    def write(self, data):
-        return self.dev.write(self.epOut.bEndpointAddress, data) == len(data)
+    def enable_stats(self, stats=None):
+        ''' Count the reports and time the commands into stats (a new Stats by default).
+            Returns the Stats object.
+        '''
+        if self.stats is not None:
+            self.disable_stats()
+        self.stats = stats if stats is not None else Stats()
+        instrument_device(self, self.stats)
+        return self.stats
+
+    def disable_stats(self):
+        uninstrument(self, ('read', 'write'))
+        self.stats = None
+
+    def mark_dead(self):
+        ''' The device was unplugged : fail the next I/O instead of waiting for USB errors '''
+        if self.handle is not None:
+            self.handle = DeadHandle(self.identity())
+
+    @property
+    def alive(self):
+        return self.handle is not None and not isinstance(self.handle, DeadHandle)
+
+    def read(self, timeout=None):
+        if self.handle is None:
+            raise MCP2200DisconnectedError('Device is not opened')
+        return self.handle.read(16, self.timeout if timeout is None else timeout)
+
+    def write(self, data, timeout=None):
+        if self.handle is None:
+            raise MCP2200DisconnectedError('Device is not opened')
+        return self.handle.write(data, self.timeout if timeout is None else timeout) == len(data)
+
+    def drain(self):
+        ''' Drop the input reports already received, returns how many '''
+        count = 0
+        self._stale = False
+        while True:
+            try:
+                self.read(self.drain_timeout)
+            except MCP2200TimeoutError:
+                return count
+            count += 1
+            if count > MAX_STALE_REPORTS:
+                raise MCP2200ResponseError('The device keeps sending reports')
+
+    def transaction(self, request, response=True, timeout=None, retry=None, match=None):
+        ''' Write the request and return its response report (or the write
+            result for the commands without response).
+
+            The response must echo the command of the request, and satisfy
+            match(report) if given. Other reports are answers to an earlier
+            request that timed out : they're dropped. A timeout sends the
+            request again according to retry (defaults to self.retry), the
+            last one raises MCP2200TimeoutError.
+        '''
+        with self.lock:
+            return self._transact(request, response, timeout, retry, match)
 
-def check_params(*params):
-    def func_decorator(func):
-        def func_wrapper(self, *args, **kwargs):
-            for p in params:
-                if not p in kwargs.keys():
-                    raise Exception('Missing parameter %s' % p)
-            return func(self, *args, **kwargs)
-        return func_wrapper
-    return func_decorator
+    def _transact(self, request, response, timeout, retry, match):
+        ''' transaction(), the caller holds the lock '''
+        delays = None
+        while True:
+            try:
+                return self._exchange(request, response, timeout, match)
+            except MCP2200TimeoutError:
+                # The response may come after all, drop it before the next request
+                self._stale = True
+                if delays is None:
+                    delays = (retry if retry is not None else self.retry).delays()
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    def _exchange(self, request, response, timeout, match):
+        if self._stale:
+            self.drain()
+        if not response:
+            return self.write(request, timeout)
+        self.write(request, timeout)
+        return self._response(request[0], timeout, match)
+
+    def _response(self, command, timeout, match):
+        stale = 0
+        while stale <= MAX_STALE_REPORTS:
+            report = self.read(timeout)
+            if report[0] == command and (match is None or match(report)):
+                return report
+            stale += 1
+        self._stale = True
+        raise MCP2200ResponseError('No response to command 0x%02x among %d reports' % (command, MAX_STALE_REPORTS + 1))
 
 class MCP2200Device(BaseDevice):
     ''' Implements the basic supported HID commands :
@@ -92,10 +339,76 @@ class MCP2200Device(BaseDevice):
         - READ_EE
         - WRITE_EE
         - READ_ALL
+
+        The NVRAM configuration only changes through CONFIGURE, so the device
+        keeps a shadow copy of it : filled by read_all(), updated by configure().
+        read_config() answers from this copy while it is at most
+        config_max_age seconds old (ANY_AGE, the default : never expires,
+        None or 0 : always read the device).
+        Other processes may configure a board reached through a shared backend
+        (one with a true shared attribute, e.g. DaemonBackend) : its
+        configuration is always read then.
+
+        The last GPIO port value read is kept as well, see snapshot() : it's
+        forgotten by any command that may change the port.
+
+        Every max_age follows the same rule : a cached reading is used if it's
+        at most max_age seconds old, None always reads the device and ANY_AGE
+        (float('inf')) accepts any age.
+
+        Every command accepts a timeout in seconds overriding the device's one,
+        and goes through transaction() : retried on timeout, stale responses dropped.
     '''
+    def __init__(self, dev=None, autoConnect=False, backend=None, config_max_age=ANY_AGE, timeout=None, retry=None):
+        self.config_max_age = config_max_age
+        self._codec = ReportCodec()
+        self.invalidate_config()
+        # Last port value read, as (value, time.monotonic())
+        self._port = None
+        super(MCP2200Device, self).__init__(dev, autoConnect, backend, timeout, retry)
+
+    def open(self):
+        self.invalidate_config()
+        return super(MCP2200Device, self).open()
 
-    @check_params('Set_bmap', 'Clear_bmap')
-    def set_clear_outputs(self, **kwargs):
+    def disconnect(self):
+        self.invalidate_config()
+        return super(MCP2200Device, self).disconnect()
+
+    def invalidate_config(self):
+        ''' Forget the shadow configuration, next read_config() will read the device '''
+        self._config = None
+        self._config_time = None
+        self._port = None
+
+    def config_age(self):
+        ''' Age in seconds of the shadow configuration, None if there is none '''
+        if self._config is None:
+            return None
+        return time.monotonic() - self._config_time
+
+    def _update_config(self, values):
+        ''' values : tuple of the CONFIG_FIELDS values, in order '''
+        self._config = values
+        self._config_time = time.monotonic()
+
+    def read_config(self, max_age=_CONFIG_MAX_AGE):
+        ''' Return the NVRAM configuration fields (see CONFIG_FIELDS).
+
+            The shadow copy is used if it's at most max_age seconds old
+            (defaults to config_max_age), otherwise a READ_ALL is issued.
+            Live values such as IO_Port_Val_bmap are only available from read_all().
+        '''
+        if max_age is _CONFIG_MAX_AGE:
+            max_age = self.config_max_age
+        if getattr(self.backend, 'shared', False):
+            max_age = None
+        with self.lock:
+            if _expired(self.config_age(), max_age):
+                self._read_all_values()
+            return dict(zip(CONFIG_FIELDS, self._config))
+
+    def set_clear_outputs(self, Set_bmap, Clear_bmap, timeout=None, **kwargs):
         ''' The 
             SET_CLEAR_OUTPUTS
                command   is   used   for
@@ -111,14 +424,19 @@ class MCP2200Device(BaseDevice):
             Clear_bmap  Bitmap for clearing the corresponding GPIOs
             ==========  ===========================================
         '''
-        data = [0]*16
-        data[0] = 0x08
-        data[11] = kwargs['Set_bmap']
-        data[12] = kwargs['Clear_bmap']
-        return self.write(data)
-
-    @check_params('IO_bmap', 'Config_Alt_Pins', 'IO_Default_Val_bmap', 'Config_Alt_Options', 'Baud_H', 'Baud_L')
-    def configure(self, **kwargs):
+        # The codec's buffer is shared, encode under the lock
+        with self.lock:
+            return self.send_outputs(self._codec.set_clear_outputs(Set_bmap, Clear_bmap), timeout)
+
+    def send_outputs(self, report, timeout=None):
+        ''' Send a SET_CLEAR_OUTPUTS report built beforehand (see
+            ReportCodec.set_clear_outputs), like set_clear_outputs() does.
+        '''
+        with self.lock:
+            self._port = None
+            return self._transact(report, False, timeout, None, None)
+
+    def configure(self, IO_bmap, Config_Alt_Pins, IO_Default_Val_bmap, Config_Alt_Options, Baud_H, Baud_L, timeout=None, **kwargs):
         ''' This  command  is  used  to  establish  the  configuration
             parameters  that  are  stored  in  NVRAM,  used  by  the
             MCP2200 after exiting the Reset mode
@@ -132,19 +450,40 @@ class MCP2200Device(BaseDevice):
             Baud_L                  Low byte of the default baud rate setting
             ===================     =============================================
         '''
-        data = [0]*16
-        data[0] = 0x10
-        data[4] = kwargs['IO_bmap']
-        data[5] = kwargs['Config_Alt_Pins']
-        data[6] = kwargs['IO_Default_Val_bmap']
-        data[7] = kwargs['Config_Alt_Options']
-        data[8] = kwargs['Baud_H']
-        data[9] = kwargs['Baud_L']
-        return self.write(data)
-
-
-    @check_params('EEP_Addr')
-    def read_ee(self, **kwargs):
+        config = (IO_bmap, Config_Alt_Pins, IO_Default_Val_bmap, Config_Alt_Options, Baud_H, Baud_L)
+        with self.lock:
+            try:
+                done = self._transact(self._codec.configure(*config), False, timeout, None, None)
+            except MCP2200Error:
+                self.invalidate_config()
+                raise
+            if done:
+                self._update_config(config)
+                # The directions and the output latch may have changed
+                self._port = None
+                return True
+            self.invalidate_config()
+            return False
+
+    def modify_config(self, *modifiers, timeout=None):
+        ''' Atomic read-modify-write of the NVRAM configuration.
+
+            Each modifier is called with the configuration dict (see
+            read_config) and updates it in place. CONFIGURE is only sent if
+            the result differs. Returns True when the device is up to date.
+        '''
+        with self.lock:
+            config = self.read_config()
+            target = dict(config)
+            for modifier in modifiers:
+                modifier(target)
+            if all(target[field] == config[field] for field in CONFIG_FIELDS):
+                # Nothing changed, spare the NVRAM a write cycle
+                return True
+            return self.configure(timeout=timeout, **target)
+
+
+    def read_ee(self, EEP_Addr, timeout=None, **kwargs):
         ''' The  READ_EE  command  is  used  to  read  a  single
             EEPROM  memory  location  (1 byte)  out  of  a  total  of
             256 bytes  of  the  user’s  EEPROM.  The  MCP2200
@@ -162,15 +501,12 @@ class MCP2200Device(BaseDevice):
             EEP_Val     Value of the requested EEPROM location)
             ========    =======================================
         '''
-        data = [0]*16
-        data[0] = 0x20
-        data[1] = kwargs['EEP_Addr']
-        self.write(data)
-        r = self.read()
-        return {key:r[value] for (key, value) in {'EEP_Addr':1, 'EEP_Val':3}.items()}
-
-    @check_params('EEP_Addr', 'EEP_Val')
-    def write_ee(self, **kwargs):
+        with self.lock:
+            report = self._transact(self._codec.read_ee(EEP_Addr), True, timeout, None, lambda r: r[1] == EEP_Addr)
+        addr, value = decode_read_ee(report)
+        return {'EEP_Addr':addr, 'EEP_Val':value}
+
+    def write_ee(self, EEP_Addr, EEP_Val, timeout=None, **kwargs):
         ''' The  WRITE_EE  command  is  used  to  write  a  single
             EEPROM location (1 byte) out of a total of 256 bytes of
             user EEPROM, present in the MCP2200 device.
@@ -180,13 +516,98 @@ class MCP2200Device(BaseDevice):
             EEP_Val     This is the desired value to be written in the EEPROM memory location addressed by EEP_Addr
             ========    ===========================================================================================
             '''
-        data = [0]*16
-        data[0] = 0x40
-        data[1] = kwargs['EEP_Addr']
-        data[2] = kwargs['EEP_Val']
-        self.write(data)
+        with self.lock:
+            return self._transact(self._codec.write_ee(EEP_Addr, EEP_Val), False, timeout, None, None)
+
+    def _check_ee_range(self, start, length):
+        if start < 0 or length < 0 or start + length > MCP2200_EEPROM_SIZE:
+            raise ValueError('EEPROM range [%d, %d[ out of [0, %d[' % (start, start+length, MCP2200_EEPROM_SIZE))
+
+    def read_ee_range(self, start=0, length=None, window=EE_WINDOW, timeout=None):
+        ''' Read length bytes of EEPROM starting at start (defaults to the whole EEPROM).
 
-    def read_all(self, **kwargs):
+            Up to window READ_EE requests are sent before collecting their responses.
+            Each response carries its address : the responses to other addresses
+            are dropped, and the addresses left unanswered by a timeout are
+            requested again according to the retry policy.
+            Returns bytes.
+        '''
+        if length is None:
+            length = MCP2200_EEPROM_SIZE - start
+        self._check_ee_range(start, length)
+        if window < 1:
+            raise ValueError('window must be at least 1')
+
+        image = bytearray(length)
+        with self.lock:
+            self._read_ee_windows(image, start, start + length, window, timeout)
+        return bytes(image)
+
+    def _read_ee_windows(self, image, start, end, window, timeout):
+        encode = self._codec.read_ee
+        addr = start
+        while addr < end:
+            missing = set(range(addr, min(addr + window, end)))
+            delays = self.retry.delays()
+            while missing:
+                if self._stale:
+                    self.drain()
+                try:
+                    for a in sorted(missing):
+                        self.write(encode(a), timeout)
+                    self._collect_ee(missing, image, start, timeout)
+                except MCP2200TimeoutError:
+                    self._stale = True
+                    delay = next(delays, None)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+            addr = min(addr + window, end)
+
+    def _collect_ee(self, missing, image, start, timeout):
+        ''' Read the READ_EE responses of the missing addresses into image '''
+        stale = 0
+        while missing:
+            report = self.read(timeout)
+            r_addr, r_value = decode_read_ee(report)
+            if report[0] == READ_EE and r_addr in missing:
+                image[r_addr - start] = r_value
+                missing.discard(r_addr)
+            else:
+                stale += 1
+                if stale > MAX_STALE_REPORTS:
+                    self._stale = True
+                    raise MCP2200ResponseError('No READ_EE response among %d reports' % stale)
+
+    def write_ee_range(self, start, data, diff=True, timeout=None, window=EE_WINDOW):
+        ''' Write the bytes of data to the EEPROM starting at start.
+
+            WRITE_EE has no response, so the requests are streamed back to back.
+            With diff, the current content is read first (window as for
+            read_ee_range()) and only the bytes that differ are written.
+            Returns the number of bytes written.
+        '''
+        data = bytes(data)
+        self._check_ee_range(start, len(data))
+        with self.lock:
+            return self._write_ee_diff(start, data, diff, timeout, window)
+
+    def _write_ee_diff(self, start, data, diff, timeout, window):
+        if diff:
+            current = self.read_ee_range(start, len(data), window, timeout)
+        else:
+            current = None
+
+        written = 0
+        encode = self._codec.write_ee
+        for offset, value in enumerate(data):
+            if current is not None and current[offset] == value:
+                continue
+            self._transact(encode(start + offset, value), False, timeout, None, None)
+            written += 1
+        return written
+
+    def read_all(self, timeout=None, **kwargs):
         ''' This  command  is  used  to  retrieve  the  MCP2200’s NVRAM parameters.
 
         Response : ( EEP_Addr, EEP_Val, IO_bmap, Config_Alt_Pins, IO_Default_Val_bmap, Config_Alt_Options, Baud_H, Baud_L, IO_Port_Val_bmap)
@@ -203,12 +624,56 @@ class MCP2200Device(BaseDevice):
         IO_Port_Val_bmap        Bitmap of the GPIO port values
         ===================     ==========================================================
         '''
-        data = [0]*16
-        data[0] = 0x80
-        self.write(data)
-        ret = self.read()
-        return {key:ret[value] for (key, value) in {'EEP_Addr':1, 'EEP_Val':3, 'IO_bmap':4, 'Config_Alt_Pins':5, 'IO_Default_Val_bmap':6, 'Config_Alt_Options':7, 'Baud_H':8, 'Baud_L':9, 'IO_Port_Val_bmap':10}.items()}
+        return dict(zip(READ_ALL_FIELDS, self._read_all_values(timeout)))
+
+    def read_status(self, timeout=None):
+        ''' READ_ALL decoded as an MCP2200Status instead of a dict '''
+        return MCP2200Status(*self._read_all_values(timeout))
+
+    def _read_all_values(self, timeout=None):
+        with self.lock:
+            values = decode_read_all(self._transact(READ_ALL_REQUEST, True, timeout, None, None))
+            self._update_config(values[2:8])
+            self._port = (values[8], self._config_time)
+        return values
 
+    def read_port(self, timeout=None, max_age=None):
+        ''' READ_ALL reduced to the GPIO port value (IO_Port_Val_bmap), as an int.
+            The request is preallocated and the response isn't decoded any further.
+
+            With max_age, the last value read is returned if it's at most
+            max_age seconds old (see snapshot()). None always reads.
+        '''
+        if max_age is not None:
+            return self.snapshot(max_age, timeout).value
+        return self._read_port(timeout)[0]
+
+    def _read_port(self, timeout):
+        with self.lock:
+            port = self._port = (self._transact(READ_ALL_REQUEST, True, timeout, None, None)[PORT_OFFSET], time.monotonic())
+        return port
+
+    def port_age(self):
+        ''' Age in seconds of the last port value read, None if there is none '''
+        port = self._port
+        if port is None:
+            return None
+        return time.monotonic() - port[1]
+
+    def snapshot(self, max_age=None, timeout=None):
+        ''' The GPIO port as a PortSnapshot, giving any set of pins and the
+            age of the reading. A single READ_ALL is issued, unless the last
+            value read is at most max_age seconds old (None : always read,
+            ANY_AGE : any age).
+        '''
+        port = self._port
+        if _expired(None if port is None else time.monotonic() - port[1], max_age):
+            port = self._read_port(timeout)
+        return PortSnapshot(*port)
+
+    def read_pins(self, pins=range(8), max_age=None, timeout=None):
+        ''' {pin: value} of the given pins, from one snapshot() '''
+        return self.snapshot(max_age, timeout).pins(pins)
 
 
 if __name__ == '__main__':
@@ -2,3 +2,19 @@ E_WRONG_DEVICE_ID = -1
 E_INACTIVE_DEVICE = -2
 E_WRONG_ADDRESS = -3
 E_CANNOT_SEND_DATA = -4
+
+
+class MCP2200Error(IOError):
+    ''' Base class of the errors raised by the HID transactions '''
+
+class MCP2200TimeoutError(MCP2200Error):
+    ''' No report was sent or received in time '''
+
+class MCP2200ResponseError(MCP2200Error):
+    ''' The device answered something else than the response to the request '''
+
+class MCP2200DisconnectedError(MCP2200Error):
+    ''' The device is not connected anymore '''
+
+class MCP2200ReplayError(MCP2200Error):
+    ''' The session being replayed departs from its recording '''
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+''' Run commands on many MCP2200 at once.
+
+    >>> with MCP2200Fleet() as fleet:
+    ...     for result in fleet.read_all():
+    ...         print(result.index, result.value if result.ok else result.error)
+'''
+from concurrent.futures import ThreadPoolExecutor
+
+from .device import MCP2200Device, MCP2200_VID, MCP2200_PID
+from .errors import MCP2200Error
+from .profile import MCP2200Profile
+
+
+class FleetResult():
+    ''' Outcome of a command on one device of the fleet '''
+    __slots__ = ('index', 'device', 'value', 'error')
+
+    def __init__(self, index, device, value=None, error=None):
+        self.index = index
+        self.device = device
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return '<FleetResult %d: %r>' % (self.index, self.value)
+        return '<FleetResult %d: error %r>' % (self.index, self.error)
+
+
+class MCP2200Fleet():
+    ''' Holds a connection to several devices and runs commands on all of them,
+        or a subset, concurrently.
+
+        Commands run on a pool of max_workers threads. A command holds the
+        lock of its device (see BaseDevice.lock), so a device never runs two
+        commands at the same time while different devices proceed in parallel.
+
+        Every command returns a list of FleetResult, in the order of the
+        selected devices. An exception raised for one device is stored in its
+        result and doesn't stop the others.
+
+        With connect, the devices that failed to open stay in the fleet (their
+        commands fail too), their results are kept in open_errors. When none
+        of them could be opened, MCP2200Error is raised.
+    '''
+    def __init__(self, devices=None, vid=MCP2200_VID, pid=MCP2200_PID, backend=None, max_workers=8, connect=True):
+        if devices is None:
+            devices = MCP2200Device.discover(vid, pid, backend=backend)
+        self.devices = list(devices)
+        self.locks = [device.lock for device in self.devices]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._closed = False
+        self.open_errors = []
+        if connect:
+            self.open_errors = [result for result in self.open() if not result.ok]
+            if self.devices and len(self.open_errors) == len(self.devices):
+                self.close()
+                raise MCP2200Error('None of the %d devices could be opened : %s' % (len(self.devices), self.open_errors[0].error)) from self.open_errors[0].error
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _select(self, devices):
+        if devices is None:
+            return list(range(len(self.devices)))
+        return [dev if isinstance(dev, int) else self.devices.index(dev) for dev in devices]
+
+    def _run_one(self, index, func, args, kwargs):
+        device = self.devices[index]
+        try:
+            with self.locks[index]:
+                return FleetResult(index, device, value=func(device, *args, **kwargs))
+        except Exception as e:
+            return FleetResult(index, device, error=e)
+
+    def run(self, func, *args, devices=None, **kwargs):
+        ''' Call func(device, *args, **kwargs) for every selected device.
+            devices is a list of indexes or device objects, all the devices by default.
+        '''
+        futures = [self._executor.submit(self._run_one, index, func, args, kwargs) for index in self._select(devices)]
+        return [future.result() for future in futures]
+
+    def call(self, name, *args, devices=None, **kwargs):
+        ''' Call the MCP2200Device method name on every selected device '''
+        return self.run(lambda device, *a, **kw: getattr(device, name)(*a, **kw), *args, devices=devices, **kwargs)
+
+    def open(self, devices=None):
+        return self.call('open', devices=devices)
+
+    def close(self):
+        ''' Disconnect the devices and stop the threads, once '''
+        if self._closed:
+            return
+        self._closed = True
+        self.call('disconnect')
+        self._executor.shutdown()
+
+    def read_all(self, devices=None):
+        return self.call('read_all', devices=devices)
+
+    def configure(self, devices=None, **config):
+        return self.call('configure', devices=devices, **config)
+
+    def set_clear_outputs(self, Set_bmap, Clear_bmap, devices=None):
+        return self.call('set_clear_outputs', Set_bmap=Set_bmap, Clear_bmap=Clear_bmap, devices=devices)
+
+    def read_ee_range(self, start=0, length=None, devices=None):
+        return self.call('read_ee_range', start, length, devices=devices)
+
+    def write_ee_range(self, start, data, diff=True, devices=None):
+        return self.call('write_ee_range', start, data, diff, devices=devices)
+
+    def capture_profiles(self, eeprom=True, devices=None):
+        ''' MCP2200Profile of every selected device '''
+        return self.run(MCP2200Profile.capture, eeprom, devices=devices)
+
+    def apply_profile(self, profile, verify=False, devices=None):
+        ''' Provision the selected devices with profile, only the differences are written '''
+        return self.run(lambda device: profile.apply(device, verify=verify), devices=devices)
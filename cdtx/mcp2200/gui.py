@@ -1,3 +1,5 @@
+import threading
+
 from PySide2 import QtCore
 from PySide2 import QtGui
 from PySide2 import QtWidgets
@@ -5,7 +7,8 @@ from PySide2.QtCore import SIGNAL, Signal, Slot, QObject
 from PySide2.QtWidgets import QHBoxLayout, QVBoxLayout, QGridLayout
 
 from cdtx.mcp2200.device import MCP2200_VID, MCP2200_PID
-import cdtx.mcp2200.api
+from cdtx.mcp2200.codec import CONFIG_FIELDS, MCP2200Config
+from cdtx.mcp2200.profile import OPTIONS
 from cdtx.mcp2200.api import SimpleIOClass
 
 class EasyLayoutWidget(QtWidgets.QWidget):
@@ -25,29 +28,160 @@ class EasyLayoutWidget(QtWidgets.QWidget):
             parent.addLayout(getattr(self, _name))
             self.deployLayouts(getattr(self, _name), _tree)
 
+class DeviceWorker(QObject):
+    ''' Runs the device I/O out of the GUI thread.
+
+        Jobs run one at a time, in the order they were submitted. Their result
+        comes back through done, or their exception through failed, along
+        with the callback given to submit() : the signals are delivered in
+        the thread of the connected receiver, the GUI one.
+    '''
+    _submitted = Signal(object, object, object)
+    done = Signal(object, object)
+    failed = Signal(object, object)
+
+    def __init__(self):
+        super(DeviceWorker, self).__init__()
+        self._thread = QtCore.QThread()
+        self.moveToThread(self._thread)
+        self._submitted.connect(self._run)
+        self._thread.start()
+
+    def submit(self, job, on_done=None, on_error=None):
+        ''' Queue job(), a callable doing the device I/O '''
+        self._submitted.emit(job, on_done, on_error)
+
+    @Slot(object, object, object)
+    def _run(self, job, on_done, on_error):
+        try:
+            result = job()
+        except Exception as e:
+            self.failed.emit(on_error, e)
+        else:
+            self.done.emit(on_done, result)
+
+    def stop(self, job=None):
+        ''' Run job() after the jobs already submitted, wait for it, then stop the thread '''
+        finished = threading.Event()
+        def last():
+            try:
+                if job is not None:
+                    job()
+            finally:
+                finished.set()
+        self.submit(last)
+        finished.wait()
+        self._thread.quit()
+        self._thread.wait()
+
+class CompareDialog(QtWidgets.QDialog):
+    ''' The configuration of the device next to the one of the form, the differences in bold '''
+    def __init__(self, actual, target, widget):
+        super(CompareDialog, self).__init__(widget)
+        self.setWindowTitle('Device / Form')
+        rows = [(field, '0x%02x' % getattr(actual, field), '0x%02x' % getattr(target, field)) for field in CONFIG_FIELDS]
+        rows += [(name, str(getattr(actual, name)), str(getattr(target, name))) for name in OPTIONS]
+
+        table = QtWidgets.QTableWidget(len(rows), 2)
+        table.setHorizontalHeaderLabels(['Device', 'Form'])
+        table.setVerticalHeaderLabels([name for (name, _, _) in rows])
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        for row, (name, device_value, form_value) in enumerate(rows):
+            for column, value in enumerate((device_value, form_value)):
+                item = QtWidgets.QTableWidgetItem(value)
+                if device_value != form_value:
+                    font = item.font()
+                    font.setBold(True)
+                    item.setFont(font)
+                table.setItem(row, column, item)
+
+        bp_load = QtWidgets.QPushButton('Load device values')
+        bp_load.clicked.connect(lambda: (widget.show_config(actual.as_dict()), self.accept()))
+        bp_close = QtWidgets.QPushButton('Close')
+        bp_close.clicked.connect(self.reject)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(bp_load)
+        buttons.addWidget(bp_close)
+        layout = QVBoxLayout()
+        layout.addWidget(table)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
 class MCP2200Widget(EasyLayoutWidget):
+    # Emitted from the hotplug monitor thread, delivered in the GUI thread
+    devices_changed = Signal()
+
     def __init__(self, *args, **kwargs):
         super(MCP2200Widget, self).__init__(*args, **kwargs)
         self.build_gui()
 
+        # Only used from the worker thread
         self.mcp2200 = SimpleIOClass()
+        self.worker = DeviceWorker()
+        self.worker.done.connect(self._job_done)
+        self.worker.failed.connect(self._job_failed)
+        self._poll_pending = False
+        # Configuration shown by the form, and the form values at that time
+        self.loaded = None
+        self._shown = None
+
+        self.devices_changed.connect(self.update_devices_list)
+        self.worker.submit(self._init_device, self.show_devices)
+        self.load_device()
+
+    def _init_device(self):
         self.mcp2200.InitMCP2200(MCP2200_VID, MCP2200_PID)
-        self.update_devices_list()
         self.mcp2200.SelectDevice(0)
-        self.load_device()
+        self.mcp2200.start_hotplug().subscribe(lambda event, entry: self.devices_changed.emit())
+        return self._device_names()
+
+    def _device_names(self):
+        return [self.mcp2200.GetDeviceInfo(x) for x in range(self.mcp2200.GetNoOfDevices())]
+
+    @Slot(object, object)
+    def _job_done(self, callback, result):
+        if callback is not None:
+            callback(result)
+
+    @Slot(object, object)
+    def _job_failed(self, callback, error):
+        self.log('Error : %s' % error)
+        if callback is not None:
+            callback(error)
+
+    def log(self, text):
+        self.txt_logs.append(text)
+
+    def shutdown(self):
+        self.monitor_timer.stop()
+        self.worker.stop(self._teardown)
+
+    def _teardown(self):
+        self.mcp2200.stop_hotplug()
+        if self.mcp2200.device is not None:
+            self.mcp2200.device.disconnect()
 
     def update_devices_list(self):
+        self.worker.submit(self._device_names, self.show_devices)
+
+    def show_devices(self, names):
         lst = QtCore.QStringListModel()
-        lst.setStringList([self.mcp2200.GetDeviceInfo(x) for x in range(self.mcp2200.GetNoOfDevices())])
+        lst.setStringList(names)
         self.lv_devices.setModel(lst)
 
     @Slot(int)
     def select_device(self, index):
-        self.mcp2200.SelectDevice(index.row())
+        row = index.row()
+        self.worker.submit(lambda: self.mcp2200.SelectDevice(row))
         self.load_device()
-        
+
     def load_device(self):
-        config = self.mcp2200.device.read_all()
+        self.worker.submit(lambda: self.mcp2200.device.read_config(max_age=0), self.show_config)
+
+    def show_config(self, config):
+        ''' Fill the form with config, the reference of the dirty fields from now on '''
+        self._shown = None
         self.io_config.setText('{0:08b}'.format(config['IO_bmap']))
         self.output_default.setText('{0:08b}'.format(config['IO_Default_Val_bmap']))
 
@@ -69,40 +203,150 @@ class MCP2200Widget(EasyLayoutWidget):
         self.rb_leds_toggle.setChecked(config['Config_Alt_Options'] & 0x80 == 0x80)
         self.rb_leds_100ms.setChecked(config['Config_Alt_Options'] & 0x20 == 0x00)
         self.rb_leds_200ms.setChecked(config['Config_Alt_Options'] & 0x20 == 0x20)
-    
+        for pin, label in enumerate(self.lbl_pins):
+            label.setToolTip('GP%d : %s' % (pin, 'input' if config['IO_bmap'] & (1 << pin) else 'output'))
+
+        self.loaded = MCP2200Config.from_dict(config)
+        self._shown = self.form_values()
+        self.update_dirty()
+
+    # Dirty fields
+
+    def form_fields(self):
+        ''' name -> (widget, value getter, setter applying the value to an MCP2200Config) '''
+        return {
+            'IO_bmap': (self.io_config, self.io_config.text,
+                lambda config, text: setattr(config, 'IO_bmap', int(text, 2))),
+            'IO_Default_Val_bmap': (self.output_default, self.output_default.text,
+                lambda config, text: setattr(config, 'IO_Default_Val_bmap', int(text, 2))),
+            'baud_rate': (self.baud_rate, self.baud_rate.currentText,
+                lambda config, text: setattr(config, 'baud_rate', int(text))),
+            'hardware_flow_control': (self.enable_cts_rts_pins, self.enable_cts_rts_pins.isChecked,
+                lambda config, value: setattr(config, 'hardware_flow_control', value)),
+            'rx_led': (self.enable_rx_led, self.enable_rx_led.isChecked,
+                lambda config, value: setattr(config, 'rx_led', value)),
+            'tx_led': (self.enable_tx_led, self.enable_tx_led.isChecked,
+                lambda config, value: setattr(config, 'tx_led', value)),
+            'usbcfg': (self.enable_usbcfg_pin, self.enable_usbcfg_pin.isChecked,
+                lambda config, value: setattr(config, 'usbcfg', value)),
+            'suspend': (self.enable_suspend_pin, self.enable_suspend_pin.isChecked,
+                lambda config, value: setattr(config, 'suspend', value)),
+            'toggle': (self.gb_leds, self.rb_leds_toggle.isChecked,
+                lambda config, value: (setattr(config, 'rx_toggle', value), setattr(config, 'tx_toggle', value))),
+            'blink_slow': (self.gb_leds_2, self.rb_leds_200ms.isChecked,
+                lambda config, value: setattr(config, 'blink_slow', value)),
+        }
+
+    def form_values(self):
+        return {name:getter() for (name, (widget, getter, setter)) in self.form_fields().items()}
+
+    def dirty_fields(self):
+        ''' Names of the form fields changed since the configuration was loaded '''
+        if self._shown is None:
+            return []
+        values = self.form_values()
+        return [name for name in values if values[name] != self._shown[name]]
+
+    def target_config(self):
+        ''' The loaded configuration with the dirty fields applied, the bits
+            the form doesn't show are kept as they are
+        '''
+        fields = self.form_fields()
+        config = self.loaded.copy()
+        for name in self.dirty_fields():
+            widget, getter, setter = fields[name]
+            setter(config, getter())
+        return config
+
+    def update_dirty(self, *args):
+        dirty = self.dirty_fields()
+        for name, (widget, getter, setter) in self.form_fields().items():
+            font = widget.font()
+            font.setBold(name in dirty)
+            widget.setFont(font)
+        self.bp_configure.setEnabled(bool(dirty))
+        self.bp_revert.setEnabled(bool(dirty))
+        self.lbl_dirty.setText('%d field(s) changed' % len(dirty) if dirty else '')
+
+    @Slot()
+    def revert_form(self):
+        ''' Undo the changes of the form, without touching the device '''
+        if self.loaded is not None:
+            self.show_config(self.loaded.as_dict())
+
     @Slot(int)
     def configure_device(self, *args, **kwargs):
-        self.mcp2200.ConfigureIoDefaultOutput(int(self.io_config.text(), 2), int(self.output_default.text(), 2))
-
-        self.mcp2200.fnSetBaudRate(int(self.baud_rate.currentText()))
-        self.mcp2200.fnHardwareFlowControl(self.enable_cts_rts_pins.isChecked())
-        if self.enable_rx_led.isChecked():
-            if self.rb_leds_toggle.isChecked():
-                self.mcp2200.fnRxLED(cdtx.mcp2200.api.TOGGLE)
-            elif self.rb_leds_blink.isChecked():
-                if self.rb_leds_100ms.isChecked():
-                    self.mcp2200.fnRxLED(cdtx.mcp2200.api.BLINKFAST)
-                else:
-                    self.mcp2200.fnRxLED(cdtx.mcp2200.api.BLINKSLOW)
-        else:
-            self.mcp2200.fnRxLED(cdtx.mcp2200.api.OFF)
-
-        if self.enable_tx_led.isChecked():
-            if self.rb_leds_toggle.isChecked():
-                self.mcp2200.fnTxLED(cdtx.mcp2200.api.TOGGLE)
-            elif self.rb_leds_blink.isChecked():
-                if self.rb_leds_100ms.isChecked():
-                    self.mcp2200.fnTxLED(cdtx.mcp2200.api.BLINKFAST)
-                else:
-                    self.mcp2200.fnTxLED(cdtx.mcp2200.api.BLINKSLOW)
+        ''' A single CONFIGURE with the target configuration, nothing read back when it succeeds '''
+        if self.loaded is None:
+            return
+        try:
+            target = self.target_config()
+        except ValueError as e:
+            self.log('Error : %s' % e)
+            return
+        if target == self.loaded:
+            self.update_dirty()
+            return
+        # The form as sent, it's what the device holds if CONFIGURE succeeds
+        shown = self.form_values()
+
+        def done(result):
+            if result:
+                self.loaded = target
+                self._shown = shown
+                self.update_dirty()
+            else:
+                self.log('Error : CONFIGURE failed')
+                self.load_device()
+
+        def failed(error):
+            self.load_device()
+        self.bp_configure.setEnabled(False)
+        self.worker.submit(lambda: self.mcp2200.device.configure(**target.as_dict()), done, failed)
+
+    @Slot()
+    def compare_device(self):
+        ''' Show the configuration of the device next to the form '''
+        if self.loaded is None:
+            return
+        try:
+            target = self.target_config()
+        except ValueError as e:
+            self.log('Error : %s' % e)
+            return
+        self.worker.submit(lambda: MCP2200Config.from_dict(self.mcp2200.device.read_config(max_age=0)),
+            lambda actual: CompareDialog(actual, target, self).exec_())
+
+    # GPIO monitor
+
+    @Slot(bool)
+    def set_monitoring(self, enabled):
+        if enabled:
+            self.monitor_timer.start(self.sb_monitor_interval.value())
         else:
-            self.mcp2200.fnTxLED(cdtx.mcp2200.api.OFF)
-
-        self.mcp2200.fnULoad(self.enable_usbcfg_pin.isChecked())
-        self.mcp2200.fnSuspend(self.enable_suspend_pin.isChecked())
-
-        self.load_device()
+            self.monitor_timer.stop()
 
+    @Slot(int)
+    def set_monitor_interval(self, interval):
+        self.monitor_timer.setInterval(interval)
+
+    def poll_pins(self):
+        # A poll at a time : when the device is slower than the rate, ticks are skipped, not queued
+        if self._poll_pending:
+            return
+        self._poll_pending = True
+        self.worker.submit(lambda: self.mcp2200.snapshot(), self.show_pins, self._poll_failed)
+
+    def show_pins(self, snapshot):
+        self._poll_pending = False
+        for pin, label in enumerate(self.lbl_pins):
+            label.setText('GP%d\n%d' % (pin, snapshot.pin(pin)))
+            label.setStyleSheet('background-color: %s' % ('#8f8' if snapshot.pin(pin) else '#ccc'))
+
+    def _poll_failed(self, error):
+        self._poll_pending = False
+        # Logged once, not at every tick
+        self.cb_monitor.setChecked(False)
 
     def build_gui(self):
         # Detected devices
@@ -163,6 +407,31 @@ class MCP2200Widget(EasyLayoutWidget):
             setattr(self, _name, _value)
             self.l_112.addWidget(getattr(self, _name), _index+1, 0, columnSpan=2)
 
+        # GPIO monitor
+        self.gb_monitor = QtWidgets.QGroupBox('GPIO Monitor')
+        self.gl_monitor = QGridLayout()
+        self.gb_monitor.setLayout(self.gl_monitor)
+        self.lbl_pins = []
+        for pin in range(8):
+            label = QtWidgets.QLabel('GP%d\n-' % pin)
+            label.setAlignment(QtCore.Qt.AlignCenter)
+            label.setMinimumWidth(30)
+            self.lbl_pins.append(label)
+            self.gl_monitor.addWidget(label, 0, 7 - pin)
+        self.cb_monitor = QtWidgets.QCheckBox('Monitor')
+        self.gl_monitor.addWidget(self.cb_monitor, 1, 0, 1, 3)
+        self.sb_monitor_interval = QtWidgets.QSpinBox()
+        self.sb_monitor_interval.setRange(20, 5000)
+        self.sb_monitor_interval.setValue(200)
+        self.sb_monitor_interval.setSuffix(' ms')
+        self.gl_monitor.addWidget(self.sb_monitor_interval, 1, 3, 1, 5)
+        self.l_111.addWidget(self.gb_monitor)
+
+        self.monitor_timer = QtCore.QTimer(self)
+        self.monitor_timer.timeout.connect(self.poll_pins)
+        self.cb_monitor.toggled.connect(self.set_monitoring)
+        self.sb_monitor_interval.valueChanged.connect(self.set_monitor_interval)
+
         # vid/pid
         self.l_12.addWidget(QtWidgets.QLabel('New'), 0, 1)
         self.l_12.addWidget(QtWidgets.QLabel('Using'), 0, 2)
@@ -205,10 +474,27 @@ class MCP2200Widget(EasyLayoutWidget):
         self.l_14.addWidget(self.txt_logs)
 
         # Buttons
+        self.lbl_dirty = QtWidgets.QLabel()
+        self.l_15.addWidget(self.lbl_dirty)
+        self.bp_compare = QtWidgets.QPushButton('Compare')
+        self.bp_compare.clicked.connect(self.compare_device)
+        self.l_15.addWidget(self.bp_compare)
+        self.bp_revert = QtWidgets.QPushButton('Revert')
+        self.bp_revert.setEnabled(False)
+        self.bp_revert.clicked.connect(self.revert_form)
+        self.l_15.addWidget(self.bp_revert)
         self.bp_configure = QtWidgets.QPushButton('Configure')
+        self.bp_configure.setEnabled(False)
         self.bp_configure.clicked.connect(self.configure_device)
         self.l_15.addWidget(self.bp_configure)
 
+        self.io_config.textChanged.connect(self.update_dirty)
+        self.output_default.textChanged.connect(self.update_dirty)
+        self.baud_rate.currentIndexChanged.connect(self.update_dirty)
+        for _widget in (self.enable_tx_led, self.enable_rx_led, self.enable_cts_rts_pins, self.enable_usbcfg_pin,
+                self.enable_suspend_pin, self.rb_leds_toggle, self.rb_leds_200ms):
+            _widget.toggled.connect(self.update_dirty)
+
 
 
     def get_layouts(self):
@@ -252,6 +538,7 @@ if __name__ == '__main__':
     app = QtWidgets.QApplication()
 
     wgt = MCP2200Widget()
+    app.aboutToQuit.connect(wgt.shutdown)
 
     window = QtWidgets.QMainWindow()
     window.setCentralWidget(wgt)
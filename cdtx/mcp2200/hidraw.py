@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+''' Reach the devices through the Linux hidraw nodes.
+
+    The reports are read from and written to /dev/hidrawN : the kernel HID
+    driver stays attached, nothing is claimed, and neither pyusb nor libusb
+    are needed. Access to the node is granted by udev, e.g.
+
+    KERNEL=="hidraw*", ATTRS{idVendor}=="04d8", ATTRS{idProduct}=="00df", GROUP="plugdev", MODE="0660"
+'''
+import os
+import re
+import errno
+import select
+
+from .device import MCP2200_HID_INTERFACE
+from .errors import MCP2200Error, MCP2200TimeoutError, MCP2200DisconnectedError
+
+SYSFS_HIDRAW = '/sys/class/hidraw'
+DEV = '/dev'
+# pyusb's default
+DEFAULT_TIMEOUT = 1.0
+# The MCP2200 reports aren't numbered : report ID 0 on write, none on read
+REPORT_ID = b'\x00'
+REPORT_SIZE = 16
+
+# Kernel name of a USB interface : bus-port.port...:configuration.interface
+_INTERFACE = re.compile(r'^(\d+)-([\d.]+):\d+\.(\d+)$')
+_DISCONNECTED = (errno.ENODEV, errno.ENOENT, errno.EIO, errno.ESHUTDOWN)
+
+
+class HidrawDevice():
+    ''' A hidraw node found in sysfs '''
+    __slots__ = ('node', 'vid', 'pid', 'path', 'serial_number')
+
+    def __init__(self, node, vid, pid, path, serial_number):
+        self.node = node
+        self.vid = vid
+        self.pid = pid
+        self.path = path
+        self.serial_number = serial_number
+
+    def __repr__(self):
+        return '<HidrawDevice %s %s>' % (self.node, self.path)
+
+
+def _read_uevent(path):
+    values = {}
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.rstrip('\n').partition('=')
+            values[key] = value
+    return values
+
+def _read_line(path):
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+def _node_number(name):
+    digits = name[len('hidraw'):]
+    return int(digits) if digits.isdigit() else -1
+
+
+class HidrawHandle():
+    ''' An opened hidraw node. Writes block until the kernel took the report,
+        their timeout is ignored.
+    '''
+    def __init__(self, node):
+        self.node = node
+        try:
+            self.fd = os.open(node, os.O_RDWR | os.O_CLOEXEC)
+        except OSError as e:
+            raise self._error(e)
+
+    def _error(self, e):
+        if e.errno in _DISCONNECTED:
+            return MCP2200DisconnectedError('%s : %s' % (self.node, e.strerror))
+        if e.errno == errno.EACCES:
+            return MCP2200Error('%s : permission denied, see the udev rule in cdtx.mcp2200.hidraw' % self.node)
+        return MCP2200Error('%s : %s' % (self.node, e.strerror))
+
+    def read(self, size, timeout=None):
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+        try:
+            readable, _, _ = select.select((self.fd,), (), (), timeout)
+            report = os.read(self.fd, max(size, REPORT_SIZE)) if readable else None
+        except OSError as e:
+            raise self._error(e)
+        if report is None:
+            raise MCP2200TimeoutError('No report from %s within %g s' % (self.node, timeout))
+        if not report:
+            raise MCP2200DisconnectedError('%s was closed' % self.node)
+        return report[:size]
+
+    def write(self, data, timeout=None):
+        try:
+            return os.write(self.fd, REPORT_ID + bytes(data)) - len(REPORT_ID)
+        except OSError as e:
+            raise self._error(e)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class HidrawBackend():
+    ''' Finds the devices in sysfs (see PyUSBBackend for the backend
+        interface). Their paths are the same as pyusb's, the bus position of
+        the USB device, so either backend finds the same devices again.
+    '''
+    name = 'hidraw'
+
+    def __init__(self, sysfs=None, dev=None):
+        self.sysfs = sysfs if sysfs is not None else SYSFS_HIDRAW
+        self.dev = dev if dev is not None else DEV
+
+    def find(self, vid, pid):
+        try:
+            names = sorted(os.listdir(self.sysfs), key=_node_number)
+        except OSError:
+            return []
+        devices = []
+        for name in names:
+            device = self._device(name)
+            if device is not None and (device.vid, device.pid) == (vid, pid):
+                devices.append(device)
+        return devices
+
+    def listing(self):
+        try:
+            return tuple(sorted(os.listdir(self.sysfs)))
+        except OSError:
+            return ()
+
+    def _device(self, name):
+        hid = os.path.join(self.sysfs, name, 'device')
+        try:
+            uevent = _read_uevent(os.path.join(hid, 'uevent'))
+            bus, vid, pid = [int(field, 16) for field in uevent['HID_ID'].split(':')]
+        except (OSError, KeyError, ValueError):
+            return None
+        # USB only
+        if bus != 0x03:
+            return None
+        # .../usb1/1-2/1-2:1.2/0003:04D8:00DF.0001
+        interface = os.path.dirname(os.path.realpath(hid))
+        match = _INTERFACE.match(os.path.basename(interface))
+        if match is None or int(match.group(3)) != MCP2200_HID_INTERFACE:
+            return None
+        serial = uevent.get('HID_UNIQ') or _read_line(os.path.join(os.path.dirname(interface), 'serial'))
+        return HidrawDevice(os.path.join(self.dev, name), vid, pid, '%s-%s' % match.group(1, 2), serial or None)
+
+    def path(self, dev):
+        return dev.path
+
+    def serial(self, dev):
+        return dev.serial_number
+
+    def open(self, dev):
+        return HidrawHandle(dev.node)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+''' Keep a DeviceRegistry up to date as devices are plugged and unplugged.
+
+    >>> monitor = HotplugMonitor(registry)
+    >>> monitor.subscribe(lambda event, entry: print(event, entry))
+    >>> monitor.start()
+'''
+import threading
+import weakref
+from collections import deque
+
+from .device import find_path
+
+ARRIVED = 'arrived'
+LEFT = 'left'
+
+
+def _libusb_hotplug_context():
+    ''' A python-libusb1 context supporting hotplug, None without '''
+    try:
+        import usb1
+    except ImportError:
+        return None
+    context = usb1.USBContext()
+    if context.hasCapability(usb1.CAP_HAS_HOTPLUG):
+        return context
+    context.close()
+    return None
+
+
+def _libusb_path(device):
+    ''' Bus path of a python-libusb1 device, as PyUSBBackend.path() gives it '''
+    ports = device.getPortNumberList()
+    if ports:
+        return '%d-%s' % (device.getBusNumber(), '.'.join(str(port) for port in ports))
+    return '%d-@%d' % (device.getBusNumber(), device.getDeviceAddress())
+
+
+class HotplugMonitor():
+    ''' Watches the bus and updates the registry incrementally.
+
+        With the pyusb backend and python-libusb1 on a libusb supporting hotplug,
+        the registry is updated from the devices libusb reports for the
+        vid/pid : a device that left is dropped, one that arrived is the only
+        one looked up.
+        Otherwise the backend's listing() (see PyUSBBackend) is polled every
+        interval seconds, the bus is only enumerated when it changed. Without
+        a listing, the bus is enumerated every interval.
+
+        Subscribers are called with (ARRIVED or LEFT, DeviceEntry), from the
+        monitor thread. Devices registered with watch() are marked dead
+        (see BaseDevice.mark_dead) as soon as they leave.
+    '''
+    def __init__(self, registry, interval=1.0, use_libusb=True):
+        self.registry = registry
+        self.interval = interval
+        self._subscribers = []
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listing = None
+        self._context = None
+        self._callback = None
+        # (event, bus path) reported by libusb, handled once its callback returned
+        self._events = deque()
+        if use_libusb and getattr(registry.backend, 'name', None) == 'pyusb':
+            self._context = _libusb_hotplug_context()
+        self._event_driven = self._context is not None
+
+    @property
+    def event_driven(self):
+        ''' True when libusb hotplug events are used instead of polling '''
+        return self._event_driven
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def watch(self, device):
+        ''' Mark device dead when it's unplugged, the monitor only keeps a weak reference '''
+        key = id(device)
+        with self._lock:
+            self._watched[key] = weakref.ref(device, lambda _ref: self._watched.pop(key, None))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        if self._event_driven:
+            if self._context is None:
+                # Closed by the previous stop()
+                self._context = _libusb_hotplug_context()
+            self._callback = self._context.hotplugRegisterCallback(self._on_libusb_event,
+                vendor_id=self.registry.vid, product_id=self.registry.pid)
+            target = self._run_events
+        else:
+            target = self._run_polling
+        self._thread = threading.Thread(target=target, name='HotplugMonitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._context is not None and self._callback is not None:
+            self._context.hotplugDeregisterCallback(self._callback)
+            self._callback = None
+            self._context.close()
+            self._context = None
+
+    def _run_polling(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def _run_events(self):
+        import usb1
+        while not self._stop.is_set():
+            # Wakes up at least every interval to check for stop()
+            self._context.handleEventsTimeout(tv=self.interval)
+            while self._events:
+                (event, path) = self._events.popleft()
+                self.device_event(event == usb1.HOTPLUG_EVENT_DEVICE_LEFT, path)
+
+    def _on_libusb_event(self, context, device, event):
+        # libusb can't be called back from its callback, only the device's
+        # bus position is read here
+        self._events.append((event, _libusb_path(device)))
+        return False
+
+    def device_event(self, left, path):
+        ''' Update the registry for the device at the bus path that left or
+            arrived, only looking up an arriving one. Returns the (added,
+            removed) entries.
+        '''
+        registry = self.registry
+        known = [entry.dev for entry in registry.entries if entry.path != path]
+        if left:
+            devices = known
+        else:
+            try:
+                devices = known + find_path(registry.backend, registry.vid, registry.pid, path)
+            except Exception:
+                return [], []
+        return self._update(devices)
+
+    def _changed(self):
+        ''' The devices found if they differ from the registry's, None otherwise.
+            The bus is only enumerated when the backend's listing changed.
+        '''
+        backend = self.registry.backend
+        listing = getattr(backend, 'listing', None)
+        try:
+            current = listing() if listing is not None else None
+            if current is not None and current == self._listing:
+                return None
+            devices = backend.find(self.registry.vid, self.registry.pid)
+        except Exception:
+            return None
+        # Taken before find() : a change in between shows at the next poll
+        self._listing = current
+        paths = {backend.path(dev) for dev in devices}
+        if paths == {entry.path for entry in self.registry.entries}:
+            return None
+        return devices
+
+    def poll(self):
+        ''' Look for changes once, returns the (added, removed) entries.
+            A single enumeration, shared with the registry's update.
+        '''
+        devices = self._changed()
+        if devices is None:
+            return [], []
+        return self._update(devices)
+
+    def _update(self, devices):
+        added, removed = self.registry.update(devices)
+
+        with self._lock:
+            watched = [ref() for ref in self._watched.values()]
+            subscribers = list(self._subscribers)
+        for entry in removed:
+            for device in watched:
+                if device is not None and device.dev is not None and device.identity() == entry.path:
+                    device.mark_dead()
+
+        for (event, entries) in ((LEFT, removed), (ARRIVED, added)):
+            for entry in entries:
+                for callback in subscribers:
+                    callback(event, entry)
+        return added, removed
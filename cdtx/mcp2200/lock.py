@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+''' Lock shared by the threads using one device. '''
+import time
+import threading
+from threading import get_ident
+from collections import deque
+
+_thread = threading.local()
+
+
+def _ident():
+    ''' threading.get_ident() of the calling thread, kept : no int allocated on each call '''
+    try:
+        return _thread.ident
+    except AttributeError:
+        ident = _thread.ident = get_ident()
+        return ident
+
+
+class FairLock():
+    ''' Reentrant lock granted in the order it was requested.
+
+        threading.RLock lets a thread looping on the device take the lock
+        again before the threads already waiting for it. Here, as soon as a
+        thread waits, the others queue behind it and only the oldest waiter
+        competes for the lock. Uncontended, it costs a Lock.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Holder's thread (_ident()) and its acquisitions, only changed by the holder
+        self._owner = None
+        self._count = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._waiters = deque()
+
+    def _acquired(self):
+        self._owner = _ident()
+        self._count = 1
+        return True
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._waiters and self._lock.acquire(False):
+            return self._acquired()
+        return self._acquire_queued(blocking, timeout)
+
+    def _acquire_queued(self, blocking, timeout):
+        if self._owner == _ident():
+            # Reentrant, never waits
+            self._count += 1
+            return True
+        if not blocking:
+            return False
+
+        deadline = None if timeout < 0 else time.monotonic() + timeout
+        me = object()
+        with self._cond:
+            self._waiters.append(me)
+        try:
+            with self._cond:
+                while self._waiters[0] is not me:
+                    if deadline is None:
+                        self._cond.wait()
+                    elif not self._cond.wait(max(0, deadline - time.monotonic())):
+                        return False
+            if deadline is None:
+                acquired = self._lock.acquire()
+            else:
+                acquired = self._lock.acquire(True, max(0, deadline - time.monotonic()))
+            return acquired and self._acquired()
+        finally:
+            with self._cond:
+                self._waiters.remove(me)
+                self._cond.notify_all()
+
+    def release(self):
+        if self._owner != _ident():
+            raise RuntimeError('cannot release un-acquired lock')
+        self._count -= 1
+        if self._count == 0:
+            self._owner = None
+            self._lock.release()
+
+    def owned(self):
+        ''' True if the calling thread holds the lock '''
+        return self._owner == _ident()
+
+    def __enter__(self):
+        # acquire() inlined, it's on the path of every command
+        if not self._waiters and self._lock.acquire(False):
+            self._owner = _ident()
+            self._count = 1
+            return True
+        return self._acquire_queued(True, -1)
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+''' Write-combining of the GPIO output changes.
+
+    >>> combiner = OutputCombiner(device)
+    >>> with combiner.batch():
+    ...     for pin in range(8):
+    ...         combiner.set_clear(1 << pin, 0)     # a single SET_CLEAR_OUTPUTS
+'''
+import threading
+from contextlib import contextmanager
+
+from .errors import MCP2200Error
+
+
+class OutputCombiner():
+    ''' Merges output changes into as few SET_CLEAR_OUTPUTS as possible.
+
+        One SET_CLEAR_OUTPUTS sets and clears any combination of pins : the
+        changes are accumulated in a set and a clear bitmap, the last change
+        of a pin wins. They're sent by flush(), which happens :
+        - at the end of the outermost batch() block
+        - window seconds after the first change pending, when window is set
+        - right away otherwise
+        A flush from the window timer that fails is kept in errors/last_error.
+
+        Batches belong to the calling thread : their changes are held apart
+        until the outermost block ends, the other threads' changes go on.
+    '''
+    def __init__(self, device=None, window=None):
+        self.device = device
+        self.window = window
+        self.set_bmap = 0
+        self.clear_bmap = 0
+        self.changes = 0
+        self.reports = 0
+        self.errors = 0
+        self.last_error = None
+        self._timer = None
+        self._lock = threading.RLock()
+        # Per thread : batch depth and held changes
+        self._local = threading.local()
+
+    def _batch(self):
+        ''' The calling thread's [depth, set_bmap, clear_bmap] '''
+        batch = getattr(self._local, 'batch', None)
+        if batch is None:
+            batch = self._local.batch = [0, 0, 0]
+        return batch
+
+    @property
+    def depth(self):
+        ''' Batch nesting of the calling thread '''
+        return self._batch()[0]
+
+    def held(self):
+        ''' (set_bmap, clear_bmap) held by the calling thread's batch '''
+        batch = self._batch()
+        return batch[1], batch[2]
+
+    @property
+    def pending(self):
+        batch = self._batch()
+        return bool(self.set_bmap | self.clear_bmap | batch[1] | batch[2])
+
+    def set_clear(self, set_bmap, clear_bmap):
+        ''' Add a change, a pin in both bitmaps ends up set '''
+        clear_bmap &= ~set_bmap
+        batch = self._batch()
+        if batch[0]:
+            batch[1] = (batch[1] & ~clear_bmap) | set_bmap
+            batch[2] = (batch[2] & ~set_bmap) | clear_bmap
+            with self._lock:
+                self.changes += 1
+            return True
+        with self._lock:
+            self._merge(set_bmap, clear_bmap)
+            self.changes += 1
+            if not self.window:
+                return self.flush()
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush_timer)
+                self._timer.daemon = True
+                self._timer.start()
+            return True
+
+    def _merge(self, set_bmap, clear_bmap):
+        ''' Add changes to the shared pending ones, the lock is held '''
+        self.set_bmap = (self.set_bmap & ~clear_bmap) | set_bmap
+        self.clear_bmap = (self.clear_bmap & ~set_bmap) | clear_bmap
+
+    def flush(self):
+        ''' Send the pending changes, the calling thread's batch included, if
+            any. Returns the result of set_clear_outputs, True if nothing was pending.
+        '''
+        batch = self._batch()
+        with self._lock:
+            if batch[1] | batch[2]:
+                self._merge(batch[1], batch[2])
+                batch[1] = batch[2] = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not (self.set_bmap | self.clear_bmap):
+                return True
+            # Kept pending until the device accepted them
+            ret = self.device.set_clear_outputs(Set_bmap=self.set_bmap, Clear_bmap=self.clear_bmap)
+            self.set_bmap = self.clear_bmap = 0
+            self.reports += 1
+            return ret
+
+    def discard(self):
+        ''' Drop the pending changes, the calling thread's batch included '''
+        batch = self._batch()
+        batch[1] = batch[2] = 0
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.set_bmap = self.clear_bmap = 0
+
+    def _flush_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+
+    def begin(self):
+        ''' Hold the calling thread's changes until the matching end(), blocks can be nested '''
+        self._batch()[0] += 1
+
+    def end(self):
+        batch = self._batch()
+        if batch[0] == 0:
+            raise MCP2200Error('No batch in progress')
+        batch[0] -= 1
+        if batch[0] == 0:
+            return self.flush()
+        return True
+
+    @contextmanager
+    def batch(self):
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.end()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+''' Timed playback of SET_CLEAR_OUTPUTS sequences.
+
+    >>> player = PatternPlayer(device, [(0.0, 0x01, 0x00), (0.010, 0x00, 0x01)], loops=100)
+    >>> player.start()
+    >>> player.wait()
+    >>> player.timing()
+'''
+import time
+import struct
+import threading
+from array import array
+
+from .codec import ReportCodec
+from .errors import MCP2200Error
+
+# Compact step record : delay in microseconds, Set_bmap, Clear_bmap
+STEP_FORMAT = struct.Struct('<IBB')
+
+# Below this delay the player busy-waits instead of sleeping
+SPIN_THRESHOLD = 0.002
+
+
+def pack_steps(steps):
+    ''' Pack (delay_seconds, set_bmap, clear_bmap) steps in the compact bytes form '''
+    return b''.join(STEP_FORMAT.pack(int(round(delay * 1e6)), set_bmap, clear_bmap) for (delay, set_bmap, clear_bmap) in steps)
+
+
+def unpack_steps(data):
+    ''' Inverse of pack_steps() '''
+    return [(delay / 1e6, set_bmap, clear_bmap) for (delay, set_bmap, clear_bmap) in STEP_FORMAT.iter_unpack(data)]
+
+
+def port_steps(values, period):
+    ''' Steps driving the whole port to each of values, every period seconds '''
+    return [(0.0 if index == 0 else period, value, ~value & 0xff) for (index, value) in enumerate(values)]
+
+
+class PatternPlayer():
+    ''' Issues a sequence of SET_CLEAR_OUTPUTS reports with predictable timing.
+
+        steps is a sequence of (delay, set_bmap, clear_bmap), delay being the
+        time in seconds between the previous step and this one (the first one
+        is relative to the start), or the compact bytes form of pack_steps().
+
+        All the reports are built before starting, and sent through the
+        device's send_outputs() : locked, retried. Each step has an absolute
+        deadline computed from the start time, so the delays don't drift with
+        the time spent sending. The player sleeps until shortly before the
+        deadline and busy-waits the rest.
+
+        loops is the number of times the pattern is played, 0 loops forever.
+        period is the length of a loop in seconds : step deadlines of loop n
+        are n * period after those of the first loop. It defaults to the
+        offset of the last step plus its delay, so that the last step is
+        held as long as the one before it (port_steps() patterns loop
+        every len(values) * period). A looped pattern can't last 0 seconds.
+        The per-step timing error (actual - deadline, in nanoseconds) of the
+        latest loop is kept in step_errors.
+    '''
+    def __init__(self, device, steps, loops=1, spin_threshold=SPIN_THRESHOLD, period=None):
+        if isinstance(steps, (bytes, bytearray, memoryview)):
+            steps = unpack_steps(bytes(steps))
+        if not steps:
+            raise ValueError('Empty pattern')
+        self.device = device
+        self.loops = loops
+        self.spin_threshold_ns = int(spin_threshold * 1e9)
+
+        codec = ReportCodec()
+        self.reports = []
+        self.offsets = array('q')
+        offset = 0
+        for (delay, set_bmap, clear_bmap) in steps:
+            if delay < 0:
+                raise ValueError('Negative delay')
+            offset += int(round(delay * 1e9))
+            self.offsets.append(offset)
+            # The codec reuses its buffer
+            self.reports.append(bytes(codec.set_clear_outputs(set_bmap & 0xff, clear_bmap & 0xff)))
+        if period is None:
+            # The last step is held for its own delay before the next loop
+            self.period_ns = offset + int(round(delay * 1e9))
+        else:
+            self.period_ns = int(round(period * 1e9))
+            if self.period_ns < offset:
+                raise ValueError('The period is shorter than the pattern')
+        if self.period_ns <= 0 and loops != 1:
+            raise ValueError('A looped pattern must last more than 0 seconds')
+
+        self.step_errors = array('q', bytes(8 * len(self.reports)))
+        self.loops_done = 0
+        self.steps_done = 0
+        self.max_error_ns = 0
+        self._total_error_ns = 0
+        self.error = None
+        # time.perf_counter_ns() of the start of the playback, the step deadlines are relative to it
+        self.start_ns = None
+
+        self._abort = threading.Event()
+        self._thread = None
+
+    def start(self):
+        ''' Play in a dedicated thread '''
+        if self.running:
+            raise MCP2200Error('Already playing')
+        self._abort.clear()
+        self._thread = threading.Thread(target=self.play, name='PatternPlayer', daemon=True)
+        self._thread.start()
+
+    def abort(self):
+        ''' Stop as soon as possible, the current step is completed '''
+        self._abort.set()
+        self.wait()
+
+    def wait(self, timeout=None):
+        ''' Wait for the end of the playback, returns True if it's over '''
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def play(self):
+        ''' Play in the calling thread '''
+        send = self.device.send_outputs
+        reports = self.reports
+        offsets = self.offsets
+        errors = self.step_errors
+        spin_ns = self.spin_threshold_ns
+        aborted = self._abort.is_set
+        now = time.perf_counter_ns
+        sleep = time.sleep
+
+        try:
+            start = self.start_ns = now()
+            while not aborted() and (self.loops == 0 or self.loops_done < self.loops):
+                for index in range(len(reports)):
+                    deadline = start + offsets[index]
+                    remaining = deadline - now()
+                    if remaining > spin_ns:
+                        sleep((remaining - spin_ns) / 1e9)
+                    while now() < deadline:
+                        pass
+                    if aborted():
+                        return
+                    if not send(reports[index]):
+                        raise MCP2200Error('Step %d was not written' % index)
+                    error = now() - deadline
+                    errors[index] = error
+                    self._total_error_ns += error
+                    if error > self.max_error_ns:
+                        self.max_error_ns = error
+                    self.steps_done += 1
+                self.loops_done += 1
+                start += self.period_ns
+        except Exception as e:
+            self.error = e
+            raise
+
+    def timing(self):
+        ''' Timing error statistics, in seconds '''
+        return {
+            'steps': self.steps_done,
+            'loops': self.loops_done,
+            'max_error': self.max_error_ns / 1e9,
+            'mean_error': (self._total_error_ns / self.steps_done / 1e9) if self.steps_done else 0.0,
+        }
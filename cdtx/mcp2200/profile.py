@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+''' Save the state of a board and provision others with it.
+
+    >>> profile = MCP2200Profile.capture(device)
+    >>> profile.save('board.json')          # or board.bin
+    >>> MCP2200Profile.load('board.json').apply(other_device)
+    {'configured': False, 'eeprom_written': 3}
+'''
+import json
+import struct
+import zlib
+
+from .codec import MCP2200Config
+from .device import MCP2200_EEPROM_SIZE, EE_WINDOW
+from .errors import MCP2200Error
+
+PROFILE_VERSION = 1
+PROFILE_FORMAT = 'mcp2200-profile'
+
+# Binary profile : header, EEPROM image if FLAG_EEPROM, CRC32 of all that
+BINARY_MAGIC = b'MCP2200'
+BINARY_HEADER = struct.Struct('<7sBB6Bx')      # magic, version, flags, CONFIG_FIELDS
+BINARY_CRC = struct.Struct('<I')
+FLAG_EEPROM = 0x01
+
+# MCP2200Config properties written along the raw fields in the JSON profile,
+# for the human reader : an edited option wins over the raw fields
+OPTIONS = ('baud_rate', 'tx_led', 'rx_led', 'usbcfg', 'suspend', 'hardware_flow_control',
+    'invert_polarity', 'blink_slow', 'tx_toggle', 'rx_toggle')
+
+# EEPROM bytes per line of the JSON profile
+EEPROM_LINE = 16
+
+
+def _runs(addresses):
+    ''' (start, end) of the runs of consecutive addresses, in order '''
+    start = end = None
+    for addr in addresses:
+        if addr != end:
+            if start is not None:
+                yield start, end
+            start = addr
+        end = addr + 1
+    if start is not None:
+        yield start, end
+
+
+class MCP2200Profile():
+    ''' NVRAM configuration and user EEPROM of a board.
+
+        eeprom is the 256 bytes image, or None to leave the EEPROM alone.
+    '''
+    def __init__(self, config=None, eeprom=None):
+        self.config = config if config is not None else MCP2200Config()
+        if eeprom is not None:
+            eeprom = bytes(eeprom)
+            if len(eeprom) != MCP2200_EEPROM_SIZE:
+                raise ValueError('EEPROM image is %d bytes, expecting %d' % (len(eeprom), MCP2200_EEPROM_SIZE))
+        self.eeprom = eeprom
+
+    def __eq__(self, other):
+        if not isinstance(other, MCP2200Profile):
+            return NotImplemented
+        return self.config == other.config and self.eeprom == other.eeprom
+
+    def __repr__(self):
+        return '<MCP2200Profile %r%s>' % (self.config, '' if self.eeprom is None else ' +EEPROM')
+
+    # Device
+
+    @classmethod
+    def capture(cls, device, eeprom=True, window=EE_WINDOW):
+        ''' Read the profile of an opened MCP2200Device '''
+        with device.lock:
+            config = MCP2200Config.from_dict(device.read_config(max_age=0))
+            image = device.read_ee_range(window=window) if eeprom else None
+        return cls(config, image)
+
+    def diff(self, device, window=EE_WINDOW):
+        ''' What apply() would send : (CONFIGURE needed, EEPROM addresses to write) '''
+        with device.lock:
+            configure = MCP2200Config.from_dict(device.read_config(max_age=0)) != self.config
+            addresses = []
+            if self.eeprom is not None:
+                current = device.read_ee_range(window=window)
+                addresses = [addr for addr in range(MCP2200_EEPROM_SIZE) if current[addr] != self.eeprom[addr]]
+        return configure, addresses
+
+    def apply(self, device, window=EE_WINDOW, verify=False):
+        ''' Bring the device to this profile, sending only the CONFIGURE and
+            WRITE_EE needed, the runs of differing bytes streamed by
+            write_ee_range(). With verify, the device is read again afterwards
+            and a mismatch raises MCP2200Error.
+            Returns {'configured': bool, 'eeprom_written': count}.
+        '''
+        with device.lock:
+            configure, addresses = self.diff(device, window)
+            if configure:
+                device.configure(**self.config.as_dict())
+            for (start, end) in _runs(addresses):
+                device.write_ee_range(start, self.eeprom[start:end], diff=False, window=window)
+            if verify and self.diff(device, window) != (False, []):
+                raise MCP2200Error('%s does not match the profile after apply' % device.identity())
+        return {'configured': configure, 'eeprom_written': len(addresses)}
+
+    # JSON
+
+    def as_dict(self):
+        data = {
+            'format': PROFILE_FORMAT,
+            'version': PROFILE_VERSION,
+            'config': self.config.as_dict(),
+            'options': {name:getattr(self.config, name) for name in OPTIONS},
+        }
+        if self.eeprom is not None:
+            data['eeprom'] = [self.eeprom[i:i+EEPROM_LINE].hex() for i in range(0, len(self.eeprom), EEPROM_LINE)]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format') != PROFILE_FORMAT:
+            raise ValueError('Not an MCP2200 profile')
+        if data.get('version', 0) > PROFILE_VERSION:
+            raise ValueError('Profile version %s is not supported' % data.get('version'))
+        config = MCP2200Config.from_dict(data['config'])
+        reference = config.copy()
+        for name, value in data.get('options', {}).items():
+            if name not in OPTIONS:
+                raise ValueError('Unknown option %s' % name)
+            # Only the options edited by hand, baud_rate doesn't round trip exactly
+            if getattr(reference, name) != value:
+                setattr(config, name, value)
+        eeprom = data.get('eeprom')
+        if eeprom is not None:
+            eeprom = bytes.fromhex(''.join(eeprom) if isinstance(eeprom, list) else eeprom)
+        return cls(config, eeprom)
+
+    def to_json(self, **kwargs):
+        kwargs.setdefault('indent', 2)
+        return json.dumps(self.as_dict(), **kwargs)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    # Binary
+
+    def to_bytes(self):
+        flags = FLAG_EEPROM if self.eeprom is not None else 0
+        data = BINARY_HEADER.pack(BINARY_MAGIC, PROFILE_VERSION, flags, *self.config.as_tuple())
+        if self.eeprom is not None:
+            data += self.eeprom
+        return data + BINARY_CRC.pack(zlib.crc32(data))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        if len(data) < BINARY_HEADER.size + BINARY_CRC.size:
+            raise ValueError('Profile too short')
+        magic, version, flags, *config = BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC:
+            raise ValueError('Not an MCP2200 profile')
+        if version > PROFILE_VERSION:
+            raise ValueError('Profile version %d is not supported' % version)
+        (crc,) = BINARY_CRC.unpack_from(data, len(data) - BINARY_CRC.size)
+        if zlib.crc32(data[:-BINARY_CRC.size]) != crc:
+            raise ValueError('Profile checksum mismatch')
+        eeprom = None
+        if flags & FLAG_EEPROM:
+            eeprom = data[BINARY_HEADER.size:BINARY_HEADER.size + MCP2200_EEPROM_SIZE]
+        return cls(MCP2200Config(*config), eeprom)
+
+    # Files
+
+    def save(self, path, binary=None):
+        ''' Binary if binary is set, or by default if path ends with .bin '''
+        if binary is None:
+            binary = str(path).endswith('.bin')
+        if binary:
+            with open(path, 'wb') as f:
+                f.write(self.to_bytes())
+        else:
+            with open(path, 'w') as f:
+                f.write(self.to_json() + '\n')
+
+    @classmethod
+    def load(cls, path):
+        ''' Either format, recognised by its content '''
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data.startswith(BINARY_MAGIC):
+            return cls.from_bytes(data)
+        return cls.from_json(data.decode('utf-8'))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+''' Reach the devices through pyusb : the HID interface is detached from
+    the kernel driver and claimed. Works wherever libusb does.
+'''
+import os
+import errno
+import usb
+import usb.core
+import usb.util
+
+from .device import MCP2200_HID_INTERFACE
+from .errors import MCP2200Error, MCP2200TimeoutError, MCP2200DisconnectedError
+
+# One entry per USB device and interface, named after its bus position
+SYSFS_USB = '/sys/bus/usb/devices'
+
+
+class PyUSBHandle():
+    ''' An MCP2200 HID interface claimed through pyusb '''
+    def __init__(self, dev, endpoints=None):
+        self.dev = dev
+        if endpoints is None:
+            endpoints = self.find_endpoints(dev)
+        self.epIn, self.epOut = endpoints
+
+        try:
+            self.attach = False
+            if self.dev.is_kernel_driver_active(MCP2200_HID_INTERFACE):
+                # tell the kernel to detach
+                self.dev.detach_kernel_driver(MCP2200_HID_INTERFACE)
+                # Remember to reattach the device at the end of the session
+                self.attach = True
+
+            # claim the device
+            usb.util.claim_interface(self.dev, MCP2200_HID_INTERFACE)
+        except Exception as e:
+            # release the device
+            usb.util.release_interface(self.dev, MCP2200_HID_INTERFACE)
+            if self.attach:
+                # reattach the device to the OS kernel
+                self.dev.attach_kernel_driver(MCP2200_HID_INTERFACE)
+            raise e
+
+    @staticmethod
+    def find_endpoints(dev):
+        ''' (IN, OUT) endpoint addresses of the HID interface '''
+        interface = dev[0][(MCP2200_HID_INTERFACE,0)]
+        return (interface[0].bEndpointAddress, interface[1].bEndpointAddress)
+
+    def close(self):
+        usb.util.release_interface(self.dev, MCP2200_HID_INTERFACE)
+        usb.util.dispose_resources(self.dev)
+
+    @staticmethod
+    def _timeout_ms(timeout):
+        # pyusb : None is its default timeout, 0 would wait forever
+        if timeout is None:
+            return None
+        return max(1, int(timeout * 1000))
+
+    def _io(self, func, endpoint, arg, timeout):
+        try:
+            return func(endpoint, arg, self._timeout_ms(timeout))
+        except usb.core.USBTimeoutError as e:
+            raise MCP2200TimeoutError(str(e))
+        except usb.core.USBError as e:
+            if e.errno == errno.ENODEV:
+                raise MCP2200DisconnectedError(str(e))
+            raise MCP2200Error(str(e))
+
+    def read(self, size, timeout=None):
+        return self._io(self.dev.read, self.epIn, size, timeout)
+
+    def write(self, data, timeout=None):
+        return self._io(self.dev.write, self.epOut, data, timeout)
+
+
+
+class PyUSBBackend():
+    ''' Reach the devices through pyusb.
+
+        A backend finds the raw devices and opens them. The handle returned by
+        open() provides read(size, timeout), write(data, timeout) -> bytes
+        written, and close(). timeout is in seconds, None for the backend's
+        default ; a timeout raises MCP2200TimeoutError.
+        path(dev) is a string identifying the device by its position on the
+        bus, serial(dev) its serial number (None if it can't be read).
+        Optionally, listing() is a cheap snapshot of the bus that changes
+        when a device is plugged or unplugged, read without any descriptor
+        (None when it can't be had) : see HotplugMonitor.
+    '''
+    name = 'pyusb'
+
+    def __init__(self, sysfs=None):
+        # Endpoint addresses by device path, the descriptors are only parsed once
+        self._endpoints = {}
+        self.sysfs = sysfs if sysfs is not None else SYSFS_USB
+
+    def find(self, vid, pid):
+        return [dev for dev in usb.core.find(find_all=True, idVendor=vid, idProduct=pid)]
+
+    def find_path(self, vid, pid, path):
+        ''' The devices at the bus path (one or none), looking at that bus only '''
+        bus = int(path.split('-')[0])
+        return [dev for dev in usb.core.find(find_all=True, idVendor=vid, idProduct=pid, bus=bus) if self.path(dev) == path]
+
+    def listing(self):
+        # Linux only
+        try:
+            return tuple(sorted(os.listdir(self.sysfs)))
+        except OSError:
+            return None
+
+    def open(self, dev):
+        path = self.path(dev)
+        if path not in self._endpoints:
+            self._endpoints[path] = PyUSBHandle.find_endpoints(dev)
+        return PyUSBHandle(dev, self._endpoints[path])
+
+    def path(self, dev):
+        if dev.port_numbers:
+            return '%d-%s' % (dev.bus, '.'.join(str(port) for port in dev.port_numbers))
+        return '%d-@%d' % (dev.bus, dev.address)
+
+    def serial(self, dev):
+        try:
+            return usb.util.get_string(dev, dev.iSerialNumber)
+        except Exception:
+            return None
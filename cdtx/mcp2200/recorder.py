@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+''' Record the HID traffic of a session, and play it back without the devices.
+
+    >>> api = SimpleIOClass(RecordingBackend('session.mcplog'))     # around default_backend
+    >>> ...
+    >>> api.device.backend.close()
+    >>> summarize('session.mcplog')
+    {'reports_out': 12, 'reports_in': 5, 'commands': {'READ_ALL': 5, ...}, ...}
+    >>> api = SimpleIOClass(ReplayBackend('session.mcplog'))          # same calls, same answers
+
+    Log format : HEADER, then one RECORD per event followed by its data.
+    Times are time.monotonic_ns() since the start of the recording.
+'''
+import time
+import struct
+import threading
+from collections import deque, namedtuple
+
+from .device import default_backend
+from .errors import MCP2200Error, MCP2200TimeoutError, MCP2200DisconnectedError, MCP2200ReplayError
+from .stats import COMMAND_NAMES
+
+LOG_MAGIC = b'MCP2200L'
+LOG_VERSION = 1
+HEADER = struct.Struct('<8sBxxxd')      # magic, version, wall clock time of the start
+RECORD = struct.Struct('<QBBH')         # ns since the start, channel, event, data length
+
+# Backend events, channel 0
+EVENT_FIND = 1          # the paths found, NUL separated
+EVENT_SERIAL = 2        # path NUL serial
+# Device events, on the channel given at EVENT_OPEN
+EVENT_OPEN = 3          # path
+EVENT_CLOSE = 4
+EVENT_WRITE = 5         # the report written
+EVENT_READ = 6          # the report read
+EVENT_TIMEOUT = 7       # the read or write timed out
+EVENT_DISCONNECTED = 8  # message
+EVENT_ERROR = 9         # message
+
+EVENT_NAMES = {
+    EVENT_FIND: 'find',
+    EVENT_SERIAL: 'serial',
+    EVENT_OPEN: 'open',
+    EVENT_CLOSE: 'close',
+    EVENT_WRITE: 'write',
+    EVENT_READ: 'read',
+    EVENT_TIMEOUT: 'timeout',
+    EVENT_DISCONNECTED: 'disconnected',
+    EVENT_ERROR: 'error',
+}
+
+LogRecord = namedtuple('LogRecord', ('time', 'channel', 'event', 'data'))
+
+
+def read_log(path):
+    ''' Iterate over the LogRecord of a log file '''
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError('%s is not an MCP2200 log' % path)
+        magic, version, _start = HEADER.unpack(header)
+        if magic != LOG_MAGIC:
+            raise ValueError('%s is not an MCP2200 log' % path)
+        if version > LOG_VERSION:
+            raise ValueError('Log version %d is not supported' % version)
+        while True:
+            record = f.read(RECORD.size)
+            if len(record) < RECORD.size:
+                # A truncated last record is the recorder being killed, not an error
+                return
+            ns, channel, event, length = RECORD.unpack(record)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield LogRecord(ns, channel, event, data)
+
+
+def summarize(path):
+    ''' Reports, errors and commands of a log, to compare sessions '''
+    summary = {'reports_out': 0, 'reports_in': 0, 'timeouts': 0, 'errors': 0, 'devices': 0, 'commands': {}, 'duration': 0.0}
+    commands = summary['commands']
+    for record in read_log(path):
+        summary['duration'] = record.time / 1e9
+        if record.event == EVENT_WRITE:
+            summary['reports_out'] += 1
+            name = COMMAND_NAMES.get(record.data[0], '0x%02x' % record.data[0]) if record.data else 'empty'
+            commands[name] = commands.get(name, 0) + 1
+        elif record.event == EVENT_READ:
+            summary['reports_in'] += 1
+        elif record.event == EVENT_TIMEOUT:
+            summary['timeouts'] += 1
+        elif record.event in (EVENT_DISCONNECTED, EVENT_ERROR):
+            summary['errors'] += 1
+        elif record.event == EVENT_OPEN:
+            summary['devices'] += 1
+    return summary
+
+
+# Recording
+
+class LogWriter():
+    ''' Appends records to a new log file, from any thread '''
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(LOG_MAGIC, LOG_VERSION, time.time()))
+        self._start = time.monotonic_ns()
+        self._lock = threading.Lock()
+
+    def write(self, channel, event, data=b''):
+        data = bytes(data[:0xffff])
+        with self._lock:
+            self._file.write(RECORD.pack(time.monotonic_ns() - self._start, channel, event, len(data)) + data)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RecordingHandle():
+    ''' A handle recording the reports going through it '''
+    def __init__(self, handle, log, channel):
+        self.handle = handle
+        self.log = log
+        self.channel = channel
+
+    def _failed(self, e):
+        if isinstance(e, MCP2200TimeoutError):
+            self.log.write(self.channel, EVENT_TIMEOUT)
+        elif isinstance(e, MCP2200DisconnectedError):
+            self.log.write(self.channel, EVENT_DISCONNECTED, str(e).encode('utf-8'))
+        else:
+            self.log.write(self.channel, EVENT_ERROR, str(e).encode('utf-8'))
+
+    def write(self, data, timeout=None):
+        try:
+            ret = self.handle.write(data, timeout)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self.log.write(self.channel, EVENT_WRITE, bytes(data))
+        return ret
+
+    def read(self, size, timeout=None):
+        try:
+            report = self.handle.read(size, timeout)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self.log.write(self.channel, EVENT_READ, bytes(report))
+        return report
+
+    def close(self):
+        self.log.write(self.channel, EVENT_CLOSE)
+        self.handle.close()
+
+
+class RecordingBackend():
+    ''' Wraps backend (default_backend by default) and records its traffic to
+        the log file path : the devices found, the serial numbers read and
+        every report. Each opened device gets a channel, from 1.
+        The log is buffered, flush() or close() it.
+    '''
+    def __init__(self, path, backend=None):
+        self.backend = backend if backend is not None else default_backend
+        # The wrapped backend's boards may be configured by other processes (see MCP2200Device)
+        self.shared = getattr(self.backend, 'shared', False)
+        self.log = LogWriter(path)
+        self._channels = 0
+        self._lock = threading.Lock()
+
+    def find(self, vid, pid):
+        devices = self.backend.find(vid, pid)
+        self.log.write(0, EVENT_FIND, '\0'.join(self.backend.path(dev) for dev in devices).encode('utf-8'))
+        return devices
+
+    def path(self, dev):
+        return self.backend.path(dev)
+
+    def listing(self):
+        # Not logged, the finds it leads to are
+        listing = getattr(self.backend, 'listing', None)
+        return listing() if listing is not None else None
+
+    def serial(self, dev):
+        serial = self.backend.serial(dev)
+        self.log.write(0, EVENT_SERIAL, ('%s\0%s' % (self.backend.path(dev), serial or '')).encode('utf-8'))
+        return serial
+
+    def open(self, dev):
+        # The channel first : a handle opened past the limit would leak
+        with self._lock:
+            if self._channels == 0xff:
+                raise MCP2200Error('Too many devices opened for the log')
+            self._channels += 1
+            channel = self._channels
+        handle = self.backend.open(dev)
+        self.log.write(channel, EVENT_OPEN, self.backend.path(dev).encode('utf-8'))
+        return RecordingHandle(handle, self.log, channel)
+
+    def flush(self):
+        self.log.flush()
+
+    def close(self):
+        self.log.close()
+
+
+# Replay
+
+class ReplayDevice():
+    ''' A device of the recording, what ReplayBackend.find() returns '''
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return '<ReplayDevice %s>' % self.path
+
+
+class ReplayHandle():
+    ''' Serves the recorded events of a device, in order. A write must match
+        the recorded report (unless the backend isn't strict), a read returns
+        the recorded one, recorded failures are raised again.
+    '''
+    def __init__(self, backend, path, events):
+        self.backend = backend
+        self.path = path
+        self.events = events
+
+    def _next(self, call):
+        while self.events:
+            record = self.events.popleft()
+            self.backend._wait(record.time)
+            if record.event == EVENT_TIMEOUT:
+                raise MCP2200TimeoutError('Recorded timeout of %s' % self.path)
+            if record.event == EVENT_DISCONNECTED:
+                raise MCP2200DisconnectedError(record.data.decode('utf-8', 'replace'))
+            if record.event == EVENT_ERROR:
+                raise MCP2200Error(record.data.decode('utf-8', 'replace'))
+            if record.event == call:
+                return record
+            if record.event != EVENT_CLOSE:
+                raise MCP2200ReplayError('%s : %s instead of the recorded %s' % (self.path, EVENT_NAMES[call], EVENT_NAMES.get(record.event, record.event)))
+        raise MCP2200ReplayError('%s : %s after the end of the recording' % (self.path, EVENT_NAMES[call]))
+
+    def write(self, data, timeout=None):
+        record = self._next(EVENT_WRITE)
+        if self.backend.strict and bytes(data) != record.data:
+            raise MCP2200ReplayError('%s : wrote %s instead of the recorded %s' % (self.path, bytes(data).hex(), record.data.hex()))
+        return len(data)
+
+    def read(self, size, timeout=None):
+        return bytearray(self._next(EVENT_READ).data[:size])
+
+    def close(self):
+        pass
+
+
+class ReplayBackend():
+    ''' Plays a log back : find() returns the devices recorded by each find
+        in turn, open() serves the events of the next recorded opening of the
+        device.
+
+        realtime replays at the recorded pace, otherwise as fast as possible.
+        strict makes any departure from the recording (other report written,
+        other call) raise MCP2200ReplayError ; not strict, the written reports aren't
+        compared.
+    '''
+    def __init__(self, path, realtime=False, strict=True):
+        self.realtime = realtime
+        self.strict = strict
+        self._finds = deque()
+        self._last_find = []
+        self._serials = {}
+        self._opens = {}
+        self._start = None
+        channels = {}
+        for record in read_log(path):
+            if record.event == EVENT_FIND:
+                paths = record.data.decode('utf-8')
+                self._finds.append(paths.split('\0') if paths else [])
+            elif record.event == EVENT_SERIAL:
+                dev_path, _, serial = record.data.decode('utf-8').partition('\0')
+                self._serials[dev_path] = serial or None
+            elif record.event == EVENT_OPEN:
+                events = channels[record.channel] = deque()
+                self._opens.setdefault(record.data.decode('utf-8'), deque()).append(events)
+            elif record.channel in channels:
+                channels[record.channel].append(record)
+
+    def _wait(self, ns):
+        if not self.realtime:
+            return
+        if self._start is None:
+            self._start = time.monotonic_ns() - ns
+        delay = self._start + ns - time.monotonic_ns()
+        if delay > 0:
+            time.sleep(delay / 1e9)
+
+    def find(self, vid, pid):
+        if self._finds:
+            self._last_find = self._finds.popleft()
+        return [ReplayDevice(path) for path in self._last_find]
+
+    def path(self, dev):
+        return dev.path
+
+    def serial(self, dev):
+        return self._serials.get(dev.path)
+
+    def open(self, dev):
+        opens = self._opens.get(dev.path)
+        if not opens:
+            raise MCP2200ReplayError('%s is not opened again in the recording' % dev.path)
+        return ReplayHandle(self, dev.path, opens.popleft())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+''' Enumerate the devices once and find them again by index, bus path or serial number.
+
+    >>> registry = DeviceRegistry()
+    >>> dev = registry.connect(serial='0001234')
+'''
+from .device import MCP2200Device, MCP2200_VID, MCP2200_PID, default_backend
+
+
+class DeviceEntry():
+    ''' A device found by the registry scan '''
+    __slots__ = ('index', 'path', 'dev', '_serial', '_backend')
+
+    def __init__(self, index, path, dev, backend):
+        self.index = index
+        self.path = path
+        self.dev = dev
+        self._serial = None
+        self._backend = backend
+
+    @property
+    def serial(self):
+        ''' Serial number, read from the device the first time only '''
+        if self._serial is None:
+            self._serial = self._backend.serial(self.dev)
+        return self._serial
+
+    def __repr__(self):
+        return '<DeviceEntry %d %s>' % (self.index, self.path)
+
+
+class DeviceRegistry():
+    ''' Indexes the devices of a single bus enumeration by index, bus path
+        (see the backend's path()) and serial number.
+
+        Lookups don't touch the bus, except the first lookup by serial number
+        which reads the serial numbers not known yet. Call scan() again to
+        take plugged/unplugged devices into account.
+    '''
+    def __init__(self, vid=MCP2200_VID, pid=MCP2200_PID, backend=None, scan=True):
+        self.vid = vid
+        self.pid = pid
+        self.backend = backend if backend is not None else default_backend
+        self.entries = []
+        self._by_path = {}
+        self._by_serial = None
+        if scan:
+            self.scan()
+
+    def scan(self, devices=None):
+        ''' Enumerate the bus, entries already known keep their cached serial number.
+            devices : what backend.find() just returned, spares a second enumeration.
+        '''
+        if devices is None:
+            devices = self.backend.find(self.vid, self.pid)
+        previous = self._by_path
+        entries = []
+        by_path = {}
+        for index, dev in enumerate(devices):
+            entry = DeviceEntry(index, self.backend.path(dev), dev, self.backend)
+            known = previous.get(entry.path)
+            if known is not None:
+                entry._serial = known._serial
+            entries.append(entry)
+            by_path[entry.path] = entry
+        # Swapped at once, lookups from other threads never see a partial scan
+        self.entries, self._by_path, self._by_serial = entries, by_path, None
+        return entries
+
+    def update(self, devices=None):
+        ''' Scan again (see scan()), returns the (added, removed) entries '''
+        before = self._by_path
+        self.scan(devices)
+        added = [entry for entry in self.entries if entry.path not in before]
+        removed = [entry for (path, entry) in before.items() if path not in self._by_path]
+        return added, removed
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def find(self, index=None, path=None, serial=None):
+        ''' The entry matching the given index, path or serial number.
+            Raises KeyError when there's none.
+        '''
+        if index is not None:
+            if not 0 <= index < len(self.entries):
+                raise KeyError(index)
+            return self.entries[index]
+        if path is not None:
+            return self._by_path[path]
+        if serial is not None:
+            if self._by_serial is None:
+                self._by_serial = {entry.serial:entry for entry in self.entries}
+            return self._by_serial[serial]
+        raise ValueError('index, path or serial is required')
+
+    def device(self, index=None, path=None, serial=None, cls=MCP2200Device, **kwargs):
+        ''' A device object bound to the entry, not opened yet '''
+        entry = self.find(index, path, serial)
+        return cls(entry.dev, backend=self.backend, **kwargs)
+
+    def connect(self, index=None, path=None, serial=None, cls=MCP2200Device, **kwargs):
+        ''' Open the matching device, without enumerating the bus again '''
+        device = self.device(index, path, serial, cls, **kwargs)
+        device.open()
+        return device
+
+    def devices(self, cls=MCP2200Device, **kwargs):
+        ''' A device object per entry, like discover() '''
+        return [cls(entry.dev, backend=self.backend, **kwargs) for entry in self.entries]
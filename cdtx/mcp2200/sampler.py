@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+''' Background sampling of the GPIO port.
+
+    >>> with GPIOSampler(device, capacity=100000) as sampler:
+    ...     time.sleep(1)
+    ...     timestamps, values = sampler.drain()
+    >>> sampler.stats()
+'''
+import time
+import threading
+from array import array
+
+
+class GPIOSampler():
+    ''' Polls the GPIO port of an MCP2200Device from a background thread.
+
+        Samples are (time.monotonic_ns(), IO_Port_Val_bmap) pairs stored in a
+        preallocated ring buffer of capacity entries (array('Q') timestamps and
+        array('B') values), no Python object is kept per sample. When the
+        buffer is full the oldest samples are overwritten, and accounted as
+        dropped if they were never drained.
+
+        interval is the minimum time between two samples in seconds, 0 polls
+        as fast as the HID link allows.
+    '''
+    def __init__(self, device, capacity=65536, interval=0.0):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.device = device
+        self.capacity = capacity
+        self.interval = interval
+        self.timestamps = array('Q', bytes(8 * capacity))
+        self.values = array('B', bytes(capacity))
+
+        # Total number of samples ever written, the slot of sample n is n % capacity
+        self._count = 0
+        # Index of the first sample not drained yet
+        self._position = 0
+        self._dropped = 0
+        self._first_ns = None
+        self._last_ns = None
+        self.errors = 0
+        self.last_error = None
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='GPIOSampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        # Local names, this is the hot loop
+        read_port = self.device.read_port
+        timestamps = self.timestamps
+        values = self.values
+        capacity = self.capacity
+        interval_ns = int(self.interval * 1e9)
+        stopped = self._stop.is_set
+        now = time.monotonic_ns
+
+        deadline = now()
+        while not stopped():
+            try:
+                value = read_port()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                if self._stop.wait(0.001):
+                    break
+                continue
+            ts = now()
+            slot = self._count % capacity
+            timestamps[slot] = ts
+            values[slot] = value
+            # Publish the sample once it's completely written
+            self._count += 1
+            if self._first_ns is None:
+                self._first_ns = ts
+            self._last_ns = ts
+
+            if interval_ns:
+                deadline += interval_ns
+                delay = deadline - now()
+                if delay > 0:
+                    self._stop.wait(delay / 1e9)
+                else:
+                    # Late, don't try to catch up with a burst
+                    deadline = now()
+
+    def _copy(self, first):
+        ''' Copy the samples [first, count[ out of the ring, oldest first.
+            Returns (first, timestamps, values), first being moved forward when
+            the sampler overwrote samples during the copy.
+        '''
+        count = self._count
+        first = max(first, count - self.capacity)
+        start, end = first % self.capacity, count % self.capacity
+        if count - first == 0:
+            timestamps, values = array('Q'), array('B')
+        elif start < end:
+            timestamps, values = self.timestamps[start:end], self.values[start:end]
+        else:
+            timestamps = self.timestamps[start:] + self.timestamps[:end]
+            values = self.values[start:] + self.values[:end]
+
+        # Slots reused by the sampler while copying are no longer valid, and
+        # while it runs, the slot of the next sample may be half written :
+        # new timestamp, old value, before _count is published
+        writing = 1 if self.running else 0
+        overwritten = max(0, self._count + writing - self.capacity - first)
+        if overwritten:
+            del timestamps[:overwritten]
+            del values[:overwritten]
+            first += overwritten
+        return first, timestamps, values
+
+    def snapshot(self):
+        ''' (timestamps, values) arrays of the samples currently held, oldest first.
+            Doesn't consume them.
+        '''
+        _first, timestamps, values = self._copy(0)
+        return timestamps, values
+
+    def drain(self):
+        ''' (timestamps, values) arrays of the samples not drained yet, oldest first '''
+        position = self._position
+        first, timestamps, values = self._copy(position)
+        self._dropped += first - position
+        self._position = first + len(values)
+        return timestamps, values
+
+    def __iter__(self):
+        ''' Drain and iterate over (timestamp_ns, port_value) pairs '''
+        timestamps, values = self.drain()
+        return zip(timestamps, values)
+
+    @property
+    def count(self):
+        ''' Number of samples taken since the creation '''
+        return self._count
+
+    @property
+    def dropped(self):
+        ''' Number of samples overwritten before being drained '''
+        return self._dropped + max(0, self._count - self.capacity - self._position)
+
+    def rate(self):
+        ''' Achieved sampling rate in samples per second '''
+        if self._count < 2:
+            return 0.0
+        return (self._count - 1) * 1e9 / (self._last_ns - self._first_ns)
+
+    def stats(self):
+        return {
+            'samples': self._count,
+            'rate': self.rate(),
+            'dropped': self.dropped,
+            'pending': min(self._count - self._position, self.capacity),
+            'errors': self.errors,
+            'capacity': self.capacity,
+        }
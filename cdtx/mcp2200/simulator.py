@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+''' Software MCP2200, usable in place of the actual USB device.
+
+    >>> from cdtx.mcp2200.simulator import SimulatorBackend
+    >>> from cdtx.mcp2200.api import SimpleIOClass
+    >>> backend = SimulatorBackend(count=2, latency=0.001)
+    >>> api = SimpleIOClass(backend)
+    >>> api.InitMCP2200(0x04d8, 0x00df)
+    >>> api.SelectDevice(0)
+'''
+import time
+from collections import deque
+
+from .device import MCP2200_VID, MCP2200_PID, MCP2200_EEPROM_SIZE
+from .codec import SET_CLEAR_OUTPUTS, CONFIGURE, READ_EE, WRITE_EE, READ_ALL
+from .errors import MCP2200TimeoutError, MCP2200DisconnectedError
+
+
+class MCP2200Simulator():
+    ''' Emulates the HID side of one MCP2200 : NVRAM configuration, GPIO port and user EEPROM.
+
+        Every report exchanged costs latency seconds and is accounted in
+        reports_out/reports_in and bytes_out/bytes_in.
+
+        Simplifications :
+        - CONFIGURE applies IO_Default_Val_bmap to the output latch immediately
+        - the alternate pin functions don't override the GPIO values
+        - the level of the pins configured as inputs is given by the inputs attribute
+        - reading while no response is pending times out immediately
+
+        Faults of a flaky bus can be injected : the next drop_responses
+        responses are lost, the next late_responses ones only arrive after
+        the read waiting for them timed out.
+    '''
+    def __init__(self, latency=0.0, serial_number='0000000', bus=1, address=1, vid=MCP2200_VID, pid=MCP2200_PID):
+        self.latency = latency
+        self.serial_number = serial_number
+        self.bus = bus
+        self.address = address
+        self.idVendor = vid
+        self.idProduct = pid
+
+        # Factory defaults
+        self.IO_bmap = 0xff
+        self.Config_Alt_Pins = 0x00
+        self.IO_Default_Val_bmap = 0x00
+        self.Config_Alt_Options = 0x00
+        self.Baud_H = 0x04
+        self.Baud_L = 0xe1
+        self.eeprom = bytearray([0xff]*MCP2200_EEPROM_SIZE)
+        self.ee_addr = 0
+
+        self.outputs = self.IO_Default_Val_bmap
+        self.inputs = 0xff
+
+        self.responses = deque()
+        self.drop_responses = 0
+        self.late_responses = 0
+        self._late = []
+        self.claimed = False
+        self.plugged = True
+        self.reset_stats()
+
+    def __repr__(self):
+        return '<MCP2200Simulator bus %d address %d serial %s>' % (self.bus, self.address, self.serial_number)
+
+    def reset_stats(self):
+        self.reports_out = 0
+        self.reports_in = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    @property
+    def transactions(self):
+        ''' Number of HID reports exchanged in both directions '''
+        return self.reports_out + self.reports_in
+
+    @property
+    def port(self):
+        ''' Current value of the GPIO port (IO_Port_Val_bmap) '''
+        return ((self.outputs & ~self.IO_bmap) | (self.inputs & self.IO_bmap)) & 0xff
+
+    # Handle interface (see cdtx.mcp2200.device.PyUSBBackend)
+
+    def close(self):
+        self.claimed = False
+
+    def write(self, data, timeout=None):
+        if not self.plugged:
+            raise MCP2200DisconnectedError('%r is unplugged' % self)
+        if self.latency:
+            time.sleep(self.latency)
+        data = bytes(data)
+        self.reports_out += 1
+        self.bytes_out += len(data)
+        self.process(data)
+        return len(data)
+
+    def read(self, size, timeout=None):
+        if not self.plugged:
+            raise MCP2200DisconnectedError('%r is unplugged' % self)
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.responses:
+            self.responses.extend(self._late)
+            self._late = []
+            raise MCP2200TimeoutError('No pending response from the simulated MCP2200')
+        response = self.responses.popleft()[:size]
+        self.reports_in += 1
+        self.bytes_in += len(response)
+        return response
+
+    # HID protocol
+
+    def process(self, data):
+        command = data[0]
+        if command == SET_CLEAR_OUTPUTS:
+            self.outputs |= data[11]
+            self.outputs &= ~data[12] & 0xff
+        elif command == CONFIGURE:
+            (self.IO_bmap, self.Config_Alt_Pins, self.IO_Default_Val_bmap,
+                self.Config_Alt_Options, self.Baud_H, self.Baud_L) = data[4:10]
+            self.outputs = self.IO_Default_Val_bmap
+        elif command == READ_EE:
+            self.ee_addr = data[1]
+            self.respond(READ_EE, {1:self.ee_addr, 3:self.eeprom[self.ee_addr]})
+        elif command == WRITE_EE:
+            self.ee_addr = data[1]
+            self.eeprom[self.ee_addr] = data[2]
+        elif command == READ_ALL:
+            self.respond(READ_ALL, {
+                1:self.ee_addr,
+                3:self.eeprom[self.ee_addr],
+                4:self.IO_bmap,
+                5:self.Config_Alt_Pins,
+                6:self.IO_Default_Val_bmap,
+                7:self.Config_Alt_Options,
+                8:self.Baud_H,
+                9:self.Baud_L,
+                10:self.port,
+            })
+
+    def respond(self, command, fields):
+        response = bytearray(16)
+        response[0] = command
+        for index, value in fields.items():
+            response[index] = value
+        if self.drop_responses:
+            self.drop_responses -= 1
+        elif self.late_responses:
+            self.late_responses -= 1
+            self._late.append(response)
+        else:
+            self.responses.append(response)
+
+
+class SimulatorBackend():
+    ''' Backend serving MCP2200Simulator instances instead of USB devices.
+
+        Either pass the simulators, or let the backend build count of them.
+    '''
+    def __init__(self, simulators=None, count=1, latency=0.0):
+        if simulators is None:
+            simulators = [MCP2200Simulator(latency=latency, serial_number='%07d' % i, address=i+1) for i in range(count)]
+        self.simulators = list(simulators)
+
+    def find(self, vid, pid):
+        return [sim for sim in self.simulators if (sim.idVendor, sim.idProduct) == (vid, pid)]
+
+    def path(self, dev):
+        return '%d-%d' % (dev.bus, dev.address)
+
+    def listing(self):
+        return tuple(self.path(sim) for sim in self.simulators)
+
+    def serial(self, dev):
+        return dev.serial_number
+
+    def open(self, dev):
+        if dev.claimed:
+            raise IOError('%r is already claimed' % dev)
+        dev.claimed = True
+        return dev
+
+    def reset_stats(self):
+        for sim in self.simulators:
+            sim.reset_stats()
+
+    def plug(self, sim):
+        sim.plugged = True
+        sim.claimed = False
+        self.simulators.append(sim)
+
+    def unplug(self, sim):
+        sim.plugged = False
+        self.simulators.remove(sim)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+''' HID transaction counters and latency histograms.
+
+    >>> stats = api.enable_stats()
+    >>> api.fnRxLED(TOGGLE)
+    >>> print(stats.to_prometheus())
+
+    Instrumentation replaces the methods of the instrumented object by timed
+    versions, on this object only : when disabled there's no overhead at all.
+'''
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+
+from .codec import SET_CLEAR_OUTPUTS, CONFIGURE, READ_EE, WRITE_EE, READ_ALL
+
+COMMAND_NAMES = {
+    SET_CLEAR_OUTPUTS: 'SET_CLEAR_OUTPUTS',
+    CONFIGURE: 'CONFIGURE',
+    READ_EE: 'READ_EE',
+    WRITE_EE: 'WRITE_EE',
+    READ_ALL: 'READ_ALL',
+}
+# Commands answered by an input report
+RESPONSE_COMMANDS = (READ_EE, READ_ALL)
+
+# Upper bounds in seconds, the last bucket catches everything
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, float('inf'))
+
+
+class Histogram():
+    ''' Fixed buckets histogram '''
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': [[bound, count] for (bound, count) in zip(self.bounds, self.counts)],
+        }
+
+
+class Stats():
+    ''' Counters of the reports exchanged, latency per command and per API method.
+
+        A command latency goes from the request being written to its response
+        being read, or to the end of the write for the commands without response.
+    '''
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # Reports of each thread, the methods are charged their own thread's
+        self._thread = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.reports_out = 0
+            self.reports_in = 0
+            self.bytes_out = 0
+            self.bytes_in = 0
+            self.commands = {}
+            self.methods = {}
+            self.method_reports = {}
+
+    @property
+    def reports(self):
+        return self.reports_out + self.reports_in
+
+    def thread_reports(self):
+        ''' Reports exchanged by the calling thread, never reset '''
+        return getattr(self._thread, 'reports', 0)
+
+    def _count_thread_report(self):
+        self._thread.reports = getattr(self._thread, 'reports', 0) + 1
+
+    def _histogram(self, group, name):
+        histogram = group.get(name)
+        if histogram is None:
+            histogram = group[name] = Histogram(self.buckets)
+        return histogram
+
+    def report_out(self, size):
+        self._count_thread_report()
+        with self._lock:
+            self.reports_out += 1
+            self.bytes_out += size
+
+    def report_in(self, size):
+        self._count_thread_report()
+        with self._lock:
+            self.reports_in += 1
+            self.bytes_in += size
+
+    def command(self, name, seconds):
+        with self._lock:
+            self._histogram(self.commands, name).observe(seconds)
+
+    def method(self, name, seconds, reports):
+        with self._lock:
+            self._histogram(self.methods, name).observe(seconds)
+            self.method_reports[name] = self.method_reports.get(name, 0) + reports
+
+    # Export
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'reports_out': self.reports_out,
+                'reports_in': self.reports_in,
+                'bytes_out': self.bytes_out,
+                'bytes_in': self.bytes_in,
+                'commands': {name:h.as_dict() for (name, h) in self.commands.items()},
+                'methods': {name:dict(h.as_dict(), reports=self.method_reports[name]) for (name, h) in self.methods.items()},
+            }
+
+    def to_json(self, **kwargs):
+        # inf isn't valid JSON
+        data = self.as_dict()
+        for group in (data['commands'], data['methods']):
+            for histogram in group.values():
+                histogram['buckets'][-1][0] = '+Inf'
+        return json.dumps(data, **kwargs)
+
+    def to_prometheus(self, prefix='mcp2200'):
+        ''' Prometheus text exposition format '''
+        data = self.as_dict()
+        lines = [
+            '# TYPE %s_reports_total counter' % prefix,
+            '%s_reports_total{direction="out"} %d' % (prefix, data['reports_out']),
+            '%s_reports_total{direction="in"} %d' % (prefix, data['reports_in']),
+            '# TYPE %s_bytes_total counter' % prefix,
+            '%s_bytes_total{direction="out"} %d' % (prefix, data['bytes_out']),
+            '%s_bytes_total{direction="in"} %d' % (prefix, data['bytes_in']),
+        ]
+        for (metric, label, group) in (('command_seconds', 'command', data['commands']), ('method_seconds', 'method', data['methods'])):
+            lines.append('# TYPE %s_%s histogram' % (prefix, metric))
+            for name, histogram in sorted(group.items()):
+                cumulative = 0
+                for bound, count in histogram['buckets']:
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_%s_bucket{%s="%s",le="%s"} %d' % (prefix, metric, label, name, le, cumulative))
+                lines.append('%s_%s_sum{%s="%s"} %r' % (prefix, metric, label, name, histogram['sum']))
+                lines.append('%s_%s_count{%s="%s"} %d' % (prefix, metric, label, name, histogram['count']))
+        lines.append('# TYPE %s_method_reports_total counter' % prefix)
+        for name, histogram in sorted(data['methods'].items()):
+            lines.append('%s_method_reports_total{method="%s"} %d' % (prefix, name, histogram['reports']))
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_device(device, stats):
+    ''' Replace read/write of a BaseDevice by versions feeding stats '''
+    read = type(device).read.__get__(device)
+    write = type(device).write.__get__(device)
+    now = time.perf_counter
+    # Commands waiting for their response, oldest first : (command, name, start).
+    # Pipelined requests (e.g. read_ee_range windows) have several pending.
+    pending = deque(maxlen=256)
+
+    def timed_write(data, timeout=None):
+        start = now()
+        ret = write(data, timeout)
+        stats.report_out(len(data))
+        command = data[0]
+        if command in RESPONSE_COMMANDS:
+            pending.append((command, COMMAND_NAMES[command], start))
+        else:
+            stats.command(COMMAND_NAMES.get(command, '0x%02x' % command), now() - start)
+        return ret
+
+    def timed_read(timeout=None):
+        ret = read(timeout)
+        stats.report_in(len(ret))
+        # The oldest request of this command, the older ones of other commands went unanswered
+        while pending:
+            command, name, start = pending.popleft()
+            if command == ret[0]:
+                stats.command(name, now() - start)
+                break
+        return ret
+
+    device.read = timed_read
+    device.write = timed_write
+
+
+def uninstrument(obj, names):
+    for name in names:
+        obj.__dict__.pop(name, None)
+
+
+def _timed_method(method, name, stats):
+    now = time.perf_counter
+
+    def timed(*args, **kwargs):
+        reports = stats.thread_reports()
+        start = now()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats.method(name, now() - start, stats.thread_reports() - reports)
+    timed.__name__ = name
+    timed.__doc__ = method.__doc__
+    return timed
+
+
+def instrument_methods(obj, names, stats):
+    ''' Replace the methods names of obj by versions timing them into stats.methods '''
+    for name in names:
+        setattr(obj, name, _timed_method(getattr(type(obj), name).__get__(obj), name, stats))
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+''' The serial link of the MCP2200 : its CDC ACM tty, on Linux.
+
+    >>> serial = MCP2200Serial.from_device(device)     # baud rate and flow control from the NVRAM
+    >>> buffer = bytearray(65536)
+    >>> count = serial.readinto(buffer)
+    >>> for frame in serial.frames(b'\n'):
+    ...     handle(frame)
+    >>> reader, writer = await serial.open_stream()
+
+    The reads land in the caller's buffer (readinto) or in a buffer allocated
+    once (frames) : no intermediate copy besides the frames handed out.
+'''
+import io
+import os
+import re
+import time
+import select
+import asyncio
+import termios
+import threading
+
+from .codec import MCP2200Config
+from .errors import MCP2200Error, MCP2200TimeoutError, MCP2200DisconnectedError
+from .stats import Histogram
+
+SYSFS_TTY = '/sys/class/tty'
+DEV = '/dev'
+# The CDC interfaces : 0 is the communication one, the tty hangs off it
+CDC_INTERFACE = 0
+# The baud rates supported by the MCP2200
+MIN_BAUD_RATE = 300
+MAX_BAUD_RATE = 1000000
+
+_INTERFACE = re.compile(r'^(\d+-[\d.]+):\d+\.(\d+)$')
+
+
+def find_tty(device, sysfs=None, dev=None):
+    ''' The tty of the board of device (an MCP2200Device), None if not found.
+        The board is recognized by its bus path (see BaseDevice.identity()).
+    '''
+    sysfs = sysfs if sysfs is not None else SYSFS_TTY
+    dev = dev if dev is not None else DEV
+    path = device.identity()
+    try:
+        names = sorted(os.listdir(sysfs))
+    except OSError:
+        return None
+    for name in names:
+        interface = os.path.basename(os.path.realpath(os.path.join(sysfs, name, 'device')))
+        match = _INTERFACE.match(interface)
+        if match is not None and match.group(1) == path and int(match.group(2)) == CDC_INTERFACE:
+            return os.path.join(dev, name)
+    return None
+
+
+def _speed(baud_rate):
+    speed = getattr(termios, 'B%d' % baud_rate, None)
+    if speed is None or not MIN_BAUD_RATE <= baud_rate <= MAX_BAUD_RATE:
+        raise ValueError('Unsupported baud rate %d' % baud_rate)
+    return speed
+
+
+class SerialStats():
+    ''' Bytes moved, throughput since the last reset, and how long the reads
+        waited for data and the writes took (stats.Histogram, in seconds)
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.reads = 0
+            self.writes = 0
+            self.frames = 0
+            self.read_wait = Histogram()
+            self.write_time = Histogram()
+            self.since = time.monotonic()
+
+    def read(self, count, seconds):
+        with self._lock:
+            self.bytes_in += count
+            self.reads += 1
+            self.read_wait.observe(seconds)
+
+    def write(self, count, seconds):
+        with self._lock:
+            self.bytes_out += count
+            self.writes += 1
+            self.write_time.observe(seconds)
+
+    def frame(self):
+        with self._lock:
+            self.frames += 1
+
+    def throughput(self):
+        ''' (bytes in, bytes out) per second '''
+        elapsed = max(time.monotonic() - self.since, 1e-9)
+        return self.bytes_in / elapsed, self.bytes_out / elapsed
+
+    def as_dict(self):
+        rate_in, rate_out = self.throughput()
+        with self._lock:
+            return {
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'reads': self.reads,
+                'writes': self.writes,
+                'frames': self.frames,
+                'rate_in': rate_in,
+                'rate_out': rate_out,
+                'read_wait': self.read_wait.as_dict(),
+                'write_time': self.write_time.as_dict(),
+            }
+
+
+class MCP2200Serial():
+    ''' A tty in raw mode at baud_rate, with RTS/CTS flow control if
+        flow_control. timeout (seconds, None blocks) is the default of the
+        reads and writes, a timeout raises MCP2200TimeoutError.
+    '''
+    def __init__(self, port, baud_rate=9600, flow_control=False, timeout=None):
+        self.port = port
+        self.timeout = timeout
+        self.stats = SerialStats()
+        try:
+            self.fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError as e:
+            raise MCP2200Error('%s : %s' % (port, e.strerror))
+        # readinto() without a copy, on the non-blocking fd
+        self._file = io.FileIO(self.fd, 'r+b', closefd=False)
+        try:
+            self.set_line(baud_rate, flow_control)
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def from_device(cls, device, baud_rate=None, flow_control=None, timeout=None, port=None):
+        ''' Open the tty of device's board (port, found by find_tty() by
+            default). The baud rate and flow control default to the NVRAM
+            ones ; given, they're also written to the NVRAM when they differ,
+            so that the chip agrees with the tty.
+        '''
+        if port is None:
+            port = find_tty(device)
+        if port is None:
+            raise MCP2200Error('No tty found for %s' % device.identity())
+        config = MCP2200Config.from_dict(device.read_config())
+        if baud_rate is None:
+            baud_rate = config.baud_rate
+        if flow_control is None:
+            flow_control = config.hardware_flow_control
+        _speed(baud_rate)
+
+        def modifier(values):
+            target = MCP2200Config.from_dict(values)
+            target.baud_rate = baud_rate
+            target.hardware_flow_control = flow_control
+            values.update(target.as_dict())
+        device.modify_config(modifier)
+        return cls(port, baud_rate, flow_control, timeout)
+
+    def set_line(self, baud_rate, flow_control=False):
+        speed = _speed(baud_rate)
+        iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(self.fd)
+        # cfmakeraw(), 8N1
+        iflag &= ~(termios.IGNBRK | termios.BRKINT | termios.PARMRK | termios.ISTRIP
+            | termios.INLCR | termios.IGNCR | termios.ICRNL | termios.IXON | termios.IXOFF)
+        oflag &= ~termios.OPOST
+        lflag &= ~(termios.ECHO | termios.ECHONL | termios.ICANON | termios.ISIG | termios.IEXTEN)
+        cflag &= ~(termios.CSIZE | termios.PARENB | termios.CSTOPB | termios.CRTSCTS)
+        cflag |= termios.CS8 | termios.CREAD | termios.CLOCAL
+        if flow_control:
+            cflag |= termios.CRTSCTS
+        cc[termios.VMIN] = 1
+        cc[termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, [iflag, oflag, cflag, lflag, speed, speed, cc])
+        self.baud_rate = baud_rate
+        self.flow_control = flow_control
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            self._file.close()
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Blocking I/O
+
+    def _wait(self, readable, timeout):
+        if timeout is None:
+            timeout = self.timeout
+        if readable:
+            ready = select.select((self.fd,), (), (), timeout)[0]
+        else:
+            ready = select.select((), (self.fd,), (), timeout)[1]
+        if not ready:
+            raise MCP2200TimeoutError('%s not %s within %g s' % (self.port, 'readable' if readable else 'writable', timeout))
+
+    def readinto(self, buffer, timeout=None):
+        ''' Read what's available, at least a byte, into buffer (any writable
+            buffer, e.g. a memoryview slice). Returns the number of bytes read.
+        '''
+        start = time.perf_counter()
+        while True:
+            try:
+                count = self._file.readinto(buffer)
+            except OSError as e:
+                raise MCP2200DisconnectedError('%s : %s' % (self.port, e.strerror))
+            if count is None:
+                self._wait(True, timeout)
+                continue
+            if count == 0 and len(buffer):
+                raise MCP2200DisconnectedError('%s was closed' % self.port)
+            self.stats.read(count, time.perf_counter() - start)
+            return count
+
+    def read(self, size, timeout=None):
+        buffer = bytearray(size)
+        return bytes(memoryview(buffer)[:self.readinto(buffer, timeout)])
+
+    def readinto_exactly(self, buffer, timeout=None):
+        ''' Fill buffer, timeout applies to each read '''
+        view = memoryview(buffer).cast('B')
+        done = 0
+        while done < len(view):
+            done += self.readinto(view[done:], timeout)
+        return done
+
+    def write(self, data, timeout=None):
+        ''' Write all of data (any buffer), returns its length '''
+        start = time.perf_counter()
+        view = memoryview(data).cast('B')
+        done = 0
+        while done < len(view):
+            try:
+                count = os.write(self.fd, view[done:])
+            except BlockingIOError:
+                self._wait(False, timeout)
+                continue
+            except OSError as e:
+                raise MCP2200DisconnectedError('%s : %s' % (self.port, e.strerror))
+            done += count
+        self.stats.write(done, time.perf_counter() - start)
+        return done
+
+    def flush(self):
+        ''' Wait until everything written was sent '''
+        termios.tcdrain(self.fd)
+
+    def reset_input(self):
+        termios.tcflush(self.fd, termios.TCIFLUSH)
+
+    def frames(self, delimiter=b'\n', size=None, buffer_size=65536, timeout=None):
+        ''' Iterate over the frames received : ending with delimiter
+            (included), or of size bytes if given. A frame longer than
+            buffer_size raises MCP2200Error. Stops when the tty is closed.
+        '''
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        start = end = 0
+        while True:
+            # Every complete frame already in the buffer
+            while True:
+                if size is not None:
+                    stop = start + size if end - start >= size else -1
+                else:
+                    stop = buffer.find(delimiter, start, end)
+                    if stop >= 0:
+                        stop += len(delimiter)
+                if stop < 0:
+                    break
+                self.stats.frame()
+                yield bytes(view[start:stop])
+                start = stop
+            if start == end:
+                start = end = 0
+            elif end == buffer_size:
+                if start == 0:
+                    raise MCP2200Error('Frame longer than %d bytes' % buffer_size)
+                # Partial frame back to the front
+                buffer[:end - start] = view[start:end]
+                start, end = 0, end - start
+            try:
+                end += self.readinto(view[end:], timeout)
+            except MCP2200DisconnectedError:
+                return
+
+    # asyncio
+
+    async def open_stream(self, limit=65536):
+        ''' (asyncio.StreamReader, asyncio.StreamWriter) on the tty, on
+            duplicates of its file descriptor : close them independently.
+            Not accounted in stats.
+        '''
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=limit)
+        protocol = asyncio.StreamReaderProtocol(reader)
+        await loop.connect_read_pipe(lambda: protocol, io.FileIO(os.dup(self.fd), 'rb'))
+        # A protocol providing drain(), its own reader only gets the end of the write pipe
+        transport, writer_protocol = await loop.connect_write_pipe(lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader(limit=limit)),
+            io.FileIO(os.dup(self.fd), 'wb'))
+        writer = asyncio.StreamWriter(transport, writer_protocol, reader, loop)
+        return reader, writer
@@ -11,7 +11,13 @@ setup(
     ],
     packages = ('cdtx.mcp2200',),
     namespace_packages = ('cdtx',),
-    install_requires = ['pyusb']
+    install_requires = ['pyusb'],
+    entry_points = {
+        'console_scripts': [
+            'mcp2200 = cdtx.mcp2200.cli:main',
+            'mcp2200-daemon = cdtx.mcp2200.daemon:main',
+        ],
+    },
 )
 
 
@@ -3,11 +3,63 @@ import pytest
 
 from cdtx.mcp2200.device import *
 from cdtx.mcp2200.api import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+def pytest_addoption(parser):
+    parser.addoption('--mcp2200', action='store', default='auto', choices=('auto', 'hw', 'sim'),
+        help='Run against an actual MCP2200 (hw), the simulator (sim), or the simulator when no device is found (auto)')
+    parser.addoption('--benchmark', action='store_true', default=False,
+        help='Also run the timing and memory comparisons, which depend on the load of the machine')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: timing or memory comparison, only run with --benchmark')
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    skip = pytest.mark.skip(reason='benchmark, run with --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+def hardware_available():
+    try:
+        return bool(default_backend.find(MCP2200_VID, MCP2200_PID))
+    except Exception:
+        return False
+
+@pytest.fixture(scope="session")
+def backend(request):
+    option = request.config.getoption('--mcp2200')
+    if option == 'hw' or (option == 'auto' and hardware_available()):
+        return default_backend
+    return SimulatorBackend()
 
 @pytest.fixture(scope="class")
-def api(request):
-    api = SimpleIOClass()
+def api(request, backend):
+    api = SimpleIOClass(backend)
     api.InitMCP2200(MCP2200_VID, MCP2200_PID)
     api.SelectDevice(0)
     yield api
     api.device.disconnect()
+
+@pytest.fixture
+def make_device():
+    ''' Factory of devices (MCP2200Device or cls) on their own simulator,
+        disconnected at the end of the test. outputs makes every GPIO an output.
+    '''
+    devices = []
+    def make(cls=MCP2200Device, outputs=False):
+        dev = cls(backend=SimulatorBackend(), autoConnect=True)
+        devices.append(dev)
+        if outputs:
+            dev.modify_config(lambda config: config.update(IO_bmap=0x00))
+            dev.handle.reset_stats()
+        return dev
+    yield make
+    for dev in devices:
+        dev.disconnect()
+
+@pytest.fixture
+def device(make_device):
+    return make_device()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import asyncio
+import pytest
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.aio import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+class TestAsyncDevice():
+    def test_commands(self):
+        async def scenario():
+            async with AsyncMCP2200Device(backend=SimulatorBackend(), autoConnect=True) as dev:
+                config = await dev.read_config()
+                config['IO_bmap'] = 0x00
+                assert await dev.configure(**config)
+                await dev.set_clear_outputs(Set_bmap=0x81, Clear_bmap=0x00)
+                assert (await dev.read_all())['IO_Port_Val_bmap'] == 0x81
+                assert await dev.write_ee_range(0, b'\x01\x02') == 2
+                assert await dev.read_ee_range(0, 2) == b'\x01\x02'
+        run(scenario())
+
+    def test_discover(self):
+        async def scenario():
+            devices = await AsyncMCP2200Device.discover(backend=SimulatorBackend(count=2))
+            assert len(devices) == 2
+        run(scenario())
+
+    def test_timeout_keeps_pairing(self):
+        backend = SimulatorBackend(latency=0.05)
+        async def scenario():
+            dev = AsyncMCP2200Device(backend=backend, autoConnect=True)
+            with pytest.raises(asyncio.TimeoutError):
+                await dev.read_all(timeout=0.01)
+            # The timed out READ_ALL completed in the background, the next
+            # command reads its own response
+            assert (await dev.read_ee(EEP_Addr=3))['EEP_Addr'] == 3
+            await dev.close()
+        run(scenario())
+
+    def test_device_timeout(self):
+        async def scenario():
+            dev = AsyncMCP2200Device(backend=SimulatorBackend(), autoConnect=True, timeout=0.5)
+            timeouts = []
+            read_all = dev.device.read_all
+            dev.device.read_all = lambda timeout=None: timeouts.append(timeout) or read_all(timeout)
+            await dev.read_all()
+            await dev.read_all(timeout=0.2)
+            # No timeout argument for the commands without one
+            await dev.read_config()
+            await dev.close()
+            return timeouts
+        assert run(scenario()) == [0.5, 0.2]
+
+    def test_cancel(self):
+        backend = SimulatorBackend(latency=0.05)
+        sim = backend.simulators[0]
+        async def scenario():
+            dev = AsyncMCP2200Device(backend=backend, autoConnect=True)
+            first = asyncio.ensure_future(dev.read_all())
+            second = asyncio.ensure_future(dev.write_ee(EEP_Addr=0, EEP_Val=0x42))
+            await asyncio.sleep(0.01)
+            second.cancel()
+            await first
+            with pytest.raises(asyncio.CancelledError):
+                await second
+            await dev.close()
+        run(scenario())
+        # The cancelled WRITE_EE never reached the device
+        assert sim.eeprom[0] == 0xff
+
+class TestAsyncSimpleIO():
+    def test_api(self):
+        async def scenario():
+            api = AsyncSimpleIOClass(SimulatorBackend())
+            await api.InitMCP2200(MCP2200_VID, MCP2200_PID)
+            assert await api.GetNoOfDevices() == 1
+            assert await api.SelectDevice(0) == 0
+            await api.ConfigureIO(0x00)
+            await api.SetPin(3)
+            assert await api.ReadPin(3) == (True, 1)
+            def batch(sync_api):
+                with sync_api.transaction():
+                    sync_api.fnSetBaudRate(9600)
+                    sync_api.fnULoad(1)
+                return sync_api.device.read_config()
+            config = await api.run(batch)
+            assert config['Config_Alt_Pins'] & 0x40
+            api.shutdown()
+        run(scenario())
@@ -40,6 +40,107 @@ class TestMiscellaneous():
         assert api.WriteEEPROM(0, 300) == errors.E_CANNOT_SEND_DATA
 
 
+class TestSnapshot():
+    def test_read_pins(self, api):
+        api.ConfigureIO(0x00)
+        api.WritePort(0xa5)
+        snapshot = api.snapshot()
+        assert snapshot.value == 0xa5
+        assert 0 <= snapshot.age < 1.0
+        assert api.read_pins() == {pin:(0xa5 >> pin) & 1 for pin in range(8)}
+        assert api.read_pins([0, 1]) == {0:1, 1:0}
+        with pytest.raises(ValueError):
+            api.read_pins([8])
+
+    def test_max_age(self, api):
+        api.ConfigureIO(0x00)
+        api.WritePort(0x0f)
+        assert api.port_age() is None
+        assert api.ReadPortValue(max_age=1.0) == 0x0f
+        age = api.port_age()
+        assert api.ReadPinValue(0, max_age=1.0) == 1
+        assert api.port_age() >= age
+        # An output command forgets the value read
+        api.SetPin(7)
+        assert api.port_age() is None
+        assert api.ReadPort(max_age=1.0) == (True, 0x8f)
+        # Any age reuses it, None always reads
+        read = api.snapshot(max_age=float('inf')).time
+        assert api.snapshot(max_age=float('inf')).time == read
+        assert api.snapshot(max_age=None).time > read
+        assert api.snapshot().value == 0x8f
+
+
+class TestBatchedOutputs():
+    def test_batched_outputs(self, api):
+        api.ConfigureIO(0x00)
+        api.WritePort(0x00)
+        with api.batched_outputs():
+            for pin in range(8):
+                api.SetPin(pin)
+            api.ClearPin(3)
+            assert api.outputs.pending
+        assert not api.outputs.pending
+        assert api.ReadPortValue() == 0xf7
+
+    def test_read_flushes(self, api):
+        api.ConfigureIO(0x00)
+        api.output_window = 10.0
+        try:
+            api.WritePort(0x00)
+            api.SetPin(5)
+            assert api.outputs.pending
+            assert api.ReadPinValue(5) == 1
+        finally:
+            api.output_window = None
+        assert not api.outputs.pending
+
+
+class TestEEPROMBlock():
+    def test_dump_restore(self, api):
+        backup = api.dump_eeprom()
+        assert isinstance(backup, bytes)
+        assert len(backup) == 256
+
+        image = bytes(range(256))
+        api.restore_eeprom(image)
+        assert api.dump_eeprom() == image
+        # Nothing differs, nothing is written
+        assert api.restore_eeprom(image) == 0
+        assert api.restore_eeprom(b'\x10\x11', start=0x10) == 0
+        assert api.restore_eeprom(b'\xff\x11', start=0x10) == 1
+        assert api.dump_eeprom(0x10, 2) == b'\xff\x11'
+
+        api.restore_eeprom(backup)
+        assert api.dump_eeprom() == backup
+
+    def test_pipelined(self, api):
+        ''' Several READ_EE in flight before the first response is read '''
+        device = api.device
+        # In flight, most in flight
+        pending = [0, 0]
+        write, read = device.write, device.read
+        def counted_write(data, timeout=None):
+            pending[0] += 1
+            pending[1] = max(pending)
+            return write(data, timeout)
+        def counted_read(timeout=None):
+            pending[0] -= 1
+            return read(timeout)
+        device.write, device.read = counted_write, counted_read
+        try:
+            assert len(api.dump_eeprom(0, 16)) == 16
+        finally:
+            del device.write, device.read
+        assert pending[1] == mcp2200api.EE_WINDOW
+
+    def test_wrong_range(self, api):
+        with pytest.raises(ValueError):
+            api.dump_eeprom(250, 10)
+        with pytest.raises(ValueError):
+            api.restore_eeprom(b'\x00'*2, start=255)
+
+
 class TestConfiguration():
     def test_ConfigureIO(self, api):
         # Disable GPIO's USB dedicated function
@@ -214,3 +315,75 @@ class TestIOControl():
 
 
 
+class TestTransaction():
+    def test_transaction_context(self, api):
+        api.ConfigureMCP2200(0xff, 9600, mcp2200api.OFF, mcp2200api.OFF, 0, 0, 0)
+
+        with api.transaction():
+            assert api.in_transaction()
+            api.ConfigureIO(0x0f)
+            api.fnSetBaudRate(19200)
+            api.fnRxLED(mcp2200api.TOGGLE)
+            # Nothing reaches the device before the commit
+            assert api.device.read_all()['IO_bmap'] == 0xff
+        assert not api.in_transaction()
+
+        config = api.device.read_all()
+        assert config['IO_bmap'] == 0x0f
+        assert config['Baud_H']*256 + config['Baud_L'] == 12000000 // 19200 - 1
+        assert config['Config_Alt_Pins'] & 0x08 == 0x08
+        assert config['Config_Alt_Options'] & 0x80 == 0x80
+
+    def test_transaction_explicit(self, api):
+        api.ConfigureIO(0xff)
+        api.begin_transaction()
+        api.ConfigureIO(0x00)
+        api.ConfigureIO(0xf0)
+        assert api.commit_transaction() == True
+        assert api.device.read_all()['IO_bmap'] == 0xf0
+
+    def test_transaction_abort(self, api):
+        api.ConfigureIO(0xff)
+        with pytest.raises(RuntimeError):
+            with api.transaction():
+                api.ConfigureIO(0x00)
+                raise RuntimeError()
+        assert not api.in_transaction()
+        assert api.device.read_all()['IO_bmap'] == 0xff
+
+        api.begin_transaction()
+        api.ConfigureIO(0x00)
+        api.abort_transaction()
+        assert api.device.read_all()['IO_bmap'] == 0xff
+
+    def test_transaction_nested_abort(self, api):
+        api.ConfigureIO(0xff)
+        with pytest.raises(RuntimeError):
+            with api.transaction():
+                api.ConfigureIO(0x0f)
+                with api.transaction():
+                    api.ConfigureIO(0x00)
+                    raise RuntimeError()
+        assert not api.in_transaction()
+        assert api.device.read_all()['IO_bmap'] == 0xff
+
+        # The inner abort is caught : the outer commit must not apply a part of the changes
+        with pytest.raises(errors.MCP2200Error):
+            with api.transaction():
+                api.ConfigureIO(0x0f)
+                with pytest.raises(RuntimeError):
+                    with api.transaction():
+                        raise RuntimeError()
+        assert not api.in_transaction()
+        assert api.device.read_all()['IO_bmap'] == 0xff
+
+        with pytest.raises(errors.MCP2200Error):
+            api.abort_transaction()
+
+    def test_transaction_nested(self, api):
+        api.ConfigureIO(0xff)
+        with api.transaction():
+            assert api.ConfigureMCP2200(0x00, 9600, mcp2200api.OFF, mcp2200api.OFF, 0, 0, 0)
+            assert api.device.read_all()['IO_bmap'] == 0xff
+        assert api.device.read_all()['IO_bmap'] == 0x00
+
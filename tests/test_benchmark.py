@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+''' HID round trip budget of the SimpleIOClass methods, measured on the simulator.
+
+    Also compares the CPU time and memory of the report codec with the former
+    list/dict based encoding.
+
+    The CPU time and memory comparisons are marked benchmark, only run with
+        python -m pytest --benchmark
+
+    Run as a script to print the report :
+        python tests/test_benchmark.py [latency_in_seconds]
+'''
+import os
+import sys
+import time
+import subprocess
+import tracemalloc
+import pytest
+
+from cdtx.mcp2200.api import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+from cdtx.mcp2200.device import BaseDevice, MCP2200Device, MCP2200_VID, MCP2200_PID, CONFIG_FIELDS, get_backend
+
+def set_pins_batched(api):
+    with api.batched_outputs():
+        for pin in range(8):
+            api.SetPin(pin)
+
+# name : (call, maximum number of HID reports exchanged)
+# Each call is measured on a freshly selected device (empty configuration cache)
+SCENARIOS = {
+    'ClearPin':                 (lambda api: api.ClearPin(0), 1),
+    'SetPin':                   (lambda api: api.SetPin(0), 1),
+    'WritePort':                (lambda api: api.WritePort(0x55), 1),
+    'SetPin x8, batched':       (lambda api: set_pins_batched(api), 1),
+    'ReadPin':                  (lambda api: api.ReadPin(0), 2),
+    'ReadPinValue':             (lambda api: api.ReadPinValue(0), 2),
+    'ReadPort':                 (lambda api: api.ReadPort(), 2),
+    'ReadPortValue':            (lambda api: api.ReadPortValue(), 2),
+    'read_pins':                (lambda api: api.read_pins(), 2),
+    'ReadPin x8, max_age':      (lambda api: [api.ReadPin(pin, max_age=1.0) for pin in range(8)], 2),
+    'ReadEEPROM':               (lambda api: api.ReadEEPROM(0), 2),
+    'WriteEEPROM':              (lambda api: api.WriteEEPROM(0, 0), 1),
+    'ConfigureIO':              (lambda api: api.ConfigureIO(0x00), 3),
+    'ConfigureIoDefaultOutput': (lambda api: api.ConfigureIoDefaultOutput(0x00, 0xff), 3),
+    'ConfigureMCP2200':         (lambda api: api.ConfigureMCP2200(0x00, 9600, BLINKFAST, BLINKFAST, 1, 0, 0), 3),
+    'fnHardwareFlowControl':    (lambda api: api.fnHardwareFlowControl(1), 3),
+    'fnRxLED':                  (lambda api: api.fnRxLED(TOGGLE), 3),
+    'fnTxLED':                  (lambda api: api.fnTxLED(TOGGLE), 3),
+    'fnSetBaudRate':            (lambda api: api.fnSetBaudRate(9600), 3),
+    'fnSuspend':                (lambda api: api.fnSuspend(1), 3),
+    'fnULoad':                  (lambda api: api.fnULoad(1), 3),
+    'dump_eeprom':              (lambda api: api.dump_eeprom(), 512),
+    'restore_eeprom':           (lambda api: api.restore_eeprom(b'\xff'*256), 512),
+    'GetNoOfDevices':           (lambda api: api.GetNoOfDevices(), 0),
+}
+
+def measure(name, latency=0.0):
+    ''' Returns (transactions, bytes, seconds) for one call of the scenario '''
+    backend = SimulatorBackend(latency=latency)
+    api = SimpleIOClass(backend)
+    api.InitMCP2200(MCP2200_VID, MCP2200_PID)
+    api.SelectDevice(0)
+    try:
+        sim = backend.simulators[0]
+        sim.reset_stats()
+        call, _budget = SCENARIOS[name]
+        start = time.perf_counter()
+        call(api)
+        elapsed = time.perf_counter() - start
+        return (sim.transactions, sim.bytes_out + sim.bytes_in, elapsed)
+    finally:
+        api.device.disconnect()
+
+@pytest.mark.parametrize('name', sorted(SCENARIOS))
+def test_transactions_budget(name):
+    transactions, _bytes, _elapsed = measure(name)
+    assert transactions <= SCENARIOS[name][1], '%s now costs %d HID transactions' % (name, transactions)
+
+# CPU and memory cost of the commands themselves : the former list/dict
+# based implementation versus MCP2200Device and its report codec, both on a
+# handle answering instantly. Both go through BaseDevice.transaction(), only
+# the encoding and decoding differ.
+
+# READ_ALL response
+RESPONSE = bytes([0x80]) + bytes(range(1, 16))
+CONFIG = {'IO_bmap':0x00, 'Config_Alt_Pins':0x00, 'IO_Default_Val_bmap':0x00, 'Config_Alt_Options':0x00, 'Baud_H':0x04, 'Baud_L':0xe1}
+
+class NullHandle():
+    def write(self, data, timeout=None):
+        return len(data)
+
+    def read(self, size, timeout=None):
+        return RESPONSE
+
+    def close(self):
+        pass
+
+def legacy_check_params(*params):
+    def func_decorator(func):
+        def func_wrapper(self, *args, **kwargs):
+            for p in params:
+                if not p in kwargs.keys():
+                    raise Exception('Missing parameter %s' % p)
+            return func(self, *args, **kwargs)
+        return func_wrapper
+    return func_decorator
+
+class LegacyDevice(BaseDevice):
+    @legacy_check_params('Set_bmap', 'Clear_bmap')
+    def set_clear_outputs(self, **kwargs):
+        data = [0]*16
+        data[0] = 0x08
+        data[11] = kwargs['Set_bmap']
+        data[12] = kwargs['Clear_bmap']
+        return self.transaction(data, False)
+
+    @legacy_check_params(*CONFIG_FIELDS)
+    def configure(self, **kwargs):
+        data = [0]*16
+        data[0] = 0x10
+        data[4] = kwargs['IO_bmap']
+        data[5] = kwargs['Config_Alt_Pins']
+        data[6] = kwargs['IO_Default_Val_bmap']
+        data[7] = kwargs['Config_Alt_Options']
+        data[8] = kwargs['Baud_H']
+        data[9] = kwargs['Baud_L']
+        return self.transaction(data, False)
+
+    def read_all(self, **kwargs):
+        data = [0]*16
+        data[0] = 0x80
+        ret = self.transaction(data)
+        return {key:ret[value] for (key, value) in {'EEP_Addr':1, 'EEP_Val':3, 'IO_bmap':4, 'Config_Alt_Pins':5, 'IO_Default_Val_bmap':6, 'Config_Alt_Options':7, 'Baud_H':8, 'Baud_L':9, 'IO_Port_Val_bmap':10}.items()}
+
+def null_device(cls):
+    device = cls()
+    device.handle = NullHandle()
+    return device
+
+def command_mix(device):
+    device.set_clear_outputs(Set_bmap=0x01, Clear_bmap=0x02)
+    device.configure(**CONFIG)
+    return device.read_all()
+
+def peak_memory(func, *args, rounds=1000):
+    ''' Peak of memory, in bytes, allocated during one of rounds calls '''
+    # Warm up, the interpreter's one-off allocations aren't the command's
+    for _ in range(rounds):
+        func(*args)
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in range(rounds):
+            func(*args)
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+def cpu_time(func, *args, rounds=20000):
+    ''' CPU time of one call in this thread, best of 5 runs of rounds calls '''
+    best = None
+    for _ in range(5):
+        start = time.thread_time()
+        for _ in range(rounds):
+            func(*args)
+        elapsed = (time.thread_time() - start) / rounds
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def test_codec_results():
+    assert command_mix(null_device(MCP2200Device)) == command_mix(null_device(LegacyDevice))
+
+@pytest.mark.benchmark
+def test_codec_memory():
+    assert peak_memory(command_mix, null_device(MCP2200Device)) < peak_memory(command_mix, null_device(LegacyDevice))
+    assert peak_memory(null_device(MCP2200Device).read_port) < peak_memory(null_device(LegacyDevice).read_all) / 4
+
+@pytest.mark.benchmark
+def test_codec_cpu_time():
+    assert cpu_time(command_mix, null_device(MCP2200Device)) < cpu_time(command_mix, null_device(LegacyDevice))
+
+# Transports : import time of their modules, in a fresh interpreter, and
+# READ_ALL round trip on the first device they find
+
+IMPORT_PROBE = 'import sys, time; start = time.perf_counter(); import %s; print(time.perf_counter() - start, "usb" in sys.modules)'
+IMPORTS = ('cdtx.mcp2200.api', 'cdtx.mcp2200.hidraw', 'cdtx.mcp2200.pyusb_backend')
+
+def import_cost(module):
+    ''' (seconds, whether pyusb got imported) '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    seconds, usb = subprocess.check_output([sys.executable, '-c', IMPORT_PROBE % module], env=env).split()
+    return float(seconds), usb == b'True'
+
+def transaction_latency(backend, rounds=100):
+    ''' Mean seconds of a READ_ALL on the first device of backend, None without device '''
+    devices = backend.find(MCP2200_VID, MCP2200_PID)
+    if not devices:
+        return None
+    device = MCP2200Device(devices[0], backend=backend)
+    device.open()
+    try:
+        device.read_all()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            device.read_all()
+        return (time.perf_counter() - start) / rounds
+    finally:
+        device.disconnect()
+
+def test_api_import_is_lazy():
+    assert not import_cost('cdtx.mcp2200.api')[1]
+    assert not import_cost('cdtx.mcp2200.hidraw')[1]
+
+def report(latency=0.0):
+    print('%-26s %12s %12s' % ('command mix', 'time (us)', 'peak (bytes)'))
+    for cls in (LegacyDevice, MCP2200Device):
+        device = null_device(cls)
+        print('%-26s %12.3f %12d' % (cls.__name__, cpu_time(command_mix, device)*1e6, peak_memory(command_mix, device)))
+    print()
+
+    print('%-26s %12s %8s %12s' % ('method', 'transactions', 'bytes', 'time (ms)'))
+    for name in sorted(SCENARIOS):
+        transactions, nbytes, elapsed = measure(name, latency)
+        print('%-26s %12d %8d %12.3f' % (name, transactions, nbytes, elapsed*1000))
+    print()
+
+    print('%-26s %12s %8s' % ('import', 'time (ms)', 'pyusb'))
+    for module in IMPORTS:
+        seconds, usb = import_cost(module)
+        print('%-26s %12.3f %8s' % (module, seconds*1000, 'yes' if usb else 'no'))
+    print()
+
+    print('%-26s %12s' % ('READ_ALL', 'time (us)'))
+    backends = [('sim', SimulatorBackend(latency=latency))]
+    for name in ('hidraw', 'pyusb'):
+        try:
+            backends.append((name, get_backend(name)))
+        except ImportError:
+            print('%-26s %12s' % (name, 'unavailable'))
+    for name, backend in backends:
+        try:
+            seconds = transaction_latency(backend)
+        except Exception as e:
+            print('%-26s %12s (%s)' % (name, 'failed', e))
+            continue
+        print('%-26s %12s' % (name, 'no device' if seconds is None else '%.1f' % (seconds*1e6)))
+
+
+if __name__ == '__main__':
+    report(float(sys.argv[1]) if len(sys.argv) > 1 else 0.0)
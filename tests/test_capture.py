@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import os
+from array import array
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.capture import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+def write_samples(path, values, step=1000):
+    with CaptureWriter(path, buffer_size=7) as writer:
+        for i, value in enumerate(values):
+            writer.append(i * step, value)
+    return path
+
+class TestCaptureWriter():
+    def test_npy(self, tmp_path):
+        path = str(tmp_path / 'capture')
+        with CaptureWriter(path) as writer:
+            writer.extend(array('Q', [10, 20, 30]), array('B', [1, 2, 3]))
+            writer.append(40, 4)
+            assert len(writer) == 4
+        assert list(np.load(os.path.join(path, TIMESTAMPS))) == [10, 20, 30, 40]
+        values = np.load(os.path.join(path, VALUES), mmap_mode='r')
+        assert values.dtype == np.uint8 and list(values) == [1, 2, 3, 4]
+        with pytest.raises(ValueError):
+            CaptureWriter(path).extend(array('Q', [1]), array('B'))
+
+    def test_append(self, tmp_path):
+        path = write_samples(str(tmp_path / 'capture'), range(10))
+        with CaptureWriter(path) as writer:
+            assert len(writer) == 10
+            writer.append(10000, 10)
+        assert list(Capture(path).values) == list(range(11))
+
+    def test_interrupted(self, tmp_path):
+        path = write_samples(str(tmp_path / 'capture'), range(10))
+        # Killed between the columns, and before the headers were written
+        with open(os.path.join(path, TIMESTAMPS), 'ab') as f:
+            f.write(bytes(8 * 2))
+        with open(os.path.join(path, VALUES), 'ab') as f:
+            f.write(bytes(3))
+        assert len(Capture(path)) == 12
+        with CaptureWriter(path) as writer:
+            assert len(writer) == 12
+        assert np.load(os.path.join(path, VALUES)).shape == (12,)
+
+    def test_not_a_capture(self, tmp_path):
+        path = tmp_path / 'capture'
+        path.mkdir()
+        (path / TIMESTAMPS).write_bytes(b'not a column')
+        with pytest.raises(ValueError):
+            CaptureWriter(str(path))
+
+class TestCapture():
+    def test_pins(self, tmp_path):
+        values = [0b00, 0b01, 0b01, 0b11, 0b10, 0b00, 0b01, 0b01]
+        path = write_samples(str(tmp_path / 'capture'), values)
+        # Chunks smaller than the capture, edges on their boundaries
+        capture = Capture(path, chunk=3)
+        assert len(capture) == 8
+        assert list(capture.pin(0, 0, 8)) == [0, 1, 1, 1, 0, 0, 1, 1]
+        assert list(capture.pin(1, 2, 5)) == [0, 1, 1]
+        assert [(first, list(levels)) for (first, levels) in capture.pin_chunks(0)] == [(0, [0, 1, 1]), (3, [1, 0, 0]), (6, [1, 1])]
+        assert list(capture.edges(0)) == [1, 4, 6]
+        assert list(capture.edges(0, rising=False)) == [4]
+        assert list(capture.edges(1, falling=False)) == [3]
+        assert list(capture.edges(0, start=2, stop=5)) == [4]
+        # Samples 1 us apart, the last one has no duration
+        assert capture.duty_cycle(0) == pytest.approx(4 / 7)
+        assert capture.duty_cycles()[1] == pytest.approx(2 / 7)
+        assert list(capture.duty_cycles()[2:]) == [0.0] * 6
+        assert capture.index(3000) == 3 and capture.index(3500) == 4
+        assert capture.duration == 7e-6
+        assert sum(len(values) for (_, _, values) in capture.chunks()) == 8
+
+    def test_large(self, tmp_path):
+        rng = np.random.default_rng(0)
+        values = rng.integers(0, 256, 10000, dtype=np.uint8)
+        timestamps = np.cumsum(rng.integers(1, 1000, 10000, dtype=np.uint64))
+        path = str(tmp_path / 'capture')
+        with CaptureWriter(path) as writer:
+            writer.extend(array('Q', timestamps.tobytes()), array('B', values.tobytes()))
+        capture = Capture(path, chunk=999)
+        for pin in range(8):
+            levels = (values >> pin) & 1
+            assert list(capture.edges(pin)) == list(np.flatnonzero(np.diff(levels.astype(int))) + 1)
+            high = np.diff(timestamps)[levels[:-1] == 1].sum()
+            assert capture.duty_cycle(pin) == pytest.approx(high / (timestamps[-1] - timestamps[0]))
+
+    def test_empty(self, tmp_path):
+        path = str(tmp_path / 'capture')
+        CaptureWriter(path).close()
+        capture = Capture(path)
+        assert len(capture) == 0
+        assert len(capture.edges(0)) == 0
+        assert list(capture.duty_cycles()) == [0.0] * 8
+        assert capture.duration == 0.0
+
+def test_capture(tmp_path):
+    device = MCP2200Device(backend=SimulatorBackend(), autoConnect=True)
+    device.handle.inputs = 0x0f
+    path = str(tmp_path / 'capture')
+    try:
+        stats = capture(device, path, duration=0.2, period=0.05)
+    finally:
+        device.disconnect()
+    result = Capture(path)
+    assert stats['samples'] == len(result) > 0
+    assert list(result.timestamps) == sorted(result.timestamps)
+    assert list(result.duty_cycles()) == [1.0] * 4 + [0.0] * 4
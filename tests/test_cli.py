@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import io
+import json
+import pytest
+
+from cdtx.mcp2200.cli import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+def run(capsys, backend, *argv):
+    ret = main(list(argv), backend)
+    return ret, capsys.readouterr().out
+
+class TestCLI():
+    def test_list(self, capsys):
+        ret, out = run(capsys, SimulatorBackend(count=2), '--json', 'list')
+        assert ret == 0
+        assert [device['serial'] for device in json.loads(out)] == ['0000000', '0000001']
+
+    def test_commands(self, capsys):
+        backend = SimulatorBackend(count=2)
+        sim = backend.simulators[1]
+        assert run(capsys, backend, '-s', '0000001', 'config', 'set', 'IO_bmap=0', 'baud_rate=115200', 'rx_led=on')[0] == 0
+        assert (sim.IO_bmap, sim.Baud_H, sim.Baud_L, sim.Config_Alt_Pins) == (0, 0, 103, 0x08)
+
+        assert run(capsys, backend, '-i', '1', 'pin', 'set', '0=1', '3=1', '0=0')[0] == 0
+        assert sim.port == 0x08
+        ret, out = run(capsys, backend, '-i', '1', '--json', 'pin', 'get', '0', '3')
+        assert json.loads(out) == {'0': 0, '3': 1}
+        ret, out = run(capsys, backend, '-p', '1-2', 'port', 'get')
+        assert out.strip() == '8'
+
+    def test_eeprom(self, capsys, tmp_path):
+        backend = SimulatorBackend()
+        image = tmp_path / 'eeprom.bin'
+        image.write_bytes(bytes(range(16)))
+        assert run(capsys, backend, 'eeprom', 'load', str(image))[1].strip() == '16'
+        ret, out = run(capsys, backend, 'eeprom', 'dump', '--length', '4')
+        assert out.strip() == '00010203'
+        assert run(capsys, backend, 'eeprom', 'read', '5')[1].strip() == '5'
+
+    def test_errors(self, capsys):
+        backend = SimulatorBackend()
+        assert main(['pin', 'set', '8=1'], backend) == 2
+        assert main(['bogus'], backend) == 2
+        assert main(['-i', '3', 'read-all'], backend) == 2
+        assert 'No such device' in capsys.readouterr().err
+
+    def test_batch(self):
+        backend = SimulatorBackend()
+        sim = backend.simulators[0]
+        api = open_api(build_parser().parse_args(['batch']), backend)
+        api.ConfigureIO(0x00)
+        sim.reset_stats()
+        script = io.StringIO('\n'.join([
+            'pin set 0=1',
+            'pin set 1=1',
+            'port set 0x80',
+            '# comment',
+            'pin set 0=1',
+            'port get',
+            'pin get 9',
+            'eeprom write 3 0x42',
+            'eeprom read 3',
+        ]))
+        out = io.StringIO()
+        assert run_batch(api, script, out) == 1
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [r['line'] for r in records] == [1, 2, 3, 5, 6, 7, 8, 9]
+        assert [r['ok'] for r in records] == [True]*5 + [False, True, True]
+        assert records[4]['result'] == 0x81
+        assert records[7]['result'] == 0x42
+        # The 4 output commands in a single SET_CLEAR_OUTPUTS
+        assert sim.reports_out == 4
+        api.device.disconnect()
+
+    def test_batch_stop_on_error(self):
+        api = open_api(build_parser().parse_args(['batch']), SimulatorBackend())
+        out = io.StringIO()
+        assert run_batch(api, io.StringIO('pin get 9\nport get\n'), out, stop_on_error=True) == 1
+        assert len(out.getvalue().splitlines()) == 1
+        api.device.disconnect()
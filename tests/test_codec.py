@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import pytest
+
+from cdtx.mcp2200.codec import *
+
+class TestReportCodec():
+    def test_requests(self):
+        codec = ReportCodec()
+        assert bytes(codec.set_clear_outputs(0x12, 0x34)) == bytes([0x08] + [0]*10 + [0x12, 0x34] + [0]*3)
+        assert bytes(codec.configure(1, 2, 3, 4, 5, 6)) == bytes([0x10, 0, 0, 0, 1, 2, 3, 4, 5, 6] + [0]*6)
+        assert bytes(codec.read_ee(0xab)) == bytes([0x20, 0xab] + [0]*14)
+        assert bytes(codec.write_ee(0xab, 0xcd)) == bytes([0x40, 0xab, 0xcd] + [0]*13)
+        assert codec.read_all() == bytes([0x80] + [0]*15)
+
+    def test_buffer_reused(self):
+        codec = ReportCodec()
+        first = codec.configure(0xff, 0xff, 0xff, 0xff, 0xff, 0xff)
+        second = codec.read_ee(1)
+        assert first is second
+        # Previous content is fully overwritten
+        assert bytes(second) == bytes([0x20, 0x01] + [0]*14)
+
+    def test_responses(self):
+        report = bytes(range(0x80, 0x90))
+        assert decode_read_ee(report) == (0x81, 0x83)
+        assert decode_read_all(report) == (0x81, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89, 0x8a)
+
+class TestConfig():
+    def test_dict(self):
+        status = MCP2200Status.from_report(bytes(range(16)))
+        assert status.as_dict() == {'EEP_Addr':1, 'EEP_Val':3, 'IO_bmap':4, 'Config_Alt_Pins':5,
+            'IO_Default_Val_bmap':6, 'Config_Alt_Options':7, 'Baud_H':8, 'Baud_L':9, 'IO_Port_Val_bmap':10}
+        config = status.config()
+        assert sorted(config.as_dict()) == sorted(CONFIG_FIELDS)
+        assert MCP2200Config.from_dict(status.as_dict()) == config
+        assert status.pin(1) == 1 and status.pin(0) == 0
+
+    def test_bits(self):
+        config = MCP2200Config(Config_Alt_Pins=0x00, Config_Alt_Options=0x00)
+        config.rx_led = True
+        config.suspend = True
+        config.hardware_flow_control = True
+        config.blink_slow = True
+        assert (config.Config_Alt_Pins, config.Config_Alt_Options) == (0x88, 0x21)
+        assert config.rx_led and not config.tx_led
+        config.rx_led = False
+        assert config.Config_Alt_Pins == 0x80
+
+    def test_baud_rate(self):
+        config = MCP2200Config()
+        assert config.baud_rate == 9600
+        config.baud_rate = 115200
+        assert config.baud_divisor == 12000000 // 115200 - 1
+        copy = config.copy()
+        assert copy == config and copy is not config
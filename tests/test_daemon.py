@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import os
+import stat
+import threading
+import pytest
+
+from cdtx.mcp2200 import errors
+from cdtx.mcp2200.api import SimpleIOClass
+from cdtx.mcp2200.device import MCP2200Device
+from cdtx.mcp2200.daemon import *
+from cdtx.mcp2200.daemon import main as daemon_main
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+@pytest.fixture
+def daemon(tmp_path):
+    sim_backend = SimulatorBackend(count=2)
+    daemon = MCP2200Daemon(str(tmp_path / 'mcp2200.sock'), sim_backend).start()
+    yield daemon
+    daemon.close()
+
+def simulators(daemon):
+    return daemon.backend.simulators
+
+class TestDaemon():
+    def test_list(self, daemon):
+        backend = DaemonBackend(daemon.path)
+        devices = backend.find(0x04d8, 0x00df)
+        assert [(backend.path(dev), backend.serial(dev)) for dev in devices] == [('1-1', '0000000'), ('1-2', '0000001')]
+        assert backend.find(0x1234, 0x5678) == []
+
+    def test_device(self, daemon):
+        dev = MCP2200Device(backend=DaemonBackend(daemon.path), autoConnect=True)
+        assert dev.modify_config(lambda config: config.update(IO_bmap=0x00))
+        assert dev.set_clear_outputs(Set_bmap=0x05, Clear_bmap=0)
+        assert dev.read_port() == 0x05
+        assert dev.write_ee(7, 0x42)
+        assert dev.read_ee(7)['EEP_Val'] == 0x42
+        assert simulators(daemon)[0].eeprom[7] == 0x42
+        dev.disconnect()
+
+    def test_shared(self, daemon):
+        ''' Two clients on the same board, while the daemon keeps it claimed '''
+        first = SimpleIOClass(DaemonBackend(daemon.path))
+        first.InitMCP2200(0x04d8, 0x00df)
+        assert first.select(serial='0000001') == 0
+        second = MCP2200Device(backend=DaemonBackend(daemon.path))
+        second.connect(deviceId=1)
+        first.ConfigureIO(0x00)
+        first.SetPin(3)
+        assert second.read_port() == 0x08
+        first.device.disconnect()
+        second.disconnect()
+        assert simulators(daemon)[1].claimed
+
+    def test_shared_config(self, daemon):
+        ''' A client's configuration change isn't undone by another's stale shadow '''
+        first = MCP2200Device(backend=DaemonBackend(daemon.path), autoConnect=True)
+        second = MCP2200Device(backend=DaemonBackend(daemon.path), autoConnect=True)
+        first.read_config()
+        assert second.modify_config(lambda config: config.update(Baud_H=0, Baud_L=103))
+        assert first.modify_config(lambda config: config.update(IO_Default_Val_bmap=0x5a))
+        config = second.read_config()
+        assert (config['Baud_L'], config['IO_Default_Val_bmap']) == (103, 0x5a)
+        first.disconnect()
+        second.disconnect()
+
+    def test_threads(self, daemon):
+        devices = [MCP2200Device(backend=DaemonBackend(daemon.path), autoConnect=True) for _ in range(4)]
+        def run(dev, addr):
+            for value in range(20):
+                assert dev.write_ee(addr, value)
+                assert dev.read_ee(addr)['EEP_Val'] == value
+        threads = [threading.Thread(target=run, args=(dev, addr)) for addr, dev in enumerate(devices)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert simulators(daemon)[0].eeprom[:4] == bytes([19]*4)
+        for dev in devices:
+            dev.disconnect()
+
+    def test_errors(self, daemon):
+        dev = MCP2200Device(backend=DaemonBackend(daemon.path), autoConnect=True)
+        sim = simulators(daemon)[0]
+        # Lost once : the client retries
+        sim.drop_responses = 1
+        assert dev.read_all()
+        sim.drop_responses = 10
+        with pytest.raises(errors.MCP2200TimeoutError):
+            dev.read_all()
+        sim.drop_responses = 0
+        assert dev.read_all()
+        daemon.backend.unplug(sim)
+        with pytest.raises(errors.MCP2200DisconnectedError):
+            dev.read_all()
+        dev.disconnect()
+
+    def test_no_daemon(self, tmp_path):
+        with pytest.raises(errors.MCP2200Error):
+            DaemonBackend(str(tmp_path / 'none.sock')).find(0x04d8, 0x00df)
+
+    def test_stale_socket(self, tmp_path):
+        path = str(tmp_path / 'mcp2200.sock')
+        daemon = MCP2200Daemon(path, SimulatorBackend()).start()
+        with pytest.raises(errors.MCP2200Error):
+            MCP2200Daemon(path, SimulatorBackend())
+        daemon.close()
+
+    def test_socket_mode(self, daemon):
+        assert stat.S_IMODE(os.stat(daemon.path).st_mode) == SOCKET_MODE
+
+    def test_not_a_socket(self, tmp_path):
+        path = tmp_path / 'mcp2200.sock'
+        path.write_text('keep me')
+        with pytest.raises(errors.MCP2200Error):
+            MCP2200Daemon(str(path), SimulatorBackend())
+        assert path.read_text() == 'keep me'
+
+    def test_default_socket(self):
+        assert default_socket({'XDG_RUNTIME_DIR': '/run/user/1000'}, 1000) == '/run/user/1000/mcp2200.sock'
+        assert default_socket({}, 0) == '/run/mcp2200.sock'
+        path = default_socket({}, 1000)
+        assert os.path.basename(path) == 'mcp2200-1000.sock'
+        assert os.path.dirname(path) != '/run'
+
+    def test_daemon_main(self, tmp_path, capsys):
+        with pytest.raises(SystemExit) as e:
+            daemon_main(['--backend', 'sim', '--socket', str(tmp_path / 'missing' / 'mcp2200.sock')])
+        assert e.value.code == 1
+        assert '--socket' in capsys.readouterr().err
+
+    def test_cli(self, daemon, capsys):
+        from cdtx.mcp2200.cli import main
+        assert main(['--backend', 'daemon', '--socket', daemon.path, '-s', '0000001', 'eeprom', 'write', '1', '0x33']) == 0
+        assert simulators(daemon)[1].eeprom[1] == 0x33
@@ -1,20 +1,166 @@
 #!/usr/bin/env python3
+import threading
 import pytest
 
 from cdtx.mcp2200.device import *
 
 class TestBaseDevice():
-    def test_discover(self):
-        self.devices = BaseDevice.discover()
+    def test_discover(self, backend):
+        self.devices = BaseDevice.discover(backend=backend)
         assert(isinstance(self.devices, list))
         assert(self.devices)
 
-    def test_connect_disconnect(self):
-        dev = BaseDevice()
+    def test_connect_disconnect(self, backend):
+        dev = BaseDevice(backend=backend)
         assert(dev.connect(MCP2200_VID, MCP2200_PID, 0))
         assert(dev.disconnect())
         assert(dev.connect())
         assert(dev.disconnect())
 
 
+class TestConfigCache():
+    def test_read_config(self, api):
+        dev = api.device
+        dev.invalidate_config()
+        assert dev.config_age() is None
 
+        config = dev.read_config()
+        assert sorted(config.keys()) == sorted(CONFIG_FIELDS)
+        assert dev.config_age() is not None
+        assert config == {k:v for (k,v) in dev.read_all().items() if k in CONFIG_FIELDS}
+
+    def test_configure_updates_cache(self, api):
+        dev = api.device
+        config = dev.read_config()
+        config['IO_bmap'] = 0x5a
+        assert dev.configure(**config)
+        assert dev.read_config()['IO_bmap'] == 0x5a
+        assert dev.read_config(max_age=0)['IO_bmap'] == 0x5a
+
+    def test_max_age(self, api):
+        dev = api.device
+        dev.read_config()
+        age = dev.config_age()
+        dev.read_config(max_age=0)
+        assert dev.config_age() <= age
+
+
+class TimeoutRecorder():
+    ''' Handle wrapper keeping the timeout of each read '''
+    def __init__(self, handle):
+        self.handle = handle
+        self.timeouts = []
+
+    def write(self, data, timeout=None):
+        return self.handle.write(data, timeout)
+
+    def read(self, size, timeout=None):
+        self.timeouts.append(timeout)
+        return self.handle.read(size, timeout)
+
+    def close(self):
+        self.handle.close()
+
+class TestTransaction():
+    def setup_method(self):
+        from cdtx.mcp2200.simulator import SimulatorBackend
+        self.backend = SimulatorBackend()
+        self.sim = self.backend.simulators[0]
+        self.sim.eeprom[:4] = b'\x01\x02\x03\x04'
+        self.dev = MCP2200Device(backend=self.backend, autoConnect=True, retry=RetryPolicy(backoff=0))
+
+    def teardown_method(self):
+        self.dev.disconnect()
+
+    def test_timeouts(self):
+        self.dev.timeout = 0.5
+        self.dev.handle = recorder = TimeoutRecorder(self.dev.handle)
+        self.dev.read_all()
+        self.dev.read_all(timeout=0.1)
+        assert recorder.timeouts == [0.5, 0.1]
+
+    def test_lost_response(self):
+        self.sim.drop_responses = 1
+        assert self.dev.read_ee(2)['EEP_Val'] == 0x03
+        assert self.sim.reports_out == 2
+
+    def test_retries_exhausted(self):
+        self.sim.drop_responses = 3
+        with pytest.raises(MCP2200TimeoutError):
+            self.dev.read_all()
+        self.sim.drop_responses = 1
+        with pytest.raises(MCP2200TimeoutError):
+            self.dev.transaction(READ_ALL_REQUEST, retry=NO_RETRY)
+
+    def test_late_response(self):
+        # The late READ_EE(0) response arrives once READ_EE(1) was sent again
+        self.sim.late_responses = 1
+        assert self.dev.read_ee(0)['EEP_Val'] == 0x01
+        assert self.dev.read_ee(1)['EEP_Val'] == 0x02
+        assert self.dev.read_all()['IO_Port_Val_bmap'] == self.sim.port
+        assert not self.sim.responses
+
+    def test_stale_reports_dropped(self):
+        self.sim.respond(READ_EE, {1:0x33})
+        self.sim.respond(WRITE_EE, {})
+        assert self.dev.read_ee(3)['EEP_Val'] == 0x04
+
+    def test_no_response(self):
+        for _ in range(MAX_STALE_REPORTS + 1):
+            self.sim.respond(READ_EE, {1:0x33})
+        with pytest.raises(MCP2200ResponseError):
+            self.dev.read_all()
+        assert self.dev.read_all()['IO_Port_Val_bmap'] == self.sim.port
+
+    def test_ee_range_resync(self):
+        self.sim.drop_responses = 1
+        self.sim.late_responses = 1
+        assert self.dev.read_ee_range(0, 4, window=4) == b'\x01\x02\x03\x04'
+        assert self.dev.read_ee_range(0, 4, window=1) == b'\x01\x02\x03\x04'
+
+    def test_disconnected(self):
+        self.dev.mark_dead()
+        with pytest.raises(MCP2200DisconnectedError):
+            self.dev.read_all()
+
+
+class TestThreads():
+    def test_concurrent_transactions(self):
+        from cdtx.mcp2200.simulator import SimulatorBackend
+        backend = SimulatorBackend(latency=0.0002)
+        backend.simulators[0].eeprom[:] = bytes(range(256))
+        dev = MCP2200Device(backend=backend, autoConnect=True)
+        errors = []
+
+        def worker(base):
+            for addr in range(base, base + 16):
+                if dev.read_ee(addr)['EEP_Val'] != addr:
+                    errors.append(addr)
+                dev.read_port()
+
+        threads = [threading.Thread(target=worker, args=(16*i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        dev.disconnect()
+        assert errors == []
+
+    def test_modify_config(self):
+        from cdtx.mcp2200.simulator import SimulatorBackend
+        backend = SimulatorBackend(latency=0.0002)
+        dev = MCP2200Device(backend=backend, autoConnect=True, config_max_age=0)
+
+        def worker(bit):
+            def modifier(config):
+                config['IO_Default_Val_bmap'] |= 1 << bit
+            dev.modify_config(modifier)
+
+        threads = [threading.Thread(target=worker, args=(bit,)) for bit in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert backend.simulators[0].IO_Default_Val_bmap == 0xff
+        assert dev.modify_config(lambda config: None)
+        dev.disconnect()
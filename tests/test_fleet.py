@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import time
+import pytest
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.fleet import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+class TestFleet():
+    def test_read_all(self):
+        with MCP2200Fleet(backend=SimulatorBackend(count=4)) as fleet:
+            assert len(fleet) == 4
+            results = fleet.read_all()
+            assert [r.index for r in results] == [0, 1, 2, 3]
+            assert all(r.ok for r in results)
+            assert all(r.value['IO_bmap'] == 0xff for r in results)
+
+    def test_subset(self):
+        backend = SimulatorBackend(count=4)
+        with MCP2200Fleet(backend=backend) as fleet:
+            config = fleet.devices[0].read_config()
+            config['IO_bmap'] = 0x00
+            results = fleet.configure(devices=[1, fleet.devices[3]], **config)
+            assert [r.index for r in results] == [1, 3]
+            fleet.set_clear_outputs(0x0f, 0x00, devices=[1, 3])
+        assert [sim.port for sim in backend.simulators] == [0xff, 0x0f, 0xff, 0x0f]
+
+    def test_eeprom(self):
+        backend = SimulatorBackend(count=3)
+        with MCP2200Fleet(backend=backend) as fleet:
+            assert [r.value for r in fleet.write_ee_range(0x10, b'abc')] == [3, 3, 3]
+            assert [r.value for r in fleet.write_ee_range(0x10, b'abd')] == [1, 1, 1]
+            assert all(r.value == b'abd' for r in fleet.read_ee_range(0x10, 3))
+
+    def test_errors(self):
+        with MCP2200Fleet(backend=SimulatorBackend(count=2)) as fleet:
+            def fail_on_first(device):
+                if device is fleet.devices[0]:
+                    raise IOError('broken')
+                return 42
+            first, second = fleet.run(fail_on_first)
+            assert not first.ok
+            assert isinstance(first.error, IOError)
+            assert second.ok and second.value == 42
+
+    def test_open_errors(self):
+        backend = SimulatorBackend(count=2)
+        backend.simulators[0].claimed = True
+        fleet = MCP2200Fleet(backend=backend)
+        assert [r.index for r in fleet.open_errors] == [0]
+        assert isinstance(fleet.open_errors[0].error, IOError)
+        assert [r.ok for r in fleet.read_all()] == [False, True]
+        fleet.close()
+        fleet.close()
+
+        for sim in backend.simulators:
+            sim.claimed = True
+        with pytest.raises(MCP2200Error):
+            MCP2200Fleet(backend=backend)
+
+    def test_concurrency(self):
+        latency = 0.02
+        with MCP2200Fleet(backend=SimulatorBackend(count=8, latency=latency), max_workers=8) as fleet:
+            start = time.monotonic()
+            fleet.read_all()
+            elapsed = time.monotonic() - start
+        # Sequentially : 8 devices * 2 reports * latency
+        assert elapsed < 8 * 2 * latency / 2
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import os
+import socket
+import threading
+import pytest
+
+from cdtx.mcp2200 import errors, hidraw
+from cdtx.mcp2200.device import MCP2200Device, AutoBackend, MCP2200_VID, MCP2200_PID
+from cdtx.mcp2200.hidraw import *
+from cdtx.mcp2200.simulator import MCP2200Simulator
+
+def add_node(root, name, interface, vid=MCP2200_VID, pid=MCP2200_PID, uniq='', serial=None):
+    ''' A hidraw node of a fake sysfs, for the USB interface named interface '''
+    usb = root / 'devices' / 'usb1' / interface.split(':')[0]
+    hid = usb / interface / ('0003:%04X:%04X.0001' % (vid, pid))
+    hid.mkdir(parents=True)
+    (hid / 'uevent').write_text('HID_ID=0003:%08X:%08X\nHID_NAME=MCP2200\nHID_UNIQ=%s\n' % (vid, pid, uniq))
+    if serial is not None:
+        (usb / 'serial').write_text(serial + '\n')
+    node = root / 'class' / 'hidraw' / name
+    node.mkdir(parents=True)
+    (node / 'device').symlink_to(hid)
+
+@pytest.fixture
+def sysfs(tmp_path):
+    add_node(tmp_path, 'hidraw10', '1-2:1.2', serial='0001234')
+    add_node(tmp_path, 'hidraw2', '3-1.4:1.2', uniq='0005678')
+    add_node(tmp_path, 'hidraw3', '1-5:1.0', vid=0x046d, pid=0xc077)
+    # Another interface than the HID one of the MCP2200
+    add_node(tmp_path, 'hidraw4', '1-6:1.1')
+    return str(tmp_path / 'class' / 'hidraw')
+
+class SimulatedNode():
+    ''' The kernel side of a hidraw node, answered by an MCP2200Simulator '''
+    def __init__(self):
+        self.sim = MCP2200Simulator()
+        self.kernel, self.user = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.writes = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            data = self.kernel.recv(64)
+            if not data:
+                return
+            self.writes.append(data)
+            self.sim.write(data[1:])
+            while self.sim.responses:
+                self.kernel.send(bytes(self.sim.responses.popleft()))
+
+    def handle(self):
+        handle = HidrawHandle.__new__(HidrawHandle)
+        handle.node = '/dev/hidraw-test'
+        handle.fd = self.user.detach()
+        return handle
+
+    def close(self):
+        self.kernel.shutdown(socket.SHUT_RDWR)
+        self.thread.join()
+        self.kernel.close()
+
+class TestHidraw():
+    def test_find(self, sysfs):
+        backend = HidrawBackend(sysfs, '/dev')
+        devices = backend.find(MCP2200_VID, MCP2200_PID)
+        assert [dev.node for dev in devices] == ['/dev/hidraw2', '/dev/hidraw10']
+        assert [backend.path(dev) for dev in devices] == ['3-1.4', '1-2']
+        assert [backend.serial(dev) for dev in devices] == ['0005678', '0001234']
+        assert [dev.node for dev in backend.find(0x046d, 0xc077)] == []
+        assert HidrawBackend(sysfs + '-none').find(MCP2200_VID, MCP2200_PID) == []
+        assert 'hidraw2' in backend.listing() and 'hidraw10' in backend.listing()
+        assert HidrawBackend(sysfs + '-none').listing() == ()
+
+    def test_device(self):
+        node = SimulatedNode()
+        dev = MCP2200Device()
+        dev.handle = node.handle()
+        assert dev.set_clear_outputs(Set_bmap=0x01, Clear_bmap=0x00)
+        assert dev.write_ee(3, 0x42)
+        assert dev.read_ee(3)['EEP_Val'] == 0x42
+        assert dev.read_port() & 0x01
+        # Report ID 0 in front of each report
+        assert all(len(data) == 17 and data[0] == 0 for data in node.writes)
+        with pytest.raises(errors.MCP2200TimeoutError):
+            dev.handle.read(16, 0.01)
+        node.close()
+        with pytest.raises(errors.MCP2200DisconnectedError):
+            dev.handle.read(16, 0.01)
+        with pytest.raises(errors.MCP2200Error):
+            dev.handle.write(bytes(16))
+        dev.handle.close()
+
+    def test_open_errors(self, tmp_path):
+        with pytest.raises(errors.MCP2200DisconnectedError):
+            HidrawHandle(str(tmp_path / 'hidraw0'))
+
+    def test_auto_backend(self, sysfs, monkeypatch):
+        monkeypatch.setattr(hidraw, 'SYSFS_HIDRAW', sysfs)
+        monkeypatch.delenv('MCP2200_BACKEND', raising=False)
+        backend = AutoBackend(candidates=('hidraw', 'pyusb'))
+        devices = backend.find(MCP2200_VID, MCP2200_PID)
+        assert backend.name == 'hidraw'
+        assert backend.path(devices[0]) == '3-1.4'
+
+        monkeypatch.setenv('MCP2200_BACKEND', 'nothing')
+        with pytest.raises(ValueError):
+            AutoBackend().find(MCP2200_VID, MCP2200_PID)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import time
+import pytest
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.api import SimpleIOClass
+from cdtx.mcp2200.registry import DeviceRegistry
+from cdtx.mcp2200.hotplug import *
+from cdtx.mcp2200.simulator import SimulatorBackend, MCP2200Simulator
+
+class TestHotplugMonitor():
+    def test_poll(self):
+        backend = SimulatorBackend(count=2)
+        registry = DeviceRegistry(backend=backend)
+        monitor = HotplugMonitor(registry)
+        assert not monitor.event_driven
+        events = []
+        monitor.subscribe(lambda event, entry: events.append((event, entry.path)))
+
+        assert monitor.poll() == ([], [])
+        new = MCP2200Simulator(address=10)
+        backend.plug(new)
+        monitor.poll()
+        assert events == [(ARRIVED, '1-10')]
+        assert len(registry) == 3
+
+        backend.unplug(backend.simulators[0])
+        monitor.poll()
+        assert events[-1] == (LEFT, '1-1')
+        assert [entry.path for entry in registry] == ['1-2', '1-10']
+
+    def test_single_enumeration(self):
+        backend = SimulatorBackend(count=1)
+        registry = DeviceRegistry(backend=backend)
+        monitor = HotplugMonitor(registry)
+        finds = []
+        find = backend.find
+        backend.find = lambda vid, pid: finds.append(vid) or find(vid, pid)
+        monitor.poll()
+        # Nothing changed in the backend's listing, the bus isn't enumerated
+        monitor.poll()
+        monitor.poll()
+        assert len(finds) == 1
+        backend.plug(MCP2200Simulator(address=10))
+        monitor.poll()
+        monitor.poll()
+        assert len(finds) == 2
+        assert len(registry) == 2
+
+    def test_device_event(self):
+        backend = SimulatorBackend(count=2)
+        registry = DeviceRegistry(backend=backend)
+        monitor = HotplugMonitor(registry)
+        first = registry.connect(index=0)
+        monitor.watch(first)
+        events = []
+        monitor.subscribe(lambda event, entry: events.append((event, entry.path)))
+        finds = []
+        find = backend.find
+        backend.find = lambda vid, pid: finds.append(vid) or find(vid, pid)
+
+        backend.unplug(backend.simulators[0])
+        monitor.device_event(True, '1-1')
+        # A device that left isn't looked for
+        assert finds == []
+        assert not first.alive
+        backend.plug(MCP2200Simulator(address=10))
+        monitor.device_event(False, '1-10')
+        assert events == [(LEFT, '1-1'), (ARRIVED, '1-10')]
+        assert [entry.path for entry in registry] == ['1-2', '1-10']
+        assert monitor.device_event(False, '1-10') == ([], [])
+
+    def test_libusb_restart(self, monkeypatch):
+        class Context():
+            def __init__(self):
+                self.callbacks = []
+                self.closed = False
+            def hotplugRegisterCallback(self, callback, **kwargs):
+                self.callbacks.append(callback)
+                return len(self.callbacks)
+            def hotplugDeregisterCallback(self, handle):
+                self.callbacks[handle - 1] = None
+            def close(self):
+                self.closed = True
+        contexts = []
+        monkeypatch.setattr('cdtx.mcp2200.hotplug._libusb_hotplug_context', lambda: contexts.append(Context()) or contexts[-1])
+        registry = DeviceRegistry(backend=SimulatorBackend())
+        registry.backend.name = 'pyusb'
+        monitor = HotplugMonitor(registry)
+        assert monitor.event_driven
+        monitor._run_events = monitor._stop.wait
+        for _ in range(2):
+            monitor.start()
+            monitor.stop()
+        assert len(contexts) == 2
+        assert all(context.closed and context.callbacks == [None] for context in contexts)
+
+    def test_dead_device(self):
+        backend = SimulatorBackend(count=2)
+        registry = DeviceRegistry(backend=backend)
+        monitor = HotplugMonitor(registry)
+        first = registry.connect(index=0)
+        second = registry.connect(index=1)
+        monitor.watch(first)
+        monitor.watch(second)
+
+        backend.unplug(backend.simulators[0])
+        monitor.poll()
+        assert not first.alive
+        assert second.alive
+        with pytest.raises(IOError):
+            first.read_all()
+        assert first.disconnect()
+        second.read_all()
+
+    def test_weak_watch(self):
+        registry = DeviceRegistry(backend=SimulatorBackend())
+        monitor = HotplugMonitor(registry)
+        monitor.watch(registry.connect(index=0))
+        assert len(monitor._watched) == 0
+
+    def test_thread(self):
+        backend = SimulatorBackend()
+        api = SimpleIOClass(backend)
+        api.InitMCP2200(MCP2200_VID, MCP2200_PID)
+        api.SelectDevice(0)
+        monitor = api.start_hotplug(interval=0.01)
+        events = []
+        monitor.subscribe(lambda event, entry: events.append(event))
+        try:
+            backend.plug(MCP2200Simulator(address=2))
+            backend.unplug(backend.simulators[0])
+            deadline = time.monotonic() + 2
+            while len(events) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            api.stop_hotplug()
+        assert sorted(events) == [ARRIVED, LEFT]
+        assert api.GetNoOfDevices() == 1
+        assert not api.IsConnected()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import time
+import threading
+import pytest
+
+from cdtx.mcp2200.lock import FairLock
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+class TestFairLock():
+    def test_reentrant(self):
+        lock = FairLock()
+        with lock:
+            with lock:
+                assert lock.owned()
+            assert lock.owned()
+        assert not lock.owned()
+
+    def test_owner(self):
+        lock = FairLock()
+        owned = []
+        with lock:
+            thread = threading.Thread(target=lambda: owned.append(lock.owned()))
+            thread.start()
+            thread.join()
+        assert owned == [False]
+        with pytest.raises(RuntimeError):
+            lock.release()
+
+    def test_fifo(self):
+        lock = FairLock()
+        order = []
+
+        def worker(i):
+            with lock:
+                order.append(i)
+
+        threads = []
+        with lock:
+            for i in range(5):
+                thread = threading.Thread(target=worker, args=(i,))
+                thread.start()
+                threads.append(thread)
+                wait_for(lambda: len(lock._waiters) == i + 1)
+        for thread in threads:
+            thread.join()
+        assert order == list(range(5))
+
+    def test_no_barging(self):
+        ''' Releasing and taking the lock again goes behind the waiting thread '''
+        lock = FairLock()
+        order = []
+
+        def worker():
+            with lock:
+                order.append('worker')
+
+        lock.acquire()
+        thread = threading.Thread(target=worker)
+        thread.start()
+        wait_for(lambda: lock._waiters)
+        lock.release()
+        with lock:
+            order.append('main')
+        thread.join()
+        assert order == ['worker', 'main']
+
+    def test_timeout(self):
+        lock = FairLock()
+        lock.acquire()
+        result = []
+        thread = threading.Thread(target=lambda: result.append(lock.acquire(timeout=0.01)))
+        thread.start()
+        thread.join()
+        assert result == [False]
+        assert not lock._waiters
+        lock.release()
+        thread = threading.Thread(target=lambda: result.append(lock.acquire(blocking=False)))
+        thread.start()
+        thread.join()
+        assert result == [False, True]
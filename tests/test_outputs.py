@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import time
+import threading
+import pytest
+
+from cdtx.mcp2200.errors import MCP2200Error
+from cdtx.mcp2200.outputs import *
+
+@pytest.fixture
+def device(make_device):
+    return make_device(outputs=True)
+
+class TestOutputCombiner():
+    def test_immediate(self, device):
+        combiner = OutputCombiner(device)
+        combiner.set_clear(0x01, 0x00)
+        combiner.set_clear(0x02, 0x00)
+        assert device.handle.reports_out == 2
+        assert device.handle.port == 0x03
+
+    def test_batch(self, device):
+        combiner = OutputCombiner(device)
+        with combiner.batch():
+            combiner.set_clear(0x0f, 0x00)
+            with combiner.batch():
+                combiner.set_clear(0x00, 0x03)
+                combiner.set_clear(0x01, 0x00)
+            assert combiner.pending
+            assert device.handle.reports_out == 0
+        assert not combiner.pending
+        assert device.handle.reports_out == 1
+        assert device.handle.port == 0x0d
+        assert (combiner.changes, combiner.reports) == (3, 1)
+
+    def test_last_write_wins(self, device):
+        combiner = OutputCombiner(device)
+        combiner.begin()
+        combiner.set_clear(0xff, 0x00)
+        combiner.set_clear(0x00, 0xf0)
+        combiner.set_clear(0x10, 0x01)
+        assert combiner.held() == (0x1e, 0xe1)
+        combiner.end()
+        assert device.handle.port == 0x1e
+        with pytest.raises(MCP2200Error):
+            combiner.end()
+
+    def test_threads(self, device):
+        ''' A batch only holds the changes of its own thread '''
+        combiner = OutputCombiner(device)
+        with combiner.batch():
+            combiner.set_clear(0x01, 0x00)
+            depths = []
+            other = threading.Thread(target=lambda: (combiner.set_clear(0x80, 0x00), depths.append(combiner.depth)))
+            other.start()
+            other.join()
+            assert depths == [0]
+            assert combiner.depth == 1
+            assert device.handle.port == 0x80
+        assert device.handle.port == 0x81
+        assert combiner.depth == 0
+
+    def test_window(self, device):
+        combiner = OutputCombiner(device, window=0.02)
+        for pin in range(8):
+            combiner.set_clear(1 << pin, 0)
+        assert device.handle.reports_out == 0
+        deadline = time.monotonic() + 2.0
+        while combiner.pending and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert device.handle.reports_out == 1
+        assert device.handle.port == 0xff
+
+    def test_flush_discard(self, device):
+        combiner = OutputCombiner(device, window=10.0)
+        assert combiner.flush()
+        combiner.set_clear(0x01, 0x00)
+        combiner.discard()
+        assert combiner.flush()
+        combiner.set_clear(0x02, 0x00)
+        assert combiner.flush()
+        assert device.handle.reports_out == 1
+        assert device.handle.port == 0x02
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import time
+import pytest
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.pattern import *
+
+class RecordingDevice(MCP2200Device):
+    ''' Keeps the time before each report (perf_counter_ns) and the port value after it '''
+    def __init__(self, *args, **kwargs):
+        super(RecordingDevice, self).__init__(*args, **kwargs)
+        self.history = []
+
+    def write(self, data, timeout=None):
+        start = time.perf_counter_ns()
+        ret = super(RecordingDevice, self).write(data, timeout)
+        self.history.append((start, self.handle.port))
+        return ret
+
+@pytest.fixture
+def device(make_device):
+    dev = make_device(RecordingDevice, outputs=True)
+    dev.history = []
+    return dev
+
+class TestPatternPlayer():
+    def test_pack(self):
+        steps = [(0.0, 0x01, 0x00), (0.0015, 0x00, 0x01), (1.0, 0xff, 0x00)]
+        data = pack_steps(steps)
+        assert len(data) == 3 * STEP_FORMAT.size
+        assert unpack_steps(data) == steps
+
+    def test_port_steps(self):
+        assert port_steps([0x0f, 0xf0], 0.1) == [(0.0, 0x0f, 0xf0), (0.1, 0xf0, 0x0f)]
+
+    def test_play(self, device):
+        player = PatternPlayer(device, port_steps([0x01, 0x02, 0x04, 0x08], 0.005))
+        device.read_port()
+        device.history = []
+        player.play()
+        # The port snapshot is out of date
+        assert device.port_age() is None
+        assert [port for (_t, port) in device.history] == [0x01, 0x02, 0x04, 0x08]
+        times = [t for (t, _port) in device.history]
+        timing = player.timing()
+        # No step is sent before its deadline
+        assert all(t >= player.start_ns + offset for (t, offset) in zip(times, player.offsets))
+        assert times[-1] - player.start_ns >= 0.015e9
+        assert timing['steps'] == 4
+        assert timing['loops'] == 1
+        assert 0 <= timing['mean_error'] <= timing['max_error']
+        assert all(error >= 0 for error in player.step_errors)
+
+    def test_compact(self, device):
+        player = PatternPlayer(device, pack_steps([(0, 0xaa, 0x55)]), loops=3, period=0.001)
+        player.start()
+        assert player.wait(1)
+        assert [port for (_t, port) in device.history] == [0xaa]*3
+
+    def test_loop_period(self, device):
+        player = PatternPlayer(device, port_steps([0x01, 0x02], 0.01), loops=2)
+        assert player.period_ns == 0.02e9
+        player.play()
+        assert [port for (_t, port) in device.history] == [0x01, 0x02, 0x01, 0x02]
+        times = [t for (t, _port) in device.history]
+        # The last step is held for the period too before the pattern starts
+        # again : from its deadline to the next report
+        assert times[2] - (player.start_ns + player.offsets[1]) >= 0.01e9
+        assert times[2] - player.start_ns >= 0.02e9
+
+    def test_abort(self, device):
+        player = PatternPlayer(device, [(0.001, 0x01, 0x00), (0.001, 0x00, 0x01)], loops=0)
+        player.start()
+        time.sleep(0.02)
+        assert player.running
+        with pytest.raises(MCP2200Error):
+            player.start()
+        player.abort()
+        assert not player.running
+        assert player.loops_done > 1
+
+    def test_invalid(self, device):
+        with pytest.raises(ValueError):
+            PatternPlayer(device, [])
+        with pytest.raises(ValueError):
+            PatternPlayer(device, [(-1, 0, 0)])
+        with pytest.raises(ValueError):
+            PatternPlayer(device, [(0, 0x01, 0x00)], loops=0)
+        with pytest.raises(ValueError):
+            PatternPlayer(device, port_steps([0x01, 0x02], 0.01), period=0.005)
+        assert PatternPlayer(device, [(0, 0x01, 0x00)]).period_ns == 0
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import json
+import pytest
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.fleet import MCP2200Fleet
+from cdtx.mcp2200.profile import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+def reference_profile():
+    config = MCP2200Config()
+    config.IO_bmap = 0x0f
+    config.rx_led = True
+    config.baud_rate = 115200
+    return MCP2200Profile(config, bytes(range(256)))
+
+class TestProfile():
+    def test_capture_apply(self, device):
+        sim = device.handle
+        profile = reference_profile()
+        # The blank EEPROM already holds 0xff at 255
+        assert profile.apply(device) == {'configured': True, 'eeprom_written': 255}
+        assert MCP2200Profile.capture(device) == profile
+        assert sim.IO_bmap == 0x0f
+
+        # Only the differences are written
+        sim.eeprom[10] = 0
+        sim.reset_stats()
+        assert profile.apply(device, verify=True) == {'configured': False, 'eeprom_written': 1}
+        assert sim.eeprom == bytearray(range(256))
+
+    def test_verify(self, device):
+        profile = reference_profile()
+        ranges = []
+        device.write_ee_range = lambda start, data, **kwargs: ranges.append((start, len(data)))
+        with pytest.raises(MCP2200Error):
+            profile.apply(device, verify=True)
+        # The differing bytes in a single run, 255 holds 0xff already
+        assert ranges == [(0, 255)]
+        device.handle.eeprom[:] = bytes(range(256))
+        device.handle.eeprom[3] = device.handle.eeprom[7] = device.handle.eeprom[8] = 0
+        ranges.clear()
+        with pytest.raises(MCP2200Error):
+            profile.apply(device, verify=True)
+        assert ranges == [(3, 1), (7, 2)]
+
+    def test_without_eeprom(self, device):
+        device.handle.eeprom[0] = 0x42
+        profile = MCP2200Profile.capture(device, eeprom=False)
+        assert profile.eeprom is None
+        profile.config.tx_led = True
+        assert profile.apply(device) == {'configured': True, 'eeprom_written': 0}
+        assert device.handle.eeprom[0] == 0x42
+
+    def test_json(self):
+        profile = reference_profile()
+        text = profile.to_json()
+        data = json.loads(text)
+        assert data['version'] == PROFILE_VERSION
+        assert data['options']['rx_led'] is True
+        assert len(data['eeprom']) == 16
+        assert MCP2200Profile.from_json(text) == profile
+
+        # Edited options win over the raw fields
+        data['options']['baud_rate'] = 9600
+        data['options']['rx_led'] = False
+        edited = MCP2200Profile.from_dict(data)
+        assert edited.config.baud_rate == 9600
+        assert not edited.config.rx_led
+
+        data['version'] = PROFILE_VERSION + 1
+        with pytest.raises(ValueError):
+            MCP2200Profile.from_dict(data)
+
+    def test_binary(self):
+        profile = reference_profile()
+        data = profile.to_bytes()
+        assert len(data) == BINARY_HEADER.size + 256 + BINARY_CRC.size
+        assert MCP2200Profile.from_bytes(data) == profile
+        assert len(MCP2200Profile(profile.config).to_bytes()) == BINARY_HEADER.size + BINARY_CRC.size
+
+        corrupted = bytearray(data)
+        corrupted[20] ^= 0xff
+        with pytest.raises(ValueError):
+            MCP2200Profile.from_bytes(corrupted)
+
+    def test_files(self, tmp_path):
+        profile = reference_profile()
+        for name in ('board.json', 'board.bin'):
+            profile.save(tmp_path / name)
+            assert MCP2200Profile.load(tmp_path / name) == profile
+        assert (tmp_path / 'board.bin').read_bytes().startswith(BINARY_MAGIC)
+
+    def test_fleet(self):
+        backend = SimulatorBackend(count=4)
+        backend.simulators[2].eeprom[:] = bytes(range(256))
+        profile = reference_profile()
+        with MCP2200Fleet(backend=backend) as fleet:
+            results = fleet.apply_profile(profile, verify=True)
+            assert all(r.ok for r in results)
+            assert [r.value['eeprom_written'] for r in results] == [255, 255, 0, 255]
+            assert all(r.value == profile for r in fleet.capture_profiles())
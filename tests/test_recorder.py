@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import time
+import pytest
+
+from cdtx.mcp2200 import errors
+from cdtx.mcp2200.api import SimpleIOClass
+from cdtx.mcp2200.device import MCP2200Device, MCP2200_VID, MCP2200_PID
+from cdtx.mcp2200.recorder import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+def session(api):
+    api.InitMCP2200(MCP2200_VID, MCP2200_PID)
+    assert api.select(serial='0000001') == 0
+    api.ConfigureIO(0x00)
+    api.SetPin(2)
+    value = api.ReadPortValue()
+    api.WriteEEPROM(5, 0x42)
+    return value, api.ReadEEPROM(5)
+
+@pytest.fixture
+def recording(tmp_path):
+    ''' (log path, results of session() while recorded) '''
+    path = str(tmp_path / 'session.mcplog')
+    backend = RecordingBackend(path, SimulatorBackend(count=2))
+    api = SimpleIOClass(backend)
+    results = session(api)
+    api.device.disconnect()
+    backend.close()
+    return path, results
+
+class TestRecorder():
+    def test_log(self, recording):
+        path, results = recording
+        records = list(read_log(path))
+        assert [r.event for r in records[:2]] == [EVENT_FIND, EVENT_SERIAL]
+        assert records[0].data == b'1-1\x001-2'
+        assert records[-1].event == EVENT_CLOSE
+        assert [r.time for r in records] == sorted(r.time for r in records)
+        assert all(len(r.data) == 16 for r in records if r.event in (EVENT_WRITE, EVENT_READ))
+        summary = summarize(path)
+        assert summary['reports_out'] == sum(summary['commands'].values())
+        assert summary['commands']['WRITE_EE'] == 1
+        assert summary['devices'] == 1 and summary['errors'] == 0
+
+    def test_truncated(self, recording, tmp_path):
+        path, results = recording
+        with open(path, 'rb') as f:
+            data = f.read()
+        truncated = tmp_path / 'truncated.mcplog'
+        truncated.write_bytes(data[:-5])
+        assert len(list(read_log(str(truncated)))) == len(list(read_log(path))) - 1
+        other = tmp_path / 'other.bin'
+        other.write_bytes(b'\x00' * 64)
+        with pytest.raises(ValueError):
+            list(read_log(str(other)))
+
+    def test_replay(self, recording):
+        path, results = recording
+        api = SimpleIOClass(ReplayBackend(path))
+        assert session(api) == results
+        # The recording is over
+        with pytest.raises(errors.MCP2200ReplayError):
+            api.ReadPortValue()
+
+    def test_replay_mismatch(self, recording):
+        path, results = recording
+        api = SimpleIOClass(ReplayBackend(path))
+        api.InitMCP2200(MCP2200_VID, MCP2200_PID)
+        api.select(serial='0000001')
+        with pytest.raises(errors.MCP2200ReplayError):
+            api.ConfigureIO(0x0f)
+        # Not strict, only the sequence of calls matters
+        api = SimpleIOClass(ReplayBackend(path, strict=False))
+        api.InitMCP2200(MCP2200_VID, MCP2200_PID)
+        api.select(serial='0000001')
+        api.ConfigureIO(0x0f)
+
+    def test_failures(self, tmp_path):
+        path = str(tmp_path / 'failures.mcplog')
+        sim_backend = SimulatorBackend()
+        backend = RecordingBackend(path, sim_backend)
+        dev = MCP2200Device(backend=backend, autoConnect=True)
+        sim_backend.simulators[0].drop_responses = 1
+        expected = dev.read_all()
+        sim_backend.unplug(sim_backend.simulators[0])
+        with pytest.raises(errors.MCP2200DisconnectedError):
+            dev.read_all()
+        backend.close()
+        assert summarize(path)['timeouts'] >= 1
+
+        replay = MCP2200Device(backend=ReplayBackend(path), autoConnect=True)
+        assert replay.read_all() == expected
+        with pytest.raises(errors.MCP2200DisconnectedError):
+            replay.read_all()
+
+    def test_channel_limit(self, tmp_path):
+        sim_backend = SimulatorBackend()
+        backend = RecordingBackend(str(tmp_path / 'many.mcplog'), sim_backend)
+        backend._channels = 0xff
+        with pytest.raises(errors.MCP2200Error):
+            backend.open(backend.find(MCP2200_VID, MCP2200_PID)[0])
+        # Nothing left opened
+        assert not sim_backend.simulators[0].claimed
+        backend.close()
+
+    def test_realtime(self, tmp_path):
+        path = str(tmp_path / 'slow.mcplog')
+        backend = RecordingBackend(path, SimulatorBackend(latency=0.01))
+        dev = MCP2200Device(backend=backend, autoConnect=True)
+        for _ in range(3):
+            dev.read_all()
+        backend.close()
+        replay = MCP2200Device(backend=ReplayBackend(path, realtime=True), autoConnect=True)
+        start = time.perf_counter()
+        for _ in range(3):
+            replay.read_all()
+        assert time.perf_counter() - start >= 0.04
+
+    def test_cli(self, tmp_path, capsys):
+        from cdtx.mcp2200.cli import main
+        path = str(tmp_path / 'cli.mcplog')
+        assert main(['--record', path, 'eeprom', 'write', '1', '0x33'], SimulatorBackend()) == 0
+        assert summarize(path)['commands'] == {'WRITE_EE': 1}
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import pytest
+
+from cdtx.mcp2200 import errors
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.api import SimpleIOClass
+from cdtx.mcp2200.registry import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+class CountingBackend(SimulatorBackend):
+    ''' Counts the bus enumerations and serial number reads '''
+    def __init__(self, *args, **kwargs):
+        super(CountingBackend, self).__init__(*args, **kwargs)
+        self.scans = 0
+        self.serial_reads = 0
+
+    def find(self, vid, pid):
+        self.scans += 1
+        return super(CountingBackend, self).find(vid, pid)
+
+    def serial(self, dev):
+        self.serial_reads += 1
+        return super(CountingBackend, self).serial(dev)
+
+class TestDeviceRegistry():
+    def test_lookup(self):
+        backend = CountingBackend(count=3)
+        registry = DeviceRegistry(backend=backend)
+        assert len(registry) == 3
+        assert registry.find(index=1) is registry[1]
+        assert registry.find(path='1-3').index == 2
+        assert registry.find(serial='0000001').index == 1
+        assert registry.find(serial='0000002').index == 2
+        with pytest.raises(KeyError):
+            registry.find(serial='unknown')
+        with pytest.raises(KeyError):
+            registry.find(index=3)
+        assert backend.scans == 1
+        assert backend.serial_reads == 3
+
+    def test_rescan_keeps_serials(self):
+        backend = CountingBackend(count=2)
+        registry = DeviceRegistry(backend=backend)
+        registry.find(serial='0000000')
+        registry.scan()
+        registry.find(serial='0000001')
+        assert backend.scans == 2
+        assert backend.serial_reads == 2
+
+    def test_connect(self):
+        backend = CountingBackend(count=2)
+        registry = DeviceRegistry(backend=backend)
+        dev = registry.connect(serial='0000001')
+        assert dev.handle is backend.simulators[1]
+        assert dev.read_all()
+        dev.disconnect()
+        assert backend.scans == 1
+
+    def test_identity(self):
+        backend = SimulatorBackend(count=2)
+        first, second = DeviceRegistry(backend=backend).devices()
+        again = MCP2200Device.discover(backend=backend)[0]
+        assert first == again
+        assert first != second
+        assert first.identity() == '1-1'
+        assert len({first, second, again}) == 2
+
+class TestSelect():
+    def test_select(self):
+        backend = CountingBackend(count=3)
+        api = SimpleIOClass(backend)
+        assert api.select(serial='0000002') == errors.E_WRONG_DEVICE_ID
+        api.InitMCP2200(MCP2200_VID, MCP2200_PID)
+        assert api.SelectDevice(1) == 0
+        assert api.GetSelectedDevice() == 1
+        assert api.select(serial='0000002') == 0
+        assert api.GetSelectedDevice() == 2
+        assert api.select(path='1-1') == 0
+        assert api.GetSelectedDevice() == 0
+        assert api.select(serial='unknown') == errors.E_WRONG_DEVICE_ID
+        assert backend.scans == 1
+        api.device.disconnect()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import time
+import pytest
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.sampler import *
+
+def wait_samples(sampler, count):
+    while sampler.count < count:
+        time.sleep(0.001)
+
+class TestGPIOSampler():
+    def test_read_port(self, device):
+        device.set_clear_outputs(Set_bmap=0x00, Clear_bmap=0xff)
+        assert device.read_port() == device.read_all()['IO_Port_Val_bmap']
+
+    def test_sampling(self, device):
+        sim = device.handle
+        sim.inputs = 0x5a
+        with GPIOSampler(device, capacity=1000) as sampler:
+            wait_samples(sampler, 10)
+        timestamps, values = sampler.drain()
+        assert len(timestamps) == len(values) == min(sampler.count, 1000)
+        assert set(values) == {0x5a}
+        assert list(timestamps) == sorted(timestamps)
+        assert sampler.rate() > 0
+        # Everything was drained
+        assert len(sampler.drain()[0]) == 0
+        assert list(sampler) == []
+
+    def test_overflow(self, device):
+        sampler = GPIOSampler(device, capacity=8)
+        with sampler:
+            wait_samples(sampler, 50)
+        timestamps, values = sampler.drain()
+        assert len(values) == 8
+        assert sampler.dropped == sampler.count - 8
+        stats = sampler.stats()
+        assert stats['samples'] == sampler.count
+        assert stats['dropped'] == sampler.dropped
+        assert stats['pending'] == 0
+        # Snapshot doesn't consume
+        assert len(sampler.snapshot()[0]) == 8
+        assert len(sampler.snapshot()[0]) == 8
+
+    def test_torn_slot(self, device):
+        class Running():
+            def is_alive(self):
+                return True
+        sampler = GPIOSampler(device, capacity=4)
+        for n in range(4):
+            sampler.timestamps[n], sampler.values[n] = n, n
+        sampler._count = 4
+        # The sampler is writing sample 4 over sample 0 : timestamp only
+        sampler._thread = Running()
+        sampler.timestamps[0] = 4
+        timestamps, values = sampler.drain()
+        assert list(zip(timestamps, values)) == [(1, 1), (2, 2), (3, 3)]
+        assert sampler.dropped == 1
+        sampler._thread = None
+        # Stopped, a full ring is copied whole
+        assert len(sampler.snapshot()[0]) == 4
+
+    def test_iterate(self, device):
+        with GPIOSampler(device, capacity=100) as sampler:
+            wait_samples(sampler, 5)
+            sampler.stop()
+            samples = list(sampler)
+        assert len(samples) == min(sampler.count, 100)
+        assert all(isinstance(ts, int) and value == 0xff for ts, value in samples)
+
+    def test_interval(self, device):
+        with GPIOSampler(device, interval=0.01) as sampler:
+            time.sleep(0.1)
+        assert 2 <= sampler.count <= 15
+        assert sampler.rate() < 150
+
+    def test_errors(self, device):
+        device.disconnect()
+        device.handle = None
+        with GPIOSampler(device) as sampler:
+            time.sleep(0.01)
+        assert sampler.count == 0
+        assert sampler.errors > 0
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import time
+import pytest
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.simulator import *
+
+class TestSimulator():
+    def test_backend(self):
+        backend = SimulatorBackend(count=3)
+        devices = MCP2200Device.discover(backend=backend)
+        assert len(devices) == 3
+        assert devices[0] != devices[1]
+        assert MCP2200Device.discover(0x1234, 0x5678, backend=backend) == []
+
+    def test_claim(self):
+        backend = SimulatorBackend()
+        dev = MCP2200Device(backend=backend)
+        dev.connect()
+        with pytest.raises(IOError):
+            MCP2200Device(backend=backend).connect()
+        dev.disconnect()
+        assert MCP2200Device(backend=backend, autoConnect=True).disconnect()
+
+    def test_stats(self):
+        backend = SimulatorBackend()
+        sim = backend.simulators[0]
+        dev = MCP2200Device(backend=backend, autoConnect=True)
+        dev.read_all()
+        dev.set_clear_outputs(Set_bmap=0x01, Clear_bmap=0x00)
+        assert (sim.reports_out, sim.reports_in) == (2, 1)
+        assert sim.transactions == 3
+        assert sim.bytes_out == 32
+        assert sim.bytes_in == 16
+        sim.reset_stats()
+        assert sim.transactions == 0
+
+    def test_inputs(self):
+        backend = SimulatorBackend()
+        sim = backend.simulators[0]
+        dev = MCP2200Device(backend=backend, autoConnect=True)
+        config = dev.read_config()
+        config['IO_bmap'] = 0x0f
+        dev.configure(**config)
+        sim.inputs = 0x05
+        dev.set_clear_outputs(Set_bmap=0xa0, Clear_bmap=0x00)
+        assert dev.read_all()['IO_Port_Val_bmap'] == 0xa5
+
+    def test_no_response(self):
+        dev = MCP2200Device(backend=SimulatorBackend(), autoConnect=True)
+        with pytest.raises(IOError):
+            dev.read()
+
+    def test_latency(self):
+        dev = MCP2200Device(backend=SimulatorBackend(latency=0.01), autoConnect=True)
+        start = time.monotonic()
+        dev.read_all()
+        assert time.monotonic() - start >= 0.02
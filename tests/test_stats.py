@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import json
+import threading
+import pytest
+
+from cdtx.mcp2200.device import *
+from cdtx.mcp2200.api import *
+from cdtx.mcp2200.stats import *
+
+class TestHistogram():
+    def test_observe(self):
+        histogram = Histogram((0.1, 1.0, float('inf')))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(2.65)
+
+class TestDeviceStats():
+    def test_disabled(self, api):
+        device = api.device
+        assert device.stats is None
+        assert 'read' not in device.__dict__ and 'write' not in device.__dict__
+
+    def test_commands(self, api):
+        device = api.device
+        stats = device.enable_stats()
+        device.read_all()
+        device.set_clear_outputs(Set_bmap=0x01, Clear_bmap=0x00)
+        device.read_ee_range(0, 3)
+        assert (stats.reports_out, stats.reports_in) == (5, 4)
+        assert (stats.bytes_out, stats.bytes_in) == (80, 64)
+        assert stats.commands['READ_ALL'].count == 1
+        assert stats.commands['SET_CLEAR_OUTPUTS'].count == 1
+        assert stats.commands['READ_EE'].count == 3
+
+        device.disable_stats()
+        device.read_all()
+        assert stats.reports == 9
+        assert 'read' not in device.__dict__
+
+    def test_pipelined(self, api):
+        stats = api.device.enable_stats()
+        api.device.read_ee_range(0, 16, window=8)
+        assert (stats.reports_out, stats.reports_in) == (16, 16)
+        assert stats.commands['READ_EE'].count == 16
+        api.device.disable_stats()
+
+class TestApiStats():
+    def test_methods(self, api):
+        stats = api.enable_stats()
+        api.fnRxLED(TOGGLE)
+        api.fnRxLED(OFF)
+        api.ReadPin(0)
+        assert stats.methods['fnRxLED'].count == 2
+        # One READ_ALL to fill the configuration cache, then one CONFIGURE each
+        assert stats.method_reports['fnRxLED'] == 4
+        assert stats.method_reports['ReadPin'] == 2
+
+        # Follows the selected device
+        api.SelectDevice(0)
+        api.SetPin(0)
+        assert stats.method_reports['SetPin'] == 1
+
+        api.disable_stats()
+        api.SetPin(0)
+        assert stats.methods['SetPin'].count == 1
+
+    def test_threads(self):
+        ''' The reports of other threads meanwhile aren't charged to the method '''
+        stats = Stats()
+        class Worker():
+            def work(self):
+                other = threading.Thread(target=stats.report_out, args=(16,))
+                other.start()
+                other.join()
+                stats.report_out(16)
+        worker = Worker()
+        instrument_methods(worker, ('work',), stats)
+        worker.work()
+        assert stats.method_reports['work'] == 1
+        assert stats.reports == 2
+
+    def test_export(self, api):
+        stats = api.enable_stats()
+        api.ReadPort()
+        data = stats.as_dict()
+        assert data['methods']['ReadPort']['count'] == 1
+        assert data['methods']['ReadPort']['reports'] == 2
+        assert sum(count for (_bound, count) in data['commands']['READ_ALL']['buckets']) == 1
+
+        assert json.loads(stats.to_json())['reports_out'] == 1
+
+        text = stats.to_prometheus()
+        assert 'mcp2200_reports_total{direction="out"} 1' in text
+        assert 'mcp2200_command_seconds_bucket{command="READ_ALL",le="+Inf"} 1' in text
+        assert 'mcp2200_method_seconds_count{method="ReadPort"} 1' in text
+        assert 'mcp2200_method_reports_total{method="ReadPort"} 2' in text
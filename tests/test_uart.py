@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import os
+import asyncio
+import termios
+import pytest
+
+from cdtx.mcp2200 import errors
+from cdtx.mcp2200.device import MCP2200Device
+from cdtx.mcp2200.uart import *
+from cdtx.mcp2200.simulator import SimulatorBackend
+
+@pytest.fixture
+def pty():
+    ''' (master fd, MCP2200Serial on the slave side) '''
+    master, slave = os.openpty()
+    serial = MCP2200Serial(os.ttyname(slave), 115200, timeout=1.0)
+    os.close(slave)
+    yield master, serial
+    serial.close()
+    try:
+        os.close(master)
+    except OSError:
+        pass
+
+def add_tty(root, name, interface):
+    usb = root / 'devices' / 'usb1' / interface.split(':')[0] / interface
+    usb.mkdir(parents=True)
+    (root / 'class' / 'tty' / name).mkdir(parents=True)
+    (root / 'class' / 'tty' / name / 'device').symlink_to(usb)
+
+class TestSerial():
+    def test_line(self, pty):
+        master, serial = pty
+        attrs = termios.tcgetattr(serial.fd)
+        assert attrs[4] == termios.B115200
+        assert not attrs[3] & termios.ICANON
+        assert not attrs[2] & termios.CRTSCTS
+        serial.set_line(9600, True)
+        attrs = termios.tcgetattr(serial.fd)
+        assert attrs[4] == termios.B9600 and attrs[2] & termios.CRTSCTS
+        with pytest.raises(ValueError):
+            serial.set_line(12345)
+
+    def test_readinto(self, pty):
+        master, serial = pty
+        buffer = bytearray(64)
+        os.write(master, b'hello')
+        assert serial.readinto_exactly(memoryview(buffer)[:5]) == 5
+        assert buffer[:5] == b'hello'
+        with pytest.raises(errors.MCP2200TimeoutError):
+            serial.readinto(buffer, timeout=0.01)
+        assert serial.write(memoryview(b'\x00\xffabc')) == 5
+        assert os.read(master, 16) == b'\x00\xffabc'
+        stats = serial.stats.as_dict()
+        assert (stats['bytes_in'], stats['bytes_out'], stats['writes']) == (5, 5, 1)
+        assert stats['read_wait']['count'] == stats['reads']
+
+    def test_frames(self, pty):
+        master, serial = pty
+        os.write(master, b'one\ntw')
+        os.write(master, b'o\nthree\n')
+        frames = serial.frames(buffer_size=8)
+        assert [next(frames) for _ in range(3)] == [b'one\n', b'two\n', b'three\n']
+        os.write(master, b'x' * 8)
+        with pytest.raises(errors.MCP2200Error):
+            next(frames)
+
+        os.write(master, bytes(range(10)))
+        frames = serial.frames(size=4)
+        assert [next(frames), next(frames)] == [bytes(range(4)), bytes(range(4, 8))]
+        os.close(master)
+        assert list(frames) == []
+        assert serial.stats.frames == 5
+
+    def test_stream(self, pty):
+        master, serial = pty
+        async def run():
+            reader, writer = await serial.open_stream()
+            writer.write(b'ping\n')
+            await writer.drain()
+            os.write(master, os.read(master, 16).upper())
+            line = await asyncio.wait_for(reader.readline(), 1.0)
+            writer.close()
+            return line
+        assert asyncio.run(run()) == b'PING\n'
+
+class TestDevice():
+    def test_find_tty(self, tmp_path):
+        add_tty(tmp_path, 'ttyACM0', '1-5:1.0')
+        add_tty(tmp_path, 'ttyACM1', '1-1:1.0')
+        add_tty(tmp_path, 'ttyS0', '1-1:1.1')
+        dev = MCP2200Device(backend=SimulatorBackend(), autoConnect=True)
+        assert find_tty(dev, str(tmp_path / 'class' / 'tty')) == '/dev/ttyACM1'
+        assert find_tty(dev, str(tmp_path / 'none')) is None
+        dev.disconnect()
+
+    def test_from_device(self, pty):
+        master, serial = pty
+        backend = SimulatorBackend()
+        sim = backend.simulators[0]
+        dev = MCP2200Device(backend=backend, autoConnect=True)
+        # The NVRAM settings by default
+        with MCP2200Serial.from_device(dev, port=serial.port) as other:
+            assert (other.baud_rate, other.flow_control) == (9600, False)
+            assert termios.tcgetattr(other.fd)[4] == termios.B9600
+        assert sim.reports_out == 1
+        # Written to the NVRAM in a single CONFIGURE
+        with MCP2200Serial.from_device(dev, 115200, True, port=serial.port) as other:
+            assert termios.tcgetattr(other.fd)[4] == termios.B115200
+        assert (sim.Baud_H, sim.Baud_L, sim.Config_Alt_Options & 0x01) == (0, 103, 0x01)
+        assert sim.reports_out == 2
+        with pytest.raises(ValueError):
+            MCP2200Serial.from_device(dev, 12345, port=serial.port)
+        dev.disconnect()